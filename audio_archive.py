@@ -0,0 +1,192 @@
+# audio_archive.py
+#
+# 録音した音声を圧縮して保存するアーカイブ。ファイル名は音声のハッシュ値なので、
+# 同じ音声は1度しか保存されない。Recording.file_path にはここで決まるパスを保存する。
+
+import hashlib
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except (ImportError, OSError):
+    # libsndfile が無い環境では非圧縮の PCM (int16) で保存する
+    SOUNDFILE_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+
+# 形式ごとの (拡張子, soundfileのformat, subtype)
+FORMATS = {
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "opus": (".ogg", "OGG", "OPUS"),
+    "pcm": (".pcm", None, None),
+}
+
+
+def audio_fingerprint(audio):
+    """音声配列の高速なハッシュ値（16進文字列）を返す"""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    return hashlib.blake2b(memoryview(audio).cast("B"), digest_size=16).hexdigest()
+
+
+def to_pcm16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2")
+
+
+def load_audio(path):
+    """アーカイブされた音声ファイルを float32 の配列として読み込む。ファイルが無ければ None を返す"""
+    if not path or not os.path.exists(path):
+        return None
+    if path.endswith(".pcm"):
+        return np.memmap(path, dtype="<i2", mode="r").astype(np.float32) / 32767.0
+    audio, _ = sf.read(path, dtype="float32")
+    return audio
+
+
+class AudioArchive:
+    """
+    録音をバックグラウンドのスレッドで圧縮保存するアーカイブ。
+
+    store_async() はすぐに Future を返し、ハッシュ値の計算（保存先のパスが決まる）・
+    エンコード・書き込みは別スレッドで行う。合計サイズが max_bytes を超えた場合は、最後に使われたのが
+    古いファイルから削除する（DBの行は残り、load() が None を返すようになる）。
+    """
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, audio_format="flac", sample_rate=SAMPLE_RATE):
+        if audio_format != "pcm" and not SOUNDFILE_AVAILABLE:
+            print("警告: soundfileがインポートできないため、音声は非圧縮で保存されます。")
+            audio_format = "pcm"
+        self.root = root
+        self.max_bytes = max_bytes
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        os.makedirs(root, exist_ok=True)
+
+        self._total_bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="audio-archive", daemon=True)
+        self._thread.start()
+
+    def path_for(self, digest):
+        extension = FORMATS[self.audio_format][0]
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def store_async(self, audio):
+        """
+        音声を保存待ちにして、保存先のパスが入る Future を返す（ブロックしない）。
+        長い録音ではハッシュ値の計算にも時間がかかるため、呼び出し元のスレッドでは行わない。
+        同じ内容のファイルが既にあれば、書き込まずに最終使用時刻だけ更新する。
+        """
+        future = Future()
+        self._queue.put((future, audio))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, audio = item
+            if future is None:
+                # flush() からの通知
+                audio.set()
+                continue
+            try:
+                path = self.path_for(audio_fingerprint(audio))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            future.set_result(path)
+            try:
+                self._store(path, audio)
+            except Exception as e:
+                print(f"AudioArchive: failed to store {path}: {e}")
+
+    def _store(self, path, audio):
+        if os.path.exists(path):
+            os.utime(path)
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書きかけのファイルが読まれないよう、一時ファイルに書いてから置き換える
+        tmp_path = path + ".tmp"
+        extension, file_format, subtype = FORMATS[self.audio_format]
+        if file_format is None:
+            to_pcm16(audio).tofile(tmp_path)
+        else:
+            sf.write(tmp_path, audio, self.sample_rate, format=file_format, subtype=subtype)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        if self._total_bytes is None:
+            self._total_bytes = self._scan_total()
+        else:
+            self._total_bytes += size
+        if self.max_bytes and self._total_bytes > self.max_bytes:
+            self._enforce_retention()
+
+    def _files(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _scan_total(self):
+        return sum(size for _, _, size in self._files())
+
+    def _enforce_retention(self):
+        """合計サイズが上限の9割になるまで、古いファイルから削除する"""
+        files = sorted(self._files(), key=lambda f: f[1])
+        total = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        print(f"AudioArchive: removed {removed} old recordings to stay under {self.max_bytes} bytes.")
+
+    def flush(self):
+        """保存待ちのものがすべて書き込まれるまで待つ"""
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    # --- 読み込み ---
+
+    def load(self, path):
+        """保存された音声を float32 の配列として読み込む。ファイルが無ければ None を返す"""
+        return load_audio(path)
+
+    def open_memmap(self, path):
+        """PCM形式のファイルをメモリマップした int16 配列として返す（読み込みは遅延される）"""
+        return np.memmap(path, dtype="<i2", mode="r")
+
+    def stream(self, path, blocksize=SAMPLE_RATE * 30):
+        """保存された音声を blocksize サンプルずつ float32 で返すジェネレータ"""
+        if path.endswith(".pcm"):
+            pcm = self.open_memmap(path)
+            for start in range(0, len(pcm), blocksize):
+                yield pcm[start:start + blocksize].astype(np.float32) / 32767.0
+        else:
+            yield from sf.blocks(path, blocksize=blocksize, dtype="float32")
\ No newline at end of file
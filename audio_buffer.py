@@ -0,0 +1,199 @@
+# audio_buffer.py
+
+import os
+import tempfile
+
+import numpy as np
+
+
+class AudioArena:
+    """
+    録音データを書き込むための、事前確保された float32 のアリーナ。
+
+    大きなチャンクを np.empty で確保しておき、コールバックからは1回のコピーで
+    書き込む。np.empty はページに触れるまで物理メモリを消費しないため、
+    大きめに確保しても実際に使うのは録音した分だけで済む。
+    録音がチャンクに収まっている限り、view() はコピーなしのビューを返す。
+    """
+    def __init__(self, sample_rate=16000, chunk_seconds=30 * 60, dtype=np.float32):
+        self.sample_rate = sample_rate
+        self.chunk_size = int(sample_rate * chunk_seconds)
+        self.dtype = dtype
+        self._chunks = [np.empty(self.chunk_size, dtype=dtype)]
+        # 書き込み済みのサンプル数。データのコピーが終わってから更新するため、
+        # 別スレッドからは length までのデータを安全に読める
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def duration(self):
+        return self.length / self.sample_rate
+
+    def write(self, samples):
+        """1次元の音声ブロックを末尾に追加する（オーディオコールバックから呼ばれる）"""
+        n = len(samples)
+        pos = self.length
+        written = 0
+        while written < n:
+            chunk_index, offset = divmod(pos + written, self.chunk_size)
+            if chunk_index == len(self._chunks):
+                # 容量を超えた場合のみ新しいチャンクを追加する（既存データはコピーしない）
+                self._chunks.append(np.empty(self.chunk_size, dtype=self.dtype))
+            count = min(n - written, self.chunk_size - offset)
+            self._chunks[chunk_index][offset:offset + count] = samples[written:written + count]
+            written += count
+        self.length = pos + n
+
+    def read(self, start=0, stop=None):
+        """
+        [start, stop) の区間を返す。区間が1つのチャンクに収まる場合はコピーなしのビュー、
+        チャンクをまたぐ場合のみ結合したコピーを返す。
+        """
+        length = self.length
+        stop = length if stop is None else min(stop, length)
+        start = max(0, min(start, stop))
+        if start == stop:
+            return np.empty(0, dtype=self.dtype)
+
+        first, first_offset = divmod(start, self.chunk_size)
+        last, last_offset = divmod(stop, self.chunk_size)
+        if first == last or (last == first + 1 and last_offset == 0):
+            return self._chunks[first][first_offset:first_offset + (stop - start)]
+
+        parts = [self._chunks[first][first_offset:]]
+        parts.extend(self._chunks[first + 1:last])
+        if last_offset:
+            parts.append(self._chunks[last][:last_offset])
+        return np.concatenate(parts)
+
+    def view(self):
+        """録音全体を返す（通常はコピーなし）"""
+        return self.read(0)
+
+
+class SpillArena:
+    """
+    長時間の録音用のアリーナ。AudioArena と同じように使える。
+
+    先頭の spill_after_seconds 秒はメモリに置き、それを超えた分は spill_dir に作った
+    max_seconds 分の疎ファイルをメモリマップして書き込む。ファイルは作成直後に削除する
+    ため、マップが解放されれば（クラッシュした場合も）ディスクには残らない。
+    view() はメモリ上の先頭部分をファイルの先頭にコピーしてからファイル全体のビューを
+    返すので、何時間の録音でも結合したコピーをメモリ上に作らない。
+    """
+    def __init__(self, sample_rate=16000, spill_after_seconds=5 * 60, max_seconds=8 * 60 * 60,
+                 spill_dir=None, dtype=np.float32):
+        self.sample_rate = sample_rate
+        self.memory_size = int(sample_rate * spill_after_seconds)
+        self.capacity = max(self.memory_size, int(sample_rate * max_seconds))
+        self.spill_dir = spill_dir
+        self.dtype = np.dtype(dtype)
+        self._memory = np.empty(self.memory_size, dtype=dtype)
+        self._file = None     # 溢れた分を書き込むメモリマップ（容量 capacity）
+        self._merged = False  # 先頭部分をファイルにコピー済み
+        self.length = 0
+        self.dropped = 0      # capacity を超えて捨てたサンプル数
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def duration(self):
+        return self.length / self.sample_rate
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def _spill(self):
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="recording-", suffix=".f32", dir=self.spill_dir)
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                # 書き込んだページだけがディスクを使う疎ファイルになる
+                f.truncate(self.capacity * self.dtype.itemsize)
+                self._file = np.memmap(f, dtype=self.dtype, mode="r+", shape=(self.capacity,))
+        finally:
+            os.unlink(path)
+
+    def write(self, samples):
+        """1次元の音声ブロックを末尾に追加する（オーディオコールバックから呼ばれる）"""
+        pos = self.length
+        n = min(len(samples), self.capacity - pos)
+        if n < len(samples):
+            self.dropped += len(samples) - n
+        written = 0
+        if pos < self.memory_size:
+            written = min(n, self.memory_size - pos)
+            self._memory[pos:pos + written] = samples[:written]
+        if written < n:
+            if self._file is None:
+                self._spill()
+            self._file[pos + written:pos + n] = samples[written:n]
+        self.length = pos + n
+
+    def read(self, start=0, stop=None):
+        """[start, stop) の区間を返す。メモリとファイルの境界をまたぐ場合のみコピーする"""
+        length = self.length
+        stop = length if stop is None else min(stop, length)
+        start = max(0, min(start, stop))
+        if start == stop:
+            return np.empty(0, dtype=self.dtype)
+        if self._merged or start >= self.memory_size:
+            return self._file[start:stop]
+        if stop <= self.memory_size:
+            return self._memory[start:stop]
+        return np.concatenate((self._memory[start:], self._file[self.memory_size:stop]))
+
+    def view(self):
+        """録音全体を返す。ファイルに溢れている場合はファイル全体のビューになる（録音停止後に呼ぶ）"""
+        if self._file is None:
+            return self._memory[:self.length]
+        if not self._merged:
+            self._file[:self.memory_size] = self._memory
+            self._merged = True
+        return self._file[:self.length]
+
+
+class RingBuffer:
+    """
+    固定容量のリングバッファ。容量を超えた古いサンプルは上書きされる。
+    直近N秒だけ保持すればよい用途（プリロールなど）に使う。
+    """
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=dtype)
+        self._pos = 0  # 次に書き込む位置
+        self.total_written = 0
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def write(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            self._data[:] = samples[n - self.capacity:]
+            self._pos = 0
+        else:
+            end = self._pos + n
+            if end <= self.capacity:
+                self._data[self._pos:end] = samples
+            else:
+                split = self.capacity - self._pos
+                self._data[self._pos:] = samples[:split]
+                self._data[:end - self.capacity] = samples[split:]
+            self._pos = end % self.capacity
+        self.total_written += n
+
+    def snapshot(self):
+        """保持しているサンプルを古い順に並べたコピーを返す"""
+        if self.total_written < self.capacity:
+            return self._data[:self._pos].copy()
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self.total_written = 0
\ No newline at end of file
@@ -1,59 +1,204 @@
 # audio_handler.py
 
-import sounddevice as sd
-import numpy as np
+import threading
+
+import tracing
+from audio_buffer import AudioArena, RingBuffer, SpillArena
+from level_meter import compute_levels
+from resampler import PolyphaseResampler, downmix
 # soundfileは不要になったため削除しました
 # import soundfile as sf 
 
 class AudioRecorder:
-    def __init__(self, sample_rate=16000, channels=1, ui_queue=None):
+    """
+    マイクからの録音。
+
+    warm=True の場合は open_stream() で入力ストリームを開いたままにし、録音していない間も
+    直近 preroll_seconds 秒だけをリングバッファに保持する。start_recording() はデバイスを
+    開かずにその音声を先頭に付けて録音を始めるため、録音開始直後の音が欠けない。
+
+    spill_after_seconds を指定すると、それより長い録音はメモリではなく spill_dir の
+    メモリマップしたファイルに書き込む（SpillArena）。
+
+    デバイスは device_rate（None の場合はデバイスの標準のレート）・channels チャンネルで開き、
+    ホストのオーディオ層に変換させる代わりに、コールバックで PolyphaseResampler により
+    sample_rate のモノラルに変換してからバッファに書き込む。blocksize（0 はホストに任せる）と
+    latency（"low" / "high" / 秒数）はそのまま InputStream に渡す。
+    """
+    def __init__(self, sample_rate=16000, channels=1, level_channel=None, stream_factory=None,
+                 warm=False, preroll_seconds=0.3, spill_after_seconds=None, spill_dir=None,
+                 device_rate=None, blocksize=0, latency=None):
         self.sample_rate = sample_rate
         self.channels = channels
+        # 設定されたレート（None はデバイスの標準のレートで、ストリームを開くたびに問い合わせる）
+        self.device_rate = device_rate
+        # 開いているストリームの実際のレート
+        self.stream_rate = None
+        self.blocksize = blocksize
+        self.latency = latency
+        # ストリームを開くときに device_rate に合わせて作る（同じレートなら変換しない）
+        self.resampler = None
         self.is_recording = False
-        self.recording_data = []
-        # UIにデータを送るためのキューを追加
-        self.ui_queue = ui_queue
+        # コールバックが1回のコピーで書き込む事前確保済みバッファ
+        self.recording_data = AudioArena(sample_rate=sample_rate)
+        # UIにレベルメーターの値 (rms, peak) を送るためのチャンネル
+        self.level_channel = level_channel
+        # sd.InputStream 互換のファクトリ。ベンチマークなどでは実デバイスの代わりを渡せる
+        self.stream_factory = stream_factory
+        self.stream = None
+        self.warm = warm
+        self.is_warm = False  # open_stream() でストリームを開いたままにしている
+        self.preroll = RingBuffer(max(1, int(sample_rate * preroll_seconds)))
+        self.spill_after_seconds = spill_after_seconds
+        self.spill_dir = spill_dir
+        # 録音開始・停止の切り替えと、オーディオスレッドの書き込み先の選択を排他にする
+        self._switch_lock = threading.Lock()
+
+    def _new_arena(self):
+        if self.spill_after_seconds:
+            return SpillArena(sample_rate=self.sample_rate,
+                              spill_after_seconds=self.spill_after_seconds, spill_dir=self.spill_dir)
+        return AudioArena(sample_rate=self.sample_rate)
+
+    def _open_stream(self):
+        stream_factory = self.stream_factory
+        if stream_factory is None:
+            # PortAudioが無い環境でもこのモジュールをインポートできるよう、ここで読み込む
+            import sounddevice as sd
+            stream_factory = sd.InputStream
+            device_rate = self.device_rate
+            if device_rate is None:
+                # 入力デバイスは録音の間に替わりうる（USBマイク→Bluetooth など）ので、毎回問い合わせる
+                device_rate = int(sd.query_devices(kind="input")["default_samplerate"])
+        else:
+            device_rate = self.device_rate or self.sample_rate
+        self.stream_rate = device_rate
+
+        if device_rate == self.sample_rate:
+            self.resampler = None
+        elif self.resampler is None or self.resampler.in_rate != device_rate:
+            self.resampler = PolyphaseResampler(device_rate, self.sample_rate)
+            print(f"Capturing at {device_rate} Hz; resampling to {self.sample_rate} Hz "
+                  f"({self.resampler.taps_per_phase} taps per output sample).")
+        else:
+            self.resampler.reset()
+
+        options = {}
+        if self.blocksize:
+            options["blocksize"] = self.blocksize
+        if self.latency is not None:
+            options["latency"] = self.latency
+        stream = stream_factory(samplerate=device_rate, channels=self.channels, callback=self._callback,
+                                **options)
+        stream.start()
+        return stream
+
+    def open_stream(self):
+        """
+        warm モードの入力ストリームを開いておく。失敗した場合は録音のたびに開く通常の動作に戻る。
+        """
+        if not self.warm or self.is_warm:
+            return
+        try:
+            self.stream = self._open_stream()
+            self.is_warm = True
+            print(f"Warm capture enabled ({self.preroll.capacity / self.sample_rate:.2f}s pre-roll).")
+        except Exception as e:
+            print(f"警告: 入力ストリームを開いたままにできませんでした: {e}")
+            self.stream = None
 
     def start_recording(self):
-        self.recording_data = []
+        # 前回の録音のビューを使っている処理があっても壊さないよう、毎回新しく確保する
+        recording_data = self._new_arena()
+        if self.is_warm:
+            # ストリームは開いたままなので、直前の音声を先頭に付けて書き込み先を切り替えるだけ
+            with self._switch_lock:
+                recording_data.write(self.preroll.snapshot())
+                self.preroll.clear()
+                self.recording_data = recording_data
+                self.is_recording = True
+            print("Recording started...")
+            return
+
+        self.recording_data = recording_data
         self.is_recording = True
         print("Recording started...")
         # InputStreamはスレッドで動作させるため、ここではループさせません
-        self.stream = sd.InputStream(samplerate=self.sample_rate, channels=self.channels, callback=self._callback)
-        self.stream.start()
+        self.stream = self._open_stream()
 
     def stop_recording(self):
         """
-        録音を停止し、結合された音声データをNumPy配列として返す。
+        録音を停止し、録音された音声データをNumPy配列として返す。
+        バッファのビューを返すため、停止時のコピーは発生しない。
         ファイルへの書き込みは行わない。
         """
         if not self.is_recording:
             return None
             
-        self.stream.stop()
-        self.stream.close()
-        self.is_recording = False
+        if self.is_warm:
+            # ストリームは閉じずに、書き込み先をプリロール用のリングバッファに戻す
+            with self._switch_lock:
+                self.is_recording = False
+        else:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+            self.is_recording = False
+            if self.resampler is not None:
+                # フィルタの遅延分として残っている録音の末尾を書き出す
+                self.recording_data.write(self.resampler.flush())
         print("Recording stopped.")
 
-        if not self.recording_data:
+        if len(self.recording_data) == 0:
             print("No audio recorded.")
             return None
         
-        # NumPy配列に変換
-        recording_np = np.concatenate(self.recording_data, axis=0)
-        
-        # Whisperが期待する1次元配列に変換して返す
-        return recording_np.flatten()
+        # Whisperが期待する1次元配列のビューを返す
+        return self.recording_data.view()
+
+    def get_audio(self, start=0):
+        """
+        録音を止めずに、start サンプル目から現在までの音声を1次元配列で返す。
+        ストリーミング文字起こしから録音中に呼ばれる。
+        """
+        if len(self.recording_data) == 0:
+            return None
+        return self.recording_data.read(start)
 
     def _callback(self, indata, frames, time, status):
         """InputStreamから呼ばれるコールバック関数"""
         if status:
-            print(status)
-        self.recording_data.append(indata.copy())
+            # オーディオスレッドでは print せず、カウンターだけ更新する
+            if status.input_overflow:
+                tracing.incr_owned("audio_input_overflows")
+            if status.input_underflow:
+                tracing.incr_owned("audio_input_underflows")
+        # (frames, channels) のブロックを sample_rate のモノラルにしてから、バッファへ1回だけコピーする
+        if self.resampler is not None:
+            samples = self.resampler.process(indata)
+        else:
+            samples = downmix(indata)
+        if len(samples) == 0:
+            return
+        with self._switch_lock:
+            if not self.is_recording:
+                # warm モードで待機中は、直近の音声だけを保持してレベルは送らない
+                self.preroll.write(samples)
+                return
+            self.recording_data.write(samples)
         
-        # UIキューが存在すれば、音声データをキューに追加します
-        if self.ui_queue:
-            # 新しいデータをキューに入れます
-            self.ui_queue.put(indata.copy().flatten())
+        # 音声そのものではなく、ブロックごとのレベルだけをUIに送ります
+        if self.level_channel is not None:
+            self.level_channel.put(*compute_levels(samples))
+
+    def close(self):
+        """開いたままのストリームを閉じる"""
+        with self._switch_lock:
+            self.is_recording = False
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        self.is_warm = False
 
 # このファイルは直接実行せず、他のファイルから呼び出して使います。
\ No newline at end of file
@@ -0,0 +1,165 @@
+# batch_retranscribe.py
+#
+# 履歴に保存された録音を、別のモデルでまとめて文字起こしし直すコマンド。
+# 各ワーカープロセスがモデルを1つずつ常駐させて並列にデコードし、結果は
+# retranscriptions テーブルにまとめて書き込む。チェックポイントから再開できる。
+#
+#   python batch_retranscribe.py --model large-v3 --workers 2
+#   python batch_retranscribe.py --model large-v3 --resume
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import config
+import database
+from audio_archive import load_audio
+from transcription_backends import SAMPLE_RATE
+
+# ワーカープロセスごとに常駐させる TranscriptionService
+_service = None
+
+
+def _init_worker(model_size, backend, use_vad):
+    global _service
+    from transcription import TranscriptionService
+    _service = TranscriptionService(model_size=model_size, backend=backend, use_vad=use_vad)
+    _service.load_model()
+
+
+def _transcribe(task):
+    """ワーカープロセスで1件の録音を文字起こしする"""
+    recording_id, file_path = task
+    try:
+        audio = load_audio(file_path)
+        if audio is None:
+            return recording_id, None, 0.0, 0.0, f"audio file not found: {file_path}"
+        audio_seconds = len(audio) / SAMPLE_RATE
+
+        if _service.use_vad:
+            vad_result = _service.trim_silence(audio)
+            if not vad_result.has_speech:
+                return recording_id, "", audio_seconds, 0.0, None
+            audio = vad_result.audio
+
+        start = time.perf_counter()
+        result = _service.decode(audio)
+        return recording_id, result.get("text", "").strip(), audio_seconds, time.perf_counter() - start, None
+    except Exception as e:
+        return recording_id, None, 0.0, 0.0, str(e)
+
+
+class Checkpoint:
+    """処理済みの位置と統計をJSONファイルに保存する"""
+    def __init__(self, path, model):
+        self.path = path
+        self.data = {"model": model, "last_id": 0, "processed": 0, "failed": 0, "audio_seconds": 0.0}
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("model") == self.data["model"]:
+                self.data = data
+        return self.data["last_id"]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def iter_tasks(model, after_id, page_size=500):
+    """未処理の録音を (id, file_path) として id 順に返す"""
+    page = []
+    for recording in database.iter_recordings_by_id(after_id, page_size):
+        page.append((recording.id, recording.file_path))
+        if len(page) == page_size:
+            yield from _unprocessed(model, page)
+            page = []
+    yield from _unprocessed(model, page)
+
+
+def _unprocessed(model, page):
+    if not page:
+        return
+    done = database.get_retranscribed_ids(model, [recording_id for recording_id, _ in page])
+    for task in page:
+        if task[0] not in done:
+            yield task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-transcribe archived recordings with another model")
+    parser.add_argument("--model", required=True, help="モデルサイズ (例: large-v3)")
+    parser.add_argument("--backend", default=config.TRANSCRIPTION_BACKEND)
+    parser.add_argument("--workers", type=int, default=1, help="ワーカープロセス数（各プロセスがモデルを1つ常駐させる）")
+    parser.add_argument("--write-batch", type=int, default=50, help="1トランザクションで書き込む件数")
+    parser.add_argument("--limit", type=int, default=0, help="処理する最大件数 (0 = 全件)")
+    parser.add_argument("--no-vad", action="store_true")
+    parser.add_argument("--db", help="履歴DBのパス（省略時はアプリと同じDB）")
+    parser.add_argument("--checkpoint", help="チェックポイントファイルのパス")
+    parser.add_argument("--resume", action="store_true", help="チェックポイントの続きから再開する")
+    args = parser.parse_args()
+
+    database.get_engine(args.db)
+    checkpoint_path = args.checkpoint or os.path.join(
+        config.APP_SUPPORT_DIR, f"retranscribe-{args.backend}-{args.model}.json"
+    )
+    checkpoint = Checkpoint(checkpoint_path, args.model)
+    after_id = checkpoint.load() if args.resume else 0
+    if after_id:
+        print(f"Resuming after recording #{after_id} ({checkpoint.data['processed']} already processed).")
+
+    pending = []
+    wall_start = time.perf_counter()
+    audio_seconds = 0.0
+
+    def flush():
+        database.add_retranscriptions(pending)
+        checkpoint.save()
+        pending.clear()
+
+    # spawn にすることで、各ワーカーがクリーンな状態でモデルを読み込む
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers, initializer=_init_worker,
+                      initargs=(args.model, args.backend, not args.no_vad)) as pool:
+        # imap は投入順に結果を返すため、チェックポイントには連続して処理済みの最後の id を保存できる
+        tasks = iter_tasks(args.model, after_id)
+        if args.limit:
+            tasks = itertools.islice(tasks, args.limit)
+        for recording_id, text, seconds, decode_seconds, error in pool.imap(_transcribe, tasks):
+            checkpoint.data["last_id"] = recording_id
+            if error:
+                checkpoint.data["failed"] += 1
+                print(f"  #{recording_id}: {error}")
+            else:
+                checkpoint.data["processed"] += 1
+                checkpoint.data["audio_seconds"] += seconds
+                audio_seconds += seconds
+                pending.append({
+                    "recording_id": recording_id,
+                    "model": args.model,
+                    "backend": args.backend,
+                    "transcription": text,
+                    "decode_seconds": decode_seconds,
+                })
+            if len(pending) >= args.write_batch:
+                flush()
+                elapsed = time.perf_counter() - wall_start
+                print(f"  {checkpoint.data['processed']} processed, "
+                      f"{audio_seconds / elapsed:.1f} audio-hours per wall-clock hour")
+        flush()
+
+    elapsed = time.perf_counter() - wall_start
+    print(f"Done: {checkpoint.data['processed']} processed, {checkpoint.data['failed']} failed, "
+          f"{audio_seconds / 3600:.2f} audio hours in {elapsed / 3600:.2f} hours "
+          f"({audio_seconds / elapsed if elapsed else 0.0:.1f} audio-hours per wall-clock hour).")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+# benchmarks/bench_audio_buffer.py
+#
+# 録音バッファのマイクロベンチマーク。
+# 旧実装（ブロックごとに copy して list に追加し、停止時に concatenate）と
+# AudioArena を、コールバック1回あたりのコストと停止時のコストで比較する。
+#
+#   python -m benchmarks.bench_audio_buffer
+
+import argparse
+import time
+
+import numpy as np
+
+from audio_buffer import AudioArena
+
+SAMPLE_RATE = 16000
+
+
+class ListRecorder:
+    """比較用の旧実装（audio_handler.AudioRecorder の以前の書き方）"""
+    def __init__(self):
+        self.recording_data = []
+
+    def callback(self, indata):
+        self.recording_data.append(indata.copy())
+
+    def stop(self):
+        return np.concatenate(self.recording_data, axis=0).flatten()
+
+
+class ArenaRecorder:
+    def __init__(self):
+        self.recording_data = AudioArena(sample_rate=SAMPLE_RATE)
+
+    def callback(self, indata):
+        self.recording_data.write(indata.reshape(-1))
+
+    def stop(self):
+        return self.recording_data.view()
+
+
+def run(recorder_cls, seconds, blocksize):
+    block = np.random.default_rng(0).standard_normal((blocksize, 1)).astype(np.float32)
+    n_blocks = int(seconds * SAMPLE_RATE / blocksize)
+
+    recorder = recorder_cls()
+    start = time.perf_counter()
+    for _ in range(n_blocks):
+        recorder.callback(block)
+    callback_total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    audio = recorder.stop()
+    stop_time = time.perf_counter() - start
+    assert len(audio) == n_blocks * blocksize
+
+    return {
+        "callback_us": callback_total / n_blocks * 1e6,
+        "stop_ms": stop_time * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio buffer microbenchmark")
+    parser.add_argument("--blocksize", type=int, default=512)
+    args = parser.parse_args()
+
+    print(f"{'length':>8} {'impl':>6} {'callback [us/block]':>20} {'stop [ms]':>10}")
+    for label, seconds in (("10s", 10), ("5min", 5 * 60), ("30min", 30 * 60)):
+        for name, cls in (("list", ListRecorder), ("arena", ArenaRecorder)):
+            result = run(cls, seconds, args.blocksize)
+            print(f"{label:>8} {name:>6} {result['callback_us']:>20.2f} {result['stop_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
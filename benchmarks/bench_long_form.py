@@ -0,0 +1,70 @@
+# benchmarks/bench_long_form.py
+#
+# 長い録音の文字起こしのベンチマーク。
+# 録音全体を1回でデコードする従来の方法と、LongFormTranscriber で区間に分けて
+# 並列にデコードする方法を、停止から結果が出るまでの時間で比較する。
+# あわせて、SpillArena がメモリ上に置くサイズを AudioArena と比較する。
+#
+#   python -m benchmarks.bench_long_form --backend fake --minutes 10,30
+#   python -m benchmarks.bench_long_form --backend cpu --model small --minutes 5
+
+import argparse
+import time
+
+from audio_buffer import AudioArena, SpillArena
+from long_form import LongFormTranscriber
+from transcription import TranscriptionService
+
+from benchmarks.fixtures import SAMPLE_RATE, synthetic_speech
+
+BLOCKSIZE = 512
+
+
+def capture(arena, audio):
+    for i in range(0, len(audio), BLOCKSIZE):
+        arena.write(audio[i:i + BLOCKSIZE])
+    return arena.view()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-form transcription benchmark")
+    parser.add_argument("--backend", default="fake")
+    parser.add_argument("--model", default="large-v3-turbo")
+    parser.add_argument("--minutes", default="10,30", help="録音の長さ（分, カンマ区切り）")
+    parser.add_argument("--spill-after", type=float, default=5 * 60, help="メモリに置く秒数")
+    parser.add_argument("--workers", type=int, default=None, help="並列デコード数（省略時はバックエンドの上限）")
+    args = parser.parse_args()
+
+    service = TranscriptionService(model_size=args.model, backend=args.backend)
+    service.load_model()
+    service.warm_up()
+    long_form = LongFormTranscriber(service, min_seconds=0, max_workers=args.workers)
+
+    print(f"{'length':>8} {'arena RAM [MB]':>15} {'spill RAM [MB]':>15} "
+          f"{'serial [s]':>11} {'long-form [s]':>14} {'speedup':>8}")
+    for minutes in (float(m) for m in args.minutes.split(",") if m):
+        audio = synthetic_speech(minutes * 60)
+
+        arena = AudioArena(sample_rate=SAMPLE_RATE)
+        capture(arena, audio)
+        arena_mb = len(arena) * 4 / 1024 ** 2
+        spill = SpillArena(sample_rate=SAMPLE_RATE, spill_after_seconds=args.spill_after)
+        recorded = capture(spill, audio)
+        spill_mb = min(len(spill), spill.memory_size) * 4 / 1024 ** 2
+
+        service.long_form = None
+        start = time.perf_counter()
+        service.transcribe(recorded)
+        serial = time.perf_counter() - start
+
+        service.long_form = long_form
+        start = time.perf_counter()
+        service.transcribe(recorded)
+        parallel = time.perf_counter() - start
+
+        print(f"{minutes:>7.0f}m {arena_mb:>15.1f} {spill_mb:>15.1f} "
+              f"{serial:>11.2f} {parallel:>14.2f} {serial / parallel:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/bench_pipeline.py
+#
+# 録音 → 文字起こし → ペーストのエンドツーエンドのレイテンシを測るベンチマーク。
+# 実デバイス・UI・ペーストボードの代わりにスタンドインを使うため、macOS以外でも
+# fake / cpu バックエンドで実行できる。結果はコミット間で比較できるJSONで出力する。
+#
+#   python -m benchmarks.bench_pipeline --backend fake --output bench.json
+#   python -m benchmarks.bench_pipeline --compare bench.json
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from audio_handler import AudioRecorder
+from level_meter import LevelChannel
+from text_insertion import FakeKeyboard, FakePasteboard, create_inserter
+from transcription import TranscriptionService
+
+from benchmarks.fixtures import SAMPLE_RATE, load_wav, synthetic_speech
+
+BLOCKSIZE = 512
+
+
+class FakeInputStream:
+    """sd.InputStream のスタンドイン。ブロックはベンチマークから直接コールバックに渡す"""
+    def __init__(self, samplerate, channels, callback, **kwargs):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def run_once(service, audio):
+    """1回の録音〜ペーストを実行し、段階ごとの時間（秒）を返す"""
+    levels = LevelChannel()
+    recorder = AudioRecorder(level_channel=levels, stream_factory=FakeInputStream)
+    recorder.start_recording()
+
+    # キャプチャ: デバイスのブロックサイズ単位でコールバックに渡す
+    blocks = audio.reshape(-1, 1)
+    start = time.perf_counter()
+    for i in range(0, len(blocks), BLOCKSIZE):
+        recorder._callback(blocks[i:i + BLOCKSIZE], BLOCKSIZE, None, None)
+    capture = time.perf_counter() - start
+    levels.drain()
+
+    timings = {"capture_callbacks": capture}
+
+    start = time.perf_counter()
+    recorded = recorder.stop_recording()
+    timings["buffer_finalize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vad_result = service.trim_silence(recorded)
+    timings["vad"] = time.perf_counter() - start
+    trimmed = vad_result.audio if vad_result.has_speech else recorded
+
+    start = time.perf_counter()
+    features = service.backend.extract_features(trimmed)
+    timings["feature_extraction"] = time.perf_counter() - start if features is not None else None
+
+    # デコードには特徴量抽出も含まれる（バックエンドが内部で行うため）
+    start = time.perf_counter()
+    result = service.decode(trimmed)
+    timings["decode"] = time.perf_counter() - start
+
+    # 復元はアプリでは非同期に行われるため、計測後に flush() で戻す
+    inserter = create_inserter("pasteboard", FakePasteboard(), FakeKeyboard(),
+                               "public.utf8-plain-text", "cmd", call_later=lambda delay, func: None)
+    start = time.perf_counter()
+    inserter.insert(" " + result.get("text", "").strip())
+    timings["paste"] = time.perf_counter() - start
+    inserter.flush()
+
+    timings["stop_to_paste"] = (timings["buffer_finalize"] + timings["vad"]
+                                + timings["decode"] + timings["paste"])
+    timings["real_time_factor"] = timings["decode"] / (len(audio) / SAMPLE_RATE)
+    timings["vad_removed_seconds"] = vad_result.removed_seconds
+    return timings
+
+
+def summarize(runs):
+    """複数回の実行結果の中央値をとる"""
+    summary = {}
+    for key in runs[0]:
+        values = [r[key] for r in runs if r[key] is not None]
+        summary[key] = statistics.median(values) if values else None
+    return summary
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_cases = {case["name"]: case for case in baseline["cases"]}
+    print(f"\nComparison against {baseline_path} ({baseline.get('revision')}):")
+    for case in current["cases"]:
+        base = base_cases.get(case["name"])
+        if not base:
+            continue
+        for key in ("buffer_finalize", "decode", "paste", "stop_to_paste"):
+            old, new = base["timings"].get(key), case["timings"].get(key)
+            if old and new:
+                print(f"  {case['name']:>14} {key:>16}: {old * 1e3:9.2f} ms -> {new * 1e3:9.2f} ms "
+                      f"({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end record -> transcribe -> paste benchmark")
+    parser.add_argument("--backend", default="fake")
+    parser.add_argument("--model", default="large-v3-turbo")
+    parser.add_argument("--lengths", default="5,30,60", help="合成音声の長さ（秒, カンマ区切り）")
+    parser.add_argument("--fixture", action="append", default=[], help="16bit PCMのWAVファイル（複数可）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="結果のJSONを書き出すパス")
+    parser.add_argument("--compare", help="比較対象の過去の結果JSON")
+    args = parser.parse_args()
+
+    service = TranscriptionService(model_size=args.model, backend=args.backend)
+    load_start = time.perf_counter()
+    service.load_model()
+    service.warm_up()
+    model_load = time.perf_counter() - load_start
+
+    cases = [(f"synthetic_{s}s", synthetic_speech(float(s))) for s in args.lengths.split(",") if s]
+    cases += [(path, load_wav(path)) for path in args.fixture]
+
+    report = {
+        "revision": git_revision(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "model": service.model_path,
+        "model_load_seconds": model_load,
+        "cases": [],
+    }
+    for name, audio in cases:
+        # 録音長をブロックサイズの倍数に揃える
+        audio = audio[:len(audio) - len(audio) % BLOCKSIZE]
+        runs = [run_once(service, audio) for _ in range(args.repeat)]
+        report["cases"].append({
+            "name": name,
+            "audio_seconds": len(audio) / SAMPLE_RATE,
+            "timings": summarize(runs),
+        })
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
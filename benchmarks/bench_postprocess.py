@@ -0,0 +1,149 @@
+# benchmarks/bench_postprocess.py
+#
+# ペースト前の後処理 (PostProcessor) のベンチマーク。
+# 大量のルール（既定で1万件）を読み込んだときの
+#   - 全体のコンパイル時間と、ルールファイルを少し編集したときの差分の反映時間
+#   - 文字起こし結果の長さごとの処理時間 (p50 / p99)
+# を測り、ルールごとに正規表現で置換する素朴な方法と比べる。
+# 100語のテキストの p99 が --budget-ms を超えた場合は終了コード 1 で終わる。
+#
+#   python -m benchmarks.bench_postprocess
+#   python -m benchmarks.bench_postprocess --rules 50000 --budget-ms 2
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from postprocess import DEFAULT_FILLERS, PostProcessor, parse_rules
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+
+
+def make_rules(count, rng):
+    """製品名・略語・日本語の語句を模したルール"""
+    lines = []
+    seen = set()
+    while len(lines) < count:
+        kind = rng.random()
+        if kind < 0.2:
+            pattern = "".join(rng.choice(KATAKANA) for _ in range(rng.randint(3, 6)))
+            replacement = pattern + "社"
+        else:
+            words = ["".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 8)))
+                     for _ in range(rng.randint(1, 3))]
+            pattern = " ".join(words)
+            replacement = "".join(word.capitalize() for word in words) if kind < 0.7 else pattern.upper()
+        if pattern not in seen:
+            seen.add(pattern)
+            lines.append(f"{pattern} => {replacement}")
+    return lines
+
+
+def make_text(words, rules, rng):
+    """普通の単語に、ルールの語句とフィラーを混ぜた文字起こし結果"""
+    patterns = [line.split(" => ")[0] for line in rules]
+    tokens = []
+    for _ in range(words):
+        r = rng.random()
+        if r < 0.05:
+            tokens.append(rng.choice(patterns))
+        elif r < 0.08:
+            tokens.append(rng.choice(DEFAULT_FILLERS[:6]) + ",")
+        else:
+            tokens.append("".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 9))))
+    return " ".join(tokens).capitalize() + "."
+
+
+class NaiveReplacer:
+    """ルールごとに単語境界付きの正規表現で置換する素朴な実装（比較用）"""
+    def __init__(self, lines):
+        self.rules = [(re.compile(r"(?<![A-Za-z0-9])" + re.escape(pattern) + r"(?![A-Za-z0-9])", re.IGNORECASE),
+                       replacement)
+                      for pattern, replacement in parse_rules(lines).items()]
+
+    def process(self, text):
+        for regex, replacement in self.rules:
+            text = regex.sub(replacement, text)
+        return text
+
+
+def time_calls(function, texts, repeat):
+    samples = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            function(text)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-processing benchmark")
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--lengths", default="20,100,500", help="テキストの語数（カンマ区切り）")
+    parser.add_argument("--texts", type=int, default=50, help="長さごとのテキスト数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="100語のテキストの p99 の上限（ミリ秒）")
+    parser.add_argument("--skip-naive", action="store_true", help="素朴な実装との比較を省く")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rules = make_rules(args.rules, rng)
+    path = os.path.join(tempfile.mkdtemp(), "replacements.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(rules) + "\n")
+
+    start = time.perf_counter()
+    processor = PostProcessor(path, check_interval=0)
+    compile_seconds = time.perf_counter() - start
+
+    # 差分の反映: 10件の追加と、1件の置換後の変更
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n".join(make_rules(10, random.Random(1))) + "\n")
+    start = time.perf_counter()
+    processor.reload()
+    add_seconds = time.perf_counter() - start
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(rules[:-1] + [rules[-1].split(" => ")[0] + " => Changed"]) + "\n")
+    start = time.perf_counter()
+    processor.reload()
+    change_seconds = time.perf_counter() - start
+
+    print(f"\n{len(rules)} rules: full compile {compile_seconds * 1e3:.1f} ms, "
+          f"+10 rules {add_seconds * 1e3:.1f} ms, edit {change_seconds * 1e3:.1f} ms")
+
+    naive = None
+    if not args.skip_naive:
+        start = time.perf_counter()
+        naive = NaiveReplacer(rules)
+        print(f"naive regex compile {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    print(f"\n{'words':>6} {'p50 [ms]':>9} {'p99 [ms]':>9} {'naive p50 [ms]':>15} {'speedup':>8}")
+    failed = False
+    for words in (int(w) for w in args.lengths.split(",") if w):
+        texts = [make_text(words, rules, rng) for _ in range(args.texts)]
+        p50, p99 = time_calls(processor.process, texts, args.repeat)
+        if naive is not None:
+            naive_p50, _ = time_calls(naive.process, texts[:5], 1)
+            comparison = f"{naive_p50 * 1e3:>15.2f} {naive_p50 / p50:>7.0f}x"
+        else:
+            comparison = f"{'-':>15} {'-':>8}"
+        print(f"{words:>6} {p50 * 1e3:>9.3f} {p99 * 1e3:>9.3f} {comparison}")
+        if words == 100 and p99 * 1e3 > args.budget_ms:
+            failed = True
+
+    sample = make_text(20, rules, random.Random(2))
+    print(f"\nexample:\n  in:  {sample}\n  out: {processor.process(sample)}")
+    print(f"\nFAIL: 100-word p99 exceeds {args.budget_ms} ms" if failed else "\nOK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_profiles.py
+#
+# デコードプロファイル (fast / balanced / accurate) ごとのレイテンシと精度のベンチマーク。
+# 言語を検出させる場合と、LanguagePinner で固定した場合も比較する。
+# 精度は、WAV と同じ名前の .txt（正解の書き起こし）がある場合に単語誤り率で出す
+# （空白の無い日本語などの正解は文字誤り率）。
+#
+#   python -m benchmarks.bench_profiles --backend mlx --fixture samples/memo.wav
+#   python -m benchmarks.bench_profiles --backend fake
+
+import argparse
+import os
+import re
+import statistics
+import time
+
+from decode_profiles import DECODE_PROFILES, LanguagePinner
+from transcription import TranscriptionService
+
+from benchmarks.fixtures import SAMPLE_RATE, load_wav, synthetic_speech
+
+
+def _tokens(text):
+    text = re.sub(r"[^\w\s]", "", text.lower()).strip()
+    # 空白で区切られていない言語は文字単位で比べる
+    return text.split() if " " in text else list(text.replace(" ", ""))
+
+
+def error_rate(reference, hypothesis):
+    """単語（または文字）単位の編集距離を正解の長さで割った誤り率"""
+    ref, hyp = _tokens(reference), _tokens(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_cases(args):
+    cases = [(f"synthetic_{s}s", synthetic_speech(float(s)), None) for s in args.lengths.split(",") if s]
+    for path in args.fixture:
+        reference = None
+        text_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                reference = f.read().strip()
+        cases.append((os.path.basename(path), load_wav(path), reference))
+    return cases
+
+
+def run_profile(args, profile, pinned, cases):
+    pinner = LanguagePinner(min_observations=1, min_agreement=0.5, reprobe_every=0) if pinned else None
+    service = TranscriptionService(model_size=args.model, backend=args.backend, use_vad=True,
+                                   profile=profile, language_pinner=pinner)
+    service.load_model()
+    service.warm_up()
+    if pinner is not None:
+        # 最初の1回の検出で言語を固定させる
+        service.transcribe(cases[0][1][:SAMPLE_RATE * 5])
+
+    latencies, rtfs, errors = [], [], []
+    for _, audio, reference in cases:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            text = service.transcribe(audio)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            rtfs.append(elapsed / (len(audio) / SAMPLE_RATE))
+        if reference is not None:
+            errors.append(error_rate(reference, text))
+    return {
+        "latency": statistics.median(latencies),
+        "rtf": statistics.median(rtfs),
+        "error_rate": statistics.mean(errors) if errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode profile latency/accuracy benchmark")
+    parser.add_argument("--backend", default="fake")
+    parser.add_argument("--model", default="large-v3-turbo")
+    parser.add_argument("--lengths", default="3,10", help="合成音声の長さ（秒, カンマ区切り）")
+    parser.add_argument("--fixture", action="append", default=[],
+                        help="16bit PCMのWAVファイル（同名の .txt があれば正解として使う）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = load_cases(args)
+    results = []
+    for profile in DECODE_PROFILES:
+        for pinned in (False, True):
+            results.append((profile, pinned, run_profile(args, profile, pinned, cases)))
+
+    print(f"\n{'profile':>10} {'language':>9} {'latency [ms]':>13} {'RTF':>8} {'WER/CER':>8}")
+    for profile, pinned, result in results:
+        error = f"{result['error_rate'] * 100:7.1f}%" if result["error_rate"] is not None else f"{'-':>8}"
+        print(f"{profile:>10} {'pinned' if pinned else 'detect':>9} {result['latency'] * 1e3:>13.1f} "
+              f"{result['rtf']:>8.3f} {error}")
+
+
+if __name__ == '__main__':
+    main()
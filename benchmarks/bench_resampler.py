@@ -0,0 +1,50 @@
+# benchmarks/bench_resampler.py
+#
+# PolyphaseResampler の変換コストのベンチマーク。よくあるデバイスのレート・チャンネル数の
+# 音声をブロック単位で変換し、音声1秒あたりの処理時間を出す（オーディオスレッドで使える余裕の目安）。
+# 精度（理想的なリサンプリングとの比較）は tests/test_resampler.py で確認する。
+#
+#   python -m benchmarks.bench_resampler
+#   python -m benchmarks.bench_resampler --rates 44100,48000 --blocksize 256
+
+import argparse
+import time
+
+import numpy as np
+
+from resampler import PolyphaseResampler
+
+OUT_RATE = 16000
+
+
+def measure_cost(rate, channels, args):
+    audio = np.random.default_rng(0).standard_normal((rate * args.seconds, channels)).astype(np.float32) * 0.1
+    best = float("inf")
+    for _ in range(args.repeat):
+        resampler = PolyphaseResampler(rate, OUT_RATE)
+        start = time.perf_counter()
+        for i in range(0, len(audio), args.blocksize):
+            resampler.process(audio[i:i + args.blocksize])
+        best = min(best, time.perf_counter() - start)
+    return best / args.seconds, resampler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming polyphase resampler benchmark")
+    parser.add_argument("--rates", default="8000,22050,32000,44100,48000,96000")
+    parser.add_argument("--blocksize", type=int, default=512, help="コールバック1回あたりのフレーム数")
+    parser.add_argument("--seconds", type=int, default=20, help="コスト測定に使う音声の長さ")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rates = [int(r) for r in args.rates.split(",") if r]
+
+    print(f"{'rate':>7} {'ch':>3} {'up/down':>9} {'taps':>5} {'us per audio s':>15} {'CPU %':>7}")
+    for rate in rates:
+        for channels in (1, 2):
+            cost, resampler = measure_cost(rate, channels, args)
+            print(f"{rate:>7} {channels:>3} {f'{resampler.up}/{resampler.down}':>9} "
+                  f"{resampler.taps_per_phase:>5} {cost * 1e6:>15.0f} {cost * 100:>6.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_server_load.py
+#
+# transcription_server.py の負荷ベンチマーク。
+# 複数のクライアントが同時に短い音声を送り続けたときのスループット（リクエスト/秒・音声秒/秒）と
+# レイテンシ (p50 / p95)、平均バッチサイズを、バッチ処理あり・なしで比較する。
+# --socket を省略すると、一時ソケットでサーバーをこのプロセス内に立ち上げる。
+#
+#   python -m benchmarks.bench_server_load --backend fake --clients 1,4,16
+#   python -m benchmarks.bench_server_load --socket ~/Library/.../transcription.sock --clients 4
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from transcription import TranscriptionService
+from transcription_server import TranscriptionClient, TranscriptionServer
+
+from benchmarks.fixtures import SAMPLE_RATE, synthetic_speech
+
+
+def run_clients(socket_path, clients, requests_per_client, clip):
+    latencies = []
+    lock = threading.Lock()
+
+    def client_loop():
+        client = TranscriptionClient(socket_path)
+        try:
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                client.transcribe(clip)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription server load benchmark")
+    parser.add_argument("--socket", default=None, help="起動済みのサーバーのソケット（省略時はプロセス内で起動）")
+    parser.add_argument("--backend", default="fake")
+    parser.add_argument("--model", default="large-v3-turbo")
+    parser.add_argument("--clients", default="1,4,16", help="同時クライアント数（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=10, help="クライアントごとのリクエスト数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="1リクエストの音声の長さ（秒）")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="fake バックエンドの同時デコード数（mlx は1）")
+    args = parser.parse_args()
+
+    clip = synthetic_speech(args.seconds)
+    # キャッシュも VAD も使わず、毎回デコードさせる
+    modes = [("external", None)] if args.socket else [("batched", True), ("unbatched", False)]
+
+    print(f"{'mode':>10} {'clients':>8} {'req/s':>8} {'audio s/s':>10} "
+          f"{'p50 [ms]':>9} {'p95 [ms]':>9} {'avg batch':>10}")
+    for mode, batching in modes:
+        server = None
+        socket_path = args.socket
+        if batching is not None:
+            # fake バックエンドは Whisper と同じく30秒の窓単位で時間がかかるようにする
+            service = TranscriptionService(model_size=args.model, backend=args.backend, use_vad=False,
+                                           window_seconds=30.0, max_concurrency=args.concurrency)
+            service.load_model()
+            service.warm_up()
+            socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+            server = TranscriptionServer(service, socket_path, batching=batching)
+            server.start()
+        try:
+            stats_client = TranscriptionClient(socket_path)
+            for clients in (int(c) for c in args.clients.split(",") if c):
+                before = stats_client.stats()
+                elapsed, latencies = run_clients(socket_path, clients, args.requests, clip)
+                after = stats_client.stats()
+                batches = after["batches"] - before["batches"]
+                completed = after["completed"] - before["completed"]
+                total = len(latencies)
+                print(f"{mode:>10} {clients:>8} {total / elapsed:>8.1f} "
+                      f"{total * len(clip) / SAMPLE_RATE / elapsed:>10.1f} "
+                      f"{statistics.median(latencies) * 1e3:>9.1f} "
+                      f"{latencies[int(0.95 * (total - 1))] * 1e3:>9.1f} "
+                      f"{completed / batches if batches else 1.0:>10.2f}")
+            stats_client.close()
+        finally:
+            if server is not None:
+                server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_startup.py
+#
+# 起動時間のベンチマーク。python -X importtime でモジュールを読み込み、その出力から
+# 読み込み時間の合計と時間のかかったモジュールを表示する。
+# 合計が予算 (--budget-ms) を超えるか、起動時に読み込んではいけない重いモジュールが
+# 読み込まれた場合は終了コード 1 で終わる（起動時間の劣化を検出するため）。
+#
+#   python -m benchmarks.bench_startup                      # main_background の起動経路
+#   python -m benchmarks.bench_startup --module transcription_server --budget-ms 400 --allow numpy
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# main_background.py がキーリスナーを開始するまでに読み込んではいけないもの
+# （initialize() でバックグラウンドに読み込む）
+DEFAULT_FORBIDDEN = (
+    "numpy", "sqlalchemy", "sounddevice", "soundfile", "mlx", "mlx_whisper", "faster_whisper",
+    "ApplicationServices", "database", "transcription", "audio_handler", "floating_ui", "text_insertion",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module):
+    """
+    module を新しいプロセスで読み込み、{モジュール名: (自身の時間, 累積時間, 深さ)} と
+    トップレベルの累積時間の合計（マイクロ秒）を返す
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    modules = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), len(match[3]), match[4]
+        depth = (indent - 1) // 2
+        modules[name] = (self_us, cumulative_us, depth)
+        if depth == 0:
+            total += cumulative_us
+    return modules, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time startup benchmark")
+    parser.add_argument("--module", default="main_background")
+    parser.add_argument("--budget-ms", type=float, default=400.0, help="読み込み時間の合計の上限（ミリ秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="測定回数（最短の回を使う）")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--allow", action="append", default=[], help="読み込んでもよいモジュール")
+    args = parser.parse_args()
+
+    try:
+        runs = [measure(args.module) for _ in range(args.repeat)]
+    except RuntimeError as e:
+        print(f"Could not import '{args.module}': {e}")
+        sys.exit(2)
+    modules, total = min(runs, key=lambda run: run[1])
+
+    forbidden = [name for name in DEFAULT_FORBIDDEN if name not in args.allow]
+    loaded = sorted(name for name in modules if name.split(".")[0] in forbidden)
+
+    print(f"{'self [ms]':>10} {'cumulative [ms]':>16}  module")
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us, _) in slowest:
+        print(f"{self_us / 1e3:>10.1f} {cumulative_us / 1e3:>16.1f}  {name}")
+
+    print(f"\nimport {args.module}: {total / 1e3:.1f} ms (best of {args.repeat}, budget {args.budget_ms:.0f} ms), "
+          f"{len(modules)} modules")
+    failed = False
+    if total / 1e3 > args.budget_ms:
+        print(f"FAIL: import time exceeds the budget by {total / 1e3 - args.budget_ms:.1f} ms")
+        failed = True
+    if loaded:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
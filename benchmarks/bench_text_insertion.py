@@ -0,0 +1,151 @@
+# benchmarks/bench_text_insertion.py
+#
+# テキスト挿入のベンチマーク（macOS不要）。
+# 旧実装（全種類のデータを退避し、0.1秒の sleep を2回入れる）と、
+# text_insertion の各挿入方法を、クリップボードの内容の大きさごとに比較する。
+# あわせて、復元・連続挿入・ペースト後のコピーの扱いが正しいことを確認する。
+#
+#   python -m benchmarks.bench_text_insertion
+
+import argparse
+import statistics
+import time
+
+from text_insertion import FakeKeyboard, FakePasteboard, PasteboardInsertion, TypingInsertion, create_inserter
+
+TEXT_TYPE = "public.utf8-plain-text"
+IMAGE_TYPE = "public.tiff"
+
+
+def legacy_paste(text_to_paste, pasteboard, keyboard_controller, string_type, modifier_key):
+    """比較用の旧実装（text_insertion.paste_text_safely の以前の書き方から print を除いたもの）"""
+    saved_items = []
+    for a_type in pasteboard.types() or []:
+        data = pasteboard.dataForType_(a_type)
+        if data:
+            saved_items.append({'type': a_type, 'data': data})
+    try:
+        pasteboard.clearContents()
+        pasteboard.setString_forType_(text_to_paste, string_type)
+        time.sleep(0.1)
+        with keyboard_controller.pressed(modifier_key):
+            keyboard_controller.press('v')
+            keyboard_controller.release('v')
+    finally:
+        time.sleep(0.1)
+        pasteboard.clearContents()
+        for item in saved_items:
+            pasteboard.setData_forType_(item['data'], item['type'])
+
+
+class ManualClock:
+    """call_later で予約された復元を、ベンチマークから明示的に実行する"""
+    def __init__(self):
+        self.pending = []
+
+    def call_later(self, delay, func):
+        self.pending.append(func)
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for func in pending:
+            func()
+
+
+def clipboard(image_bytes):
+    items = {TEXT_TYPE: b"previous clipboard"}
+    if image_bytes:
+        items[IMAGE_TYPE] = b"\0" * image_bytes
+    return items
+
+
+def check_behavior():
+    clock = ManualClock()
+    pasteboard = FakePasteboard(clipboard(0))
+    strategy = PasteboardInsertion(pasteboard, FakeKeyboard(), TEXT_TYPE, "cmd", call_later=clock.call_later)
+
+    # 復元される
+    strategy.insert("hello")
+    assert pasteboard.stringForType_(TEXT_TYPE) == "hello"
+    clock.run()
+    assert pasteboard.stringForType_(TEXT_TYPE) == "previous clipboard"
+
+    # 復元待ちの間に続けて挿入しても、元の内容が戻る
+    strategy.insert("one")
+    strategy.insert("two")
+    clock.run()
+    assert pasteboard.stringForType_(TEXT_TYPE) == "previous clipboard"
+
+    # ペースト後にユーザーがコピーした内容は上書きしない
+    strategy.insert("three")
+    pasteboard.clearContents()
+    pasteboard.setString_forType_("user copy", TEXT_TYPE)
+    clock.run()
+    assert pasteboard.stringForType_(TEXT_TYPE) == "user copy"
+
+    # 退避できない内容（画像・上限を超える内容）があればペーストボードに触れない
+    pasteboard = FakePasteboard(clipboard(8 * 1024 * 1024))
+    strategy = PasteboardInsertion(pasteboard, FakeKeyboard(), TEXT_TYPE, "cmd", call_later=clock.call_later)
+    assert not strategy.insert("image")
+    assert pasteboard.types() == [TEXT_TYPE, IMAGE_TYPE] and strategy.unsaved_types == [IMAGE_TYPE]
+    pasteboard = FakePasteboard({TEXT_TYPE: b"x" * 2 * 1024 * 1024})
+    strategy = PasteboardInsertion(pasteboard, FakeKeyboard(), TEXT_TYPE, "cmd",
+                                   max_backup_bytes=1024 * 1024, call_later=clock.call_later)
+    assert not strategy.insert("big")
+    assert pasteboard.dataForType_(TEXT_TYPE) == b"x" * 2 * 1024 * 1024
+
+    # どの方法でも挿入できなければ、戻さずにペーストしてテキストを残す
+    pasteboard = FakePasteboard(clipboard(8 * 1024 * 1024))
+    inserter = create_inserter("pasteboard", pasteboard, FakeKeyboard(), TEXT_TYPE, "cmd",
+                               call_later=clock.call_later)
+    assert inserter.insert("kept") == "unrestored"
+    clock.run()
+    assert pasteboard.stringForType_(TEXT_TYPE) == "kept"
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text insertion benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--text", default=" The quick brown fox jumps over the lazy dog.")
+    args = parser.parse_args()
+
+    check_behavior()
+
+    print(f"{'clipboard':>10} {'impl':>12} {'insert [ms]':>12} {'restore [ms]':>13}")
+    for label, image_bytes in (("text", 0), ("1MB", 1024 ** 2), ("32MB", 32 * 1024 ** 2)):
+        pasteboard = FakePasteboard(clipboard(image_bytes))
+        keyboard = FakeKeyboard()
+        elapsed = measure(lambda: legacy_paste(args.text, pasteboard, keyboard, TEXT_TYPE, "cmd"), args.repeat)
+        print(f"{label:>10} {'legacy':>12} {elapsed * 1e3:>12.3f} {'(included)':>13}")
+
+        clock = ManualClock()
+        pasteboard = FakePasteboard(clipboard(image_bytes))
+        strategy = PasteboardInsertion(pasteboard, keyboard, TEXT_TYPE, "cmd", call_later=clock.call_later)
+        inserts, restores = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            inserted = strategy.insert(args.text)
+            inserts.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            clock.run()
+            restores.append(time.perf_counter() - start)
+        # 画像があるとペーストボードは使わない（次の挿入方法に任せる）
+        print(f"{label:>10} {'pasteboard':>12} {statistics.median(inserts) * 1e3:>12.3f} "
+              f"{statistics.median(restores) * 1e3:>13.3f}{'' if inserted else '  (declined)'}")
+
+    typing = TypingInsertion(FakeKeyboard(), max_chars=len(args.text))
+    elapsed = measure(lambda: typing.insert(args.text), args.repeat)
+    print(f"{'-':>10} {'typing':>12} {elapsed * 1e3:>12.3f} {'-':>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_ui_refresh.py
+#
+# UI更新のメインスレッドの起床回数を、仮想時計のイベントループで比較する。
+# 旧実装（30Hz の NSTimer で常に polling）と RefreshScheduler を、
+# 録音中・処理中・待機中（非表示）の区間ごとに数える。
+#
+#   python -m benchmarks.bench_ui_refresh
+
+import argparse
+import heapq
+import itertools
+
+from level_meter import LevelChannel
+from ui_scheduler import MODE_ACTIVE, MODE_STOPPED, MODE_THROTTLED, RefreshScheduler
+
+SAMPLE_RATE = 16000
+
+
+class VirtualLoop:
+    """メインスレッドのランループの代わりになる、仮想時計のイベントキュー"""
+    def __init__(self):
+        self.now = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+
+    def clock(self):
+        return self.now
+
+    def call_later(self, delay, func):
+        heapq.heappush(self._queue, (self.now + delay, next(self._seq), func))
+
+    def post(self, func):
+        self.call_later(0.0, func)
+
+    def run_until(self, deadline):
+        while self._queue and self._queue[0][0] <= deadline:
+            when, _, func = heapq.heappop(self._queue)
+            self.now = when
+            func()
+        self.now = deadline
+
+
+def audio_blocks(loop, channel, start, seconds, blocksize):
+    """オーディオスレッドのコールバックを模して、ブロックごとにレベル値を送る"""
+    interval = blocksize / SAMPLE_RATE
+    for i in range(int(seconds / interval)):
+        loop.call_later(start + i * interval - loop.now, lambda: channel.put(0.1, 0.2))
+
+
+def run_polling(phases, blocksize):
+    loop = VirtualLoop()
+    channel = LevelChannel()
+    wakeups = {name: 0 for name, _, _ in phases}
+    t = 0.0
+    for name, mode, seconds in phases:
+        if mode == MODE_ACTIVE:
+            audio_blocks(loop, channel, t, seconds, blocksize)
+        # 旧実装は表示中（録音中・処理中）は常に 30Hz で起きる
+        if mode != MODE_STOPPED:
+            for i in range(int(seconds * 30)):
+                def tick(name=name):
+                    wakeups[name] += 1
+                    channel.drain()
+                loop.call_later(t + i / 30.0 - loop.now, tick)
+        t += seconds
+        loop.run_until(t)
+    return wakeups
+
+
+def run_event_driven(phases, blocksize, max_fps):
+    loop = VirtualLoop()
+    channel = LevelChannel()
+    scheduler = RefreshScheduler(channel.drain, post=loop.post, call_later=loop.call_later,
+                                 max_fps=max_fps, clock=loop.clock)
+    channel.listener = scheduler.notify
+    wakeups = {}
+    t = 0.0
+    for name, mode, seconds in phases:
+        scheduler.set_mode(mode)
+        if mode == MODE_ACTIVE:
+            audio_blocks(loop, channel, t, seconds, blocksize)
+        before = scheduler.wakeups
+        t += seconds
+        loop.run_until(t)
+        wakeups[name] = scheduler.wakeups - before
+    return wakeups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UI refresh wakeup benchmark")
+    parser.add_argument("--blocksize", type=int, default=512)
+    parser.add_argument("--max-fps", type=float, default=60.0)
+    args = parser.parse_args()
+
+    phases = [
+        ("recording", MODE_ACTIVE, 10.0),
+        ("processing", MODE_THROTTLED, 2.0),
+        ("idle", MODE_STOPPED, 60.0),
+    ]
+    polling = run_polling(phases, args.blocksize)
+    event_driven = run_event_driven(phases, args.blocksize, args.max_fps)
+
+    print(f"{'phase':>12} {'seconds':>8} {'polling':>9} {'event':>9}")
+    for name, _, seconds in phases:
+        print(f"{name:>12} {seconds:>8.1f} {polling[name]:>9} {event_driven[name]:>9}")
+    print(f"{'total':>12} {sum(s for _, _, s in phases):>8.1f} "
+          f"{sum(polling.values()):>9} {sum(event_driven.values()):>9}")
+
+
+if __name__ == '__main__':
+    main()
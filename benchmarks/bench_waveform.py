@@ -0,0 +1,121 @@
+# benchmarks/bench_waveform.py
+#
+# 波形表示の形状計算のベンチマーク（AppKit不要）。
+# 旧実装（np.roll で配列を作り直し、バーごとに Python で高さと色を計算）と
+# WaveformGeometry を、1フレームあたりの時間と確保したメモリで比較する。
+#
+#   python -m benchmarks.bench_waveform
+
+import argparse
+import math
+import time
+import tracemalloc
+
+import numpy as np
+
+from waveform_geometry import WaveformGeometry
+
+
+class LegacyWaveform:
+    """比較用の旧実装（floating_ui.ModernWaveformView の以前の書き方から描画呼び出しを除いたもの）"""
+    def __init__(self, num_bars=32):
+        self.waveform_data = np.zeros(num_bars, dtype=np.float32)
+        self.smoothed_data = np.zeros(num_bars, dtype=np.float32)
+        self.peak_level = 0.01
+        self.animation_phase = 0.0
+
+    def push(self, rms):
+        self.waveform_data = np.roll(self.waveform_data, -1)
+        self.waveform_data[-1] = rms
+        self.smoothed_data = self.smoothed_data * 0.6 + self.waveform_data * 0.4
+        current_max = np.max(self.smoothed_data)
+        if current_max > self.peak_level:
+            self.peak_level = current_max
+        else:
+            self.peak_level = max(0.01, self.peak_level * 0.95)
+        self.animation_phase += 0.15
+        if self.animation_phase > 2 * math.pi:
+            self.animation_phase = 0.0
+
+    def compute(self, width, height):
+        num_bars = len(self.smoothed_data)
+        spacing = 2.0
+        bar_width = max(1.0, (width - spacing * (num_bars - 1)) / num_bars)
+        bars = []
+        for i, value in enumerate(self.smoothed_data):
+            x_pos = i * (bar_width + spacing)
+            normalized_value = value / self.peak_level if self.peak_level > 0 else 0
+            bar_height = max(2.0, normalized_value * height * 0.8)
+            if normalized_value > 0.1:
+                bar_height += math.sin(self.animation_phase + i * 0.2) * 1.0
+            if normalized_value > 0.3:
+                bucket = 2
+            elif normalized_value > 0.1:
+                bucket = 1
+            else:
+                bucket = 0
+            bars.append((x_pos, height / 2.0 - bar_height / 2, bar_height, bucket))
+        return bars
+
+
+def check_equivalent(levels, width, height):
+    """同じ入力に対して旧実装と同じ形状になることを確認する"""
+    legacy = LegacyWaveform()
+    geometry = WaveformGeometry()
+    for rms in levels:
+        legacy.push(rms)
+        geometry.push(rms)
+        bars = legacy.compute(width, height)
+        xs, ys, heights, buckets = geometry.compute(width, height)
+        expected = np.array([bar[:3] for bar in bars], dtype=np.float32)
+        assert np.allclose(expected[:, 0], xs, atol=1e-3)
+        assert np.allclose(expected[:, 1], ys, atol=1e-3)
+        assert np.allclose(expected[:, 2], heights, atol=1e-3)
+        assert [bar[3] for bar in bars] == buckets.tolist()
+
+
+def run(impl, levels, width, height):
+    # 1周目でバッファやキャッシュを温めてから計測する
+    for rms in levels[:64]:
+        impl.push(rms)
+        impl.compute(width, height)
+
+    start = time.perf_counter()
+    for rms in levels:
+        impl.push(rms)
+        impl.compute(width, height)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for rms in levels[:1000]:
+        impl.push(rms)
+        impl.compute(width, height)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "frame_us": elapsed / len(levels) * 1e6,
+        "alloc_peak_bytes": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waveform geometry benchmark")
+    parser.add_argument("--frames", type=int, default=30 * 60, help="計測するフレーム数（30Hzで1分 = 1800）")
+    parser.add_argument("--width", type=float, default=200.0)
+    parser.add_argument("--height", type=float, default=40.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    levels = np.abs(rng.standard_normal(args.frames)).astype(np.float32) * 0.1
+    check_equivalent(levels[:200], args.width, args.height)
+
+    print(f"{'impl':>10} {'frame [us]':>12} {'CPU @30Hz [%]':>14} {'alloc peak [B]':>15}")
+    for name, impl in (("legacy", LegacyWaveform()), ("geometry", WaveformGeometry())):
+        result = run(impl, levels.tolist(), args.width, args.height)
+        cpu = result["frame_us"] * 30 / 1e6 * 100
+        print(f"{name:>10} {result['frame_us']:>12.2f} {cpu:>14.4f} {result['alloc_peak_bytes']:>15}")
+
+
+if __name__ == '__main__':
+    main()
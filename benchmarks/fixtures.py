@@ -0,0 +1,54 @@
+# benchmarks/fixtures.py
+#
+# ベンチマーク用の音声フィクスチャ（合成音声・WAVファイル）
+
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_speech(seconds, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    発話に似た合成音声を作る。基本周波数が揺れる倍音をシラブル単位で振幅変調し、
+    ところどころにポーズと弱いノイズを入れる（VADやバッファ処理が実際に近い負荷になる）。
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    f0 = 120.0 + 30.0 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+
+    # 4Hz前後のシラブル包絡と、1.5〜3秒ごとのポーズ
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t + rng.uniform(0, np.pi)), 0, None)
+    gate = np.ones(n)
+    pos = 0
+    while pos < n:
+        pos += int(rng.uniform(1.5, 3.0) * sample_rate)
+        gate[pos:pos + int(rng.uniform(0.3, 0.8) * sample_rate)] = 0.0
+
+    audio = 0.2 * voice * envelope * gate + 0.002 * rng.standard_normal(n)
+    return audio.astype(np.float32)
+
+
+def load_wav(path, sample_rate=SAMPLE_RATE):
+    """16bit PCM のWAVを読み込み、モノラル・16kHzの float32 に変換する"""
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        width = wav.getsampwidth()
+        frames = wav.readframes(wav.getnframes())
+    if width != 2:
+        raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+
+    audio = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate:
+        # フィクスチャの読み込み用なので線形補間で十分
+        positions = np.arange(int(len(audio) * sample_rate / rate)) * (rate / sample_rate)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
@@ -0,0 +1,81 @@
+# caret.py
+#
+# Accessibility API でテキストカーソル（キャレット）の画面座標を取得する。
+# ApplicationServices の読み込みには時間がかかるため、main_background.py は起動後に
+# バックグラウンドでこのモジュールを読み込む。
+
+import traceback
+
+try:
+    from ApplicationServices import (
+        AXUIElementCreateSystemWide,
+        AXUIElementCopyAttributeValue,
+        AXUIElementCopyParameterizedAttributeValue, # パラメータ付き属性を取得する関数
+        AXValueGetValue,
+        kAXFocusedUIElementAttribute,
+        kAXSelectedTextRangeAttribute,              # 選択されたテキスト範囲の属性
+        kAXBoundsForRangeParameterizedAttribute,    # 範囲の境界を取得するためのパラメータ付き属性
+        kAXPositionAttribute,                       # (フォールバック用に残す)
+        kAXSizeAttribute,                           # (フォールバック用に残す)
+        kAXValueCGPointType,                        # (フォールバック用に残す)
+        kAXValueCGSizeType,                         # (フォールバック用に残す)
+        kAXValueCGRectType                          # CGRect型の値を取得するために必要
+    )
+    from HIServices import kAXErrorSuccess
+    PYOBJC_AVAILABLE = True
+except ImportError as e:
+    print(f"警告: 必要なmacOSライブラリがインポートできませんでした: {e}")
+    PYOBJC_AVAILABLE = False
+
+
+def get_caret_bounds():
+    """
+    Accessibility APIを使い、現在フォーカスされているUI要素の
+    テキストカーソル（キャレット）の正確な画面座標を取得する。
+    """
+    if not PYOBJC_AVAILABLE:
+        return None
+
+    try:
+        # 1. システム全体でフォーカスされているUI要素を取得
+        system_wide_element = AXUIElementCreateSystemWide()
+        err, focused_element_ref = AXUIElementCopyAttributeValue(system_wide_element, kAXFocusedUIElementAttribute, None)
+        if err != kAXErrorSuccess or not focused_element_ref:
+            return None
+
+        # 2. フォーカスされた要素の「選択されたテキスト範囲」を取得
+        #    カーソルがあるだけの場合、これは位置情報を持つ「長さゼロの範囲」となる
+        err, selected_range_ref = AXUIElementCopyAttributeValue(focused_element_ref, kAXSelectedTextRangeAttribute, None)
+        if err != kAXErrorSuccess or not selected_range_ref:
+            return None
+
+        # 3.「範囲の境界」を取得するためのパラメータ化された属性を使って、カーソルの具体的な画面座標を要求
+        #    これがSwiftプロジェクトで使われていた核心的な技術
+        err, bounds_for_range_ref = AXUIElementCopyParameterizedAttributeValue(
+            focused_element_ref,
+            kAXBoundsForRangeParameterizedAttribute,
+            selected_range_ref,
+            None
+        )
+        if err != kAXErrorSuccess or not bounds_for_range_ref:
+            return None
+
+        # 4. 取得したAXValueからCGRect（座標とサイズ）を抽出
+        success, rect_value = AXValueGetValue(bounds_for_range_ref, kAXValueCGRectType, None)
+        if not success:
+            return None
+
+        # 5. フローティングUIが扱える辞書形式で座標を返す
+        #    注意: ここで得られる Y 座標は画面の上端が原点 (Top-Left)
+        print(f"  ↳ Caret found at: [x={rect_value.origin.x}, y={rect_value.origin.y}]")
+        return {
+            'x': rect_value.origin.x,
+            'y': rect_value.origin.y,
+            'width': rect_value.size.width,
+            'height': rect_value.size.height
+        }
+
+    except Exception as e:
+        print(f"\n[エラー] カーソル位置の検出中に予期せぬ例外が発生しました: {e}")
+        traceback.print_exc()
+        return None
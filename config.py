@@ -0,0 +1,110 @@
+# config.py
+#
+# アプリ全体の設定値。環境変数 (LOCALWHISPER_*) で上書きできる。
+
+import os
+
+APP_SUPPORT_DIR = os.path.expanduser('~/Library/Application Support/OpenSuperWhisperPy')
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(f"LOCALWHISPER_{name}")
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value.lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+# 文字起こしバックエンド: "mlx" (Apple silicon), "cpu" (faster-whisper / CTranslate2), "fake"
+TRANSCRIPTION_BACKEND = _env("BACKEND", "mlx")
+MODEL_SIZE = _env("MODEL_SIZE", "large-v3-turbo")
+# cpuバックエンドの量子化設定 (int8, int8_float16, float32 など)
+CPU_COMPUTE_TYPE = _env("CPU_COMPUTE_TYPE", "int8")
+# cpuバックエンドで同時に実行できるデコードの数
+CPU_NUM_WORKERS = _env("CPU_NUM_WORKERS", 2, int)
+# fakeバックエンドの遅延: 固定の遅延（秒）と、音声1秒あたりの処理時間（実時間係数）
+FAKE_LATENCY = _env("FAKE_LATENCY", 0.05, float)
+FAKE_REAL_TIME_FACTOR = _env("FAKE_RTF", 0.05, float)
+
+# 録音ごとにモデルを選ぶ場合のモデル（小さい順、カンマ区切り。例: "base,large-v3-turbo"）。空なら MODEL_SIZE のみ。
+# 予測デコード時間が ROUTER_MIN_LATENCY + ROUTER_LATENCY_PER_SECOND * 音声の秒数 に収まる最大のモデルを使い、
+# ROUTER_ESCALATE が有効なら信頼度の低い結果を1つ大きいモデルでやり直す。
+# ルーターを使う場合、STREAMING_TRANSCRIPTION と文字起こし結果のキャッシュは無効になる
+ROUTER_MODELS = _env("ROUTER_MODELS", "")
+ROUTER_MIN_LATENCY = _env("ROUTER_MIN_LATENCY", 0.25, float)
+ROUTER_LATENCY_PER_SECOND = _env("ROUTER_LATENCY_PER_SECOND", 0.1, float)
+ROUTER_ESCALATE = _env("ROUTER_ESCALATE", True, bool)
+
+# デコード設定のプロファイル: fast / balanced / accurate（decode_profiles.py）
+DECODE_PROFILE = _env("DECODE_PROFILE", "balanced")
+# 言語を固定する場合は "ja" や "en" などを指定する。空の場合は最近の検出結果から学習して固定する
+LANGUAGE = _env("LANGUAGE", None)
+LANGUAGE_PINNING = _env("LANGUAGE_PINNING", True, bool)
+
+# 録音中から逐次文字起こしを行い、停止後は未確定の末尾だけをデコードする（ROUTER_MODELS を指定した場合は無効）
+STREAMING_TRANSCRIPTION = _env("STREAMING", True, bool)
+# 入力ストリームを常に開いておき、録音開始前の直近 PREROLL_SECONDS 秒を録音の先頭に付ける。
+# デバイスを開く時間で最初の音が欠けなくなるが、待機中もマイクを使用中になる
+WARM_CAPTURE = _env("WARM_CAPTURE", False, bool)
+PREROLL_SECONDS = _env("PREROLL_SECONDS", 0.3, float)
+# 入力デバイスを開くサンプリングレート（0 はデバイスの標準のレート）。16kHz への変換はアプリ側で行う
+AUDIO_DEVICE_RATE = _env("AUDIO_DEVICE_RATE", 0, int)
+# 入力チャンネル数（複数の場合は平均してモノラルにする）
+AUDIO_CHANNELS = _env("AUDIO_CHANNELS", 1, int)
+# コールバック1回あたりのフレーム数（0 はホストに任せる）と入力のレイテンシ（"low" / "high" / 秒数）
+AUDIO_BLOCKSIZE = _env("AUDIO_BLOCKSIZE", 0, int)
+AUDIO_LATENCY = _env("AUDIO_LATENCY", "low")
+# 長い録音: SPILL_AFTER_SECONDS を超えた分はメモリではなく SPILL_DIR（省略時は一時ディレクトリ）の
+# ファイルに書き込み、LONG_FORM_MIN_SECONDS 以上の録音は無音の位置で区間に分けて並列にデコードする。
+# 区間に分けるのは並列にデコードできるバックエンド（cpu で CPU_NUM_WORKERS > 1 など）だけで、mlx では行わない
+LONG_FORM_ENABLED = _env("LONG_FORM", True, bool)
+SPILL_AFTER_SECONDS = _env("SPILL_AFTER_SECONDS", 5 * 60, float)
+SPILL_DIR = _env("SPILL_DIR", None)
+LONG_FORM_MIN_SECONDS = _env("LONG_FORM_MIN_SECONDS", 2 * 60, float)
+LONG_FORM_CHUNK_SECONDS = _env("LONG_FORM_CHUNK_SECONDS", 28.0, float)
+LONG_FORM_OVERLAP_SECONDS = _env("LONG_FORM_OVERLAP_SECONDS", 1.0, float)
+# この秒数だけ文字起こしが行われなければモデルをアンロードする（0で無効）
+MODEL_IDLE_TIMEOUT = _env("MODEL_IDLE_TIMEOUT", 15 * 60, float)
+# 文字起こし待ちにできるジョブの上限（これを超えると新しい録音は破棄される）
+MAX_PENDING_TRANSCRIPTIONS = _env("MAX_PENDING_TRANSCRIPTIONS", 3, int)
+
+# transcription_server.py のソケット。指定するとアプリ自身はモデルを読み込まず、サーバーに文字起こしを頼む
+DEFAULT_SERVER_SOCKET = os.path.join(APP_SUPPORT_DIR, "transcription.sock")
+SERVER_SOCKET = _env("SERVER_SOCKET", "")
+
+# ペースト前の後処理（postprocess.py）: ルールファイルによる語句の置換、フィラーの削除、句読点の整形
+POSTPROCESS_ENABLED = _env("POSTPROCESS", True, bool)
+POSTPROCESS_RULES = _env("POSTPROCESS_RULES", os.path.join(APP_SUPPORT_DIR, "replacements.txt"))
+REMOVE_FILLERS = _env("REMOVE_FILLERS", True, bool)
+NORMALIZE_PUNCTUATION = _env("NORMALIZE_PUNCTUATION", True, bool)
+
+# テキストの挿入方法（カンマ区切りで、先に書いたものから試す）:
+#   accessibility: Accessibility API で直接挿入（対応していないアプリがある）
+#   typing: TYPING_MAX_CHARS 文字以下をキー入力で送る（日本語入力が有効だと変換されてしまう）
+#   pasteboard: クリップボード経由でペーストし、元の内容を後で戻す（元の内容を退避できない場合は使わない）
+# 既定ではクリップボードに画像などがあるときだけ accessibility で挿入する。どれも失敗した場合は
+# テキストが失われないよう、元の内容を戻さずにペーストする（オーバーレイに表示される）
+INSERTION_STRATEGIES = _env("INSERTION_STRATEGIES", "pasteboard,accessibility")
+TYPING_MAX_CHARS = _env("TYPING_MAX_CHARS", 24, int)
+# クリップボードの内容の合計がこれより大きい場合（と画像などがある場合）は pasteboard を使わない
+PASTEBOARD_BACKUP_MAX_BYTES = _env("PASTEBOARD_BACKUP_MAX_BYTES", 4 * 1024 * 1024, int)
+# ペーストしてからクリップボードを元に戻すまでの時間（秒）
+PASTEBOARD_RESTORE_DELAY = _env("PASTEBOARD_RESTORE_DELAY", 0.25, float)
+
+# 録音の保存（ハッシュ値をファイル名にした圧縮ファイル）。形式は flac / opus / pcm
+ARCHIVE_ENABLED = _env("ARCHIVE", True, bool)
+ARCHIVE_DIR = _env("ARCHIVE_DIR", os.path.join(APP_SUPPORT_DIR, "audio"))
+ARCHIVE_FORMAT = _env("ARCHIVE_FORMAT", "flac")
+ARCHIVE_MAX_BYTES = _env("ARCHIVE_MAX_BYTES", 2 * 1024 ** 3, int)
+
+# 文字起こし結果の永続キャッシュ。録音全体を1回でデコードした結果だけを保存・参照する
+# （ストリーミング時のアプリの文字起こしは対象外で、主にサーバーとベンチマークで使われる）
+CACHE_ENABLED = _env("CACHE", True, bool)
+CACHE_PATH = _env("CACHE_PATH", os.path.join(APP_SUPPORT_DIR, "transcription_cache.sqlite"))
+CACHE_MAX_BYTES = _env("CACHE_MAX_BYTES", 64 * 1024 * 1024, int)
+
+# スパン・メトリクスを trace.jsonl と localwhisper.prom に書き出す
+TRACING_ENABLED = _env("TRACING", True, bool)
+TRACE_DIR = _env("TRACE_DIR", os.path.join(APP_SUPPORT_DIR, "traces"))
+TRACE_EXPORT_INTERVAL = _env("TRACE_EXPORT_INTERVAL", 5.0, float)
@@ -1,17 +1,21 @@
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, inspect
-from sqlalchemy.orm import declarative_base, sessionmaker
 import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, insert, select, text, and_, or_, Column, Integer, String, DateTime, Float, Index, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import declarative_base, sessionmaker
 
 # アプリケーションのサポートディレクトリにDBファイルを作成
 app_support_dir = os.path.expanduser('~/Library/Application Support/OpenSuperWhisperPy')
-os.makedirs(app_support_dir, exist_ok=True)
 db_path = os.path.join(app_support_dir, 'recordings.sqlite')
-engine = create_engine(f'sqlite:///{db_path}')
 
-# セッションを作成
-Session = sessionmaker(bind=engine)
-session = Session()
+# セッションファクトリ。エンジンは初めて使われるときに get_engine() で作成・バインドする
+Session = sessionmaker(expire_on_commit=False)
 
 # モデルのベースクラス
 Base = declarative_base()
@@ -24,25 +28,320 @@ class Recording(Base):
     transcription = Column(String, nullable=False)
     duration = Column(Float, nullable=False)
 
+    # 新しい順の一覧をキーセットページネーションで取得するためのインデックス
+    __table_args__ = (Index('ix_recordings_timestamp_id', 'timestamp', 'id'),)
+
     def __repr__(self):
         return f"<Recording(timestamp='{self.timestamp}', transcription='{self.transcription[:20]}...')>"
 
-# テーブルが存在しない場合は作成する
-inspector = inspect(engine)
-if not inspector.has_table("recordings"):
-    Base.metadata.create_all(engine)
+
+class Retranscription(Base):
+    """別のモデルで録音を文字起こしし直した結果（batch_retranscribe.py が書き込む）"""
+    __tablename__ = 'retranscriptions'
+    id = Column(Integer, primary_key=True)
+    recording_id = Column(Integer, ForeignKey('recordings.id', ondelete='CASCADE'), nullable=False)
+    model = Column(String, nullable=False)
+    backend = Column(String, nullable=False)
+    transcription = Column(String, nullable=False)
+    decode_seconds = Column(Float, nullable=False)
+    timestamp = Column(DateTime, default=datetime.datetime.now)
+
+    __table_args__ = (UniqueConstraint('recording_id', 'model', name='uq_retranscriptions_recording_model'),)
+
+    def __repr__(self):
+        return f"<Retranscription(recording_id={self.recording_id}, model='{self.model}')>"
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    接続ごとにSQLiteのPRAGMAを設定する。WALモードにより、書き込み中でも
+    他のスレッドからの読み込みがブロックされない。
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WALモードではNORMALでもクラッシュ時にDBが壊れない（直近のコミットが失われる可能性のみ）
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")  # 約16MB
+    cursor.execute("PRAGMA mmap_size=67108864")  # 64MB
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def get_engine(path=None):
+    """
+    エンジンを作成してセッションファクトリにバインドする（初回のみ）。
+    テーブルが存在しない場合は作成する。
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            path = path or db_path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _engine = create_engine(f'sqlite:///{path}')
+            event.listen(_engine, "connect", _set_sqlite_pragmas)
+            Base.metadata.create_all(_engine)
+            _create_search_index(_engine)
+            Session.configure(bind=_engine)
+        return _engine
+
+
+# SQLite 3.34以降は trigram トークナイザで、日本語のように空白で区切られない文も部分一致で検索できる
+FTS_TOKENIZER = 'trigram' if sqlite3.sqlite_version_info >= (3, 34, 0) else 'unicode61 remove_diacritics 2'
+
+
+def _create_search_index(engine):
+    """
+    transcription の全文検索用 FTS5 テーブルと、recordings と同期させるトリガーを作成する。
+    既存のDBに対しても冪等に実行でき、FTSテーブルを新規作成した場合は既存の行から索引を作る。
+    """
+    with engine.begin() as conn:
+        # create_all は既存テーブルにインデックスを追加しないため、明示的に作成する
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_recordings_timestamp_id ON recordings (timestamp, id)"
+        )
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recordings_fts'"
+        ).first()
+        conn.exec_driver_sql(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS recordings_fts USING fts5(
+                transcription, content='recordings', content_rowid='id', tokenize='{FTS_TOKENIZER}'
+            )""")
+        conn.exec_driver_sql("""
+            CREATE TRIGGER IF NOT EXISTS recordings_fts_insert AFTER INSERT ON recordings BEGIN
+                INSERT INTO recordings_fts (rowid, transcription) VALUES (new.id, new.transcription);
+            END""")
+        conn.exec_driver_sql("""
+            CREATE TRIGGER IF NOT EXISTS recordings_fts_delete AFTER DELETE ON recordings BEGIN
+                INSERT INTO recordings_fts (recordings_fts, rowid, transcription)
+                VALUES ('delete', old.id, old.transcription);
+            END""")
+        conn.exec_driver_sql("""
+            CREATE TRIGGER IF NOT EXISTS recordings_fts_update AFTER UPDATE OF transcription ON recordings BEGIN
+                INSERT INTO recordings_fts (recordings_fts, rowid, transcription)
+                VALUES ('delete', old.id, old.transcription);
+                INSERT INTO recordings_fts (rowid, transcription) VALUES (new.id, new.transcription);
+            END""")
+        if not exists:
+            conn.exec_driver_sql("INSERT INTO recordings_fts (recordings_fts) VALUES ('rebuild')")
+
+
+@contextmanager
+def session_scope():
+    """
+    1つの作業単位ごとにセッションを作り、終了時にコミット（失敗時はロールバック）して閉じる。
+    セッションはスレッド間で共有しないこと。
+    """
+    get_engine()
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
 
 # 録音データを追加する関数の例
 def add_recording(file_path, transcription, duration):
-    new_recording = Recording(
-        file_path=file_path,
-        transcription=transcription,
-        duration=duration
-    )
-    session.add(new_recording)
-    session.commit()
+    with session_scope() as session:
+        new_recording = Recording(
+            file_path=file_path,
+            transcription=transcription,
+            duration=duration
+        )
+        session.add(new_recording)
     return new_recording
 
 # 全ての録音データを取得する関数の例
 def get_all_recordings():
-    return session.query(Recording).order_by(Recording.timestamp.desc()).all()
\ No newline at end of file
+    """全件をリストで返す。件数が多い場合は iter_recordings() を使うこと"""
+    return list(iter_recordings())
+
+
+def get_recordings_page(limit=50, before=None):
+    """
+    新しい順に最大 limit 件を返す（キーセットページネーション）。
+    before には前のページの最後の行の (timestamp, id) を渡す。OFFSETを使わないため、
+    何ページ目でもインデックスを辿るだけで済む。
+    """
+    query = select(Recording).order_by(Recording.timestamp.desc(), Recording.id.desc()).limit(limit)
+    if before is not None:
+        timestamp, recording_id = before
+        query = query.where(or_(
+            Recording.timestamp < timestamp,
+            and_(Recording.timestamp == timestamp, Recording.id < recording_id)
+        ))
+    with session_scope() as session:
+        return list(session.scalars(query))
+
+
+def iter_recordings(batch_size=500):
+    """全件を新しい順に遅延評価で返すイテレータ。メモリには1ページ分しか保持しない"""
+    before = None
+    while True:
+        page = get_recordings_page(batch_size, before)
+        yield from page
+        if len(page) < batch_size:
+            return
+        before = (page[-1].timestamp, page[-1].id)
+
+
+def iter_recordings_by_id(after_id=0, batch_size=500):
+    """id の昇順に遅延評価で返すイテレータ。after_id より後の行から始める（再開用）"""
+    while True:
+        query = (select(Recording).where(Recording.id > after_id)
+                 .order_by(Recording.id).limit(batch_size))
+        with session_scope() as session:
+            page = list(session.scalars(query))
+        yield from page
+        if len(page) < batch_size:
+            return
+        after_id = page[-1].id
+
+
+def get_retranscribed_ids(model, recording_ids):
+    """指定したモデルで文字起こし済みの recording_id の集合を返す"""
+    query = select(Retranscription.recording_id).where(
+        Retranscription.model == model, Retranscription.recording_id.in_(recording_ids)
+    )
+    with session_scope() as session:
+        return set(session.scalars(query))
+
+
+def add_retranscriptions(rows):
+    """再文字起こしの結果（辞書のリスト）を1トランザクションでまとめて挿入する"""
+    if not rows:
+        return
+    with session_scope() as session:
+        session.execute(insert(Retranscription).prefix_with("OR REPLACE"), rows)
+
+
+def _fts_query(query):
+    """ユーザーの入力を FTS5 のクエリに変換する（各語をフレーズとして扱い、AND で結ぶ）"""
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_recordings(query, limit=20):
+    """
+    文字起こし履歴を全文検索し、関連度 (bm25) の高い順に結果を返す。
+    各結果は id / timestamp / duration / snippet（一致箇所を [ ] で囲んだ抜粋）/ rank を持つ辞書。
+    """
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
+    if FTS_TOKENIZER == 'trigram' and min(len(term) for term in query.split()) < 3:
+        # trigram は3文字未満の語を索引から引けないため、部分一致で代用する
+        return _search_recordings_like(query, limit)
+
+    sql = text("""
+        SELECT r.id, r.timestamp, r.duration,
+               snippet(recordings_fts, 0, '[', ']', '…', 32) AS snippet,
+               bm25(recordings_fts) AS rank
+        FROM recordings_fts
+        JOIN recordings AS r ON r.id = recordings_fts.rowid
+        WHERE recordings_fts MATCH :query
+        ORDER BY rank
+        LIMIT :limit
+    """).columns(timestamp=DateTime)
+    with session_scope() as session:
+        return [dict(row._mapping) for row in session.execute(sql, {"query": fts_query, "limit": limit})]
+
+
+def _search_recordings_like(query, limit):
+    conditions = [Recording.transcription.contains(term, autoescape=True) for term in query.split()]
+    statement = (select(Recording).where(and_(*conditions))
+                 .order_by(Recording.timestamp.desc(), Recording.id.desc()).limit(limit))
+    with session_scope() as session:
+        return [
+            {"id": r.id, "timestamp": r.timestamp, "duration": r.duration,
+             "snippet": r.transcription[:80], "rank": 0.0}
+            for r in session.scalars(statement)
+        ]
+
+
+class HistoryWriter:
+    """
+    文字起こし結果をバックグラウンドのスレッドでまとめてDBに書き込むクラス。
+
+    add() はキューに積むだけなのでペースト処理をブロックしない。書き込みスレッドは
+    flush_interval 秒の間に届いたものを最大 batch_size 件ずつ1トランザクションで挿入する。
+    """
+    def __init__(self, batch_size=32, flush_interval=0.5, max_pending=1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, file_path, transcription, duration, timestamp=None):
+        """
+        録音を1件書き込み待ちにする（ブロックしない）。file_path は AudioArchive.store_async() が
+        返した Future でもよく、その場合は書き込みスレッドでパスが決まるのを待つ。
+        """
+        row = {
+            "timestamp": timestamp or datetime.datetime.now(),
+            "file_path": file_path,
+            "transcription": transcription,
+            "duration": duration,
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            print("HistoryWriter: queue is full; recording was not saved.")
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            stop = False
+            # 少しの間待って、続けて届いたものを同じトランザクションにまとめる
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            self._write(batch)
+            if stop:
+                break
+
+    def _write(self, batch):
+        for row in batch:
+            if isinstance(row["file_path"], Future):
+                try:
+                    row["file_path"] = row["file_path"].result()
+                except Exception as e:
+                    print(f"HistoryWriter: audio was not archived: {e}")
+                    row["file_path"] = ""
+        try:
+            with session_scope() as session:
+                session.execute(insert(Recording), batch)
+            self.written += len(batch)
+        except Exception as e:
+            print(f"HistoryWriter: failed to save {len(batch)} recordings: {e}")
+
+    def close(self, timeout=None):
+        """書き込み待ちのものをすべて書き込んでからスレッドを終了する"""
+        self._queue.put(None)
+        self._thread.join(timeout)
\ No newline at end of file
@@ -0,0 +1,100 @@
+# decode_profiles.py
+#
+# デコード設定のプロファイルと、ユーザーの言語を学習して言語検出を省く LanguagePinner。
+
+import threading
+from collections import Counter, deque
+
+# プロファイルごとのデコードオプション（mlx_whisper.transcribe / faster-whisper 共通の名前）
+#   fast:     貪欲デコード1回のみ。温度フォールバックも前の文脈での条件付けもしない
+#   balanced: 貪欲デコードで、明らかに失敗したときだけ少ない段数でフォールバックする
+#   accurate: ビームサーチ（対応するバックエンドのみ）と Whisper 標準のフォールバック
+DECODE_PROFILES = {
+    "fast": {
+        "temperature": (0.0,),
+        "beam_size": 1,
+        "condition_on_previous_text": False,
+    },
+    "balanced": {
+        "temperature": (0.0, 0.4, 0.8),
+        "beam_size": 1,
+        "best_of": 2,
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+    },
+    "accurate": {
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "beam_size": 5,
+        "best_of": 5,
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+    },
+}
+
+
+def profile_options(name):
+    """プロファイル名からデコードオプションの辞書（コピー）を返す"""
+    try:
+        return dict(DECODE_PROFILES[name])
+    except KeyError:
+        raise ValueError(f"Unknown decode profile: '{name}' (choose from {', '.join(DECODE_PROFILES)})")
+
+
+class LanguagePinner:
+    """
+    最近の文字起こしで検出された言語を覚え、十分に確かになったら言語を固定して
+    言語検出を省く。
+
+    固定するのは、直近 window 回の検出のうち min_observations 回以上が同じ言語で、
+    その割合が min_agreement 以上のとき。固定中も reprobe_every 回に1回は検出を行い、
+    違う言語が検出されたら固定を解除する（ユーザーが話す言語を変えた場合）。
+    """
+    def __init__(self, window=10, min_observations=5, min_agreement=0.8, reprobe_every=25,
+                 min_audio_seconds=1.0, fixed_language=None):
+        self.window = window
+        self.min_observations = min_observations
+        self.min_agreement = min_agreement
+        self.reprobe_every = reprobe_every
+        self.min_audio_seconds = min_audio_seconds
+        # 設定で言語が指定されている場合は常にその言語を使う
+        self.fixed_language = fixed_language
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.language = fixed_language
+        self._pinned_decodes = 0
+
+    def language_for(self, audio_seconds):
+        """
+        次のデコードで指定する言語を返す。None の場合は検出させる（その結果を observe() に渡す）。
+        """
+        if self.fixed_language:
+            return self.fixed_language
+        with self._lock:
+            if self.language is None or audio_seconds < self.min_audio_seconds:
+                return self.language
+            self._pinned_decodes += 1
+            if self.reprobe_every and self._pinned_decodes % self.reprobe_every == 0:
+                # 時々は検出させて、言語が変わっていないか確かめる
+                return None
+            return self.language
+
+    def observe(self, language, audio_seconds):
+        """言語を指定せずにデコードしたときの検出結果を記録する"""
+        if self.fixed_language or not language or audio_seconds < self.min_audio_seconds:
+            return
+        with self._lock:
+            if self.language and language != self.language:
+                print(f"LanguagePinner: detected '{language}' while pinned to '{self.language}'; unpinning.")
+                self.language = None
+                self._recent.clear()
+            self._recent.append(language)
+            if self.language is None:
+                top, count = Counter(self._recent).most_common(1)[0]
+                if count >= self.min_observations and count / len(self._recent) >= self.min_agreement:
+                    self.language = top
+                    self._pinned_decodes = 0
+                    print(f"LanguagePinner: pinned language to '{top}' "
+                          f"({count} of the last {len(self._recent)} detections).")
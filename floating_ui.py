@@ -1,12 +1,14 @@
 # floating_ui.py
 
 import AppKit
-import numpy as np
 from PyObjCTools import AppHelper
-import threading
-import queue
 import objc
-import math
+
+import tracing
+from ui_scheduler import MODE_ACTIVE, MODE_STOPPED, MODE_THROTTLED, RefreshScheduler
+from waveform_geometry import (
+    BUCKET_INACTIVE, BUCKET_PRIMARY, BUCKET_SECONDARY, NUM_BUCKETS, WaveformGeometry,
+)
 
 class ModernWaveformView(AppKit.NSView):
     """
@@ -15,11 +17,8 @@ class ModernWaveformView(AppKit.NSView):
     def initWithFrame_(self, frame):
         self = objc.super(ModernWaveformView, self).initWithFrame_(frame)
         if self:
-            # 波形データの初期化
-            self.waveform_data = np.zeros(32, dtype=np.float32)
-            self.smoothed_data = np.zeros(32, dtype=np.float32)
-            self.peak_level = 0.01
-            self.animation_phase = 0.0
+            # 波形データの初期化（形状の計算は事前確保したバッファで行う）
+            self.geometry = WaveformGeometry(num_bars=32)
             
             # 色の設定
             self.setup_colors()
@@ -32,33 +31,15 @@ class ModernWaveformView(AppKit.NSView):
         self.primary_color = AppKit.NSColor.systemBlueColor()
         self.secondary_color = AppKit.NSColor.systemGrayColor()
         self.inactive_color = AppKit.NSColor.tertiaryLabelColor()
+        # 描画のたびに色オブジェクトを作らないよう、バケットごとの色を先に作っておく
+        self.bucket_colors = [None] * NUM_BUCKETS
+        self.bucket_colors[BUCKET_PRIMARY] = self.primary_color.colorWithAlphaComponent_(0.8)
+        self.bucket_colors[BUCKET_SECONDARY] = self.secondary_color.colorWithAlphaComponent_(0.6)
+        self.bucket_colors[BUCKET_INACTIVE] = self.inactive_color.colorWithAlphaComponent_(0.4)
 
-    def update_waveform(self, data):
-        """波形データの更新"""
-        if data is None or len(data) == 0:
-            return
-            
-        # RMS値を計算
-        rms = float(np.sqrt(np.mean(data**2)))
-        
-        # データをシフトして新しい値を追加
-        self.waveform_data = np.roll(self.waveform_data, -1)
-        self.waveform_data[-1] = rms
-        
-        # スムージング
-        self.smoothed_data = self.smoothed_data * 0.6 + self.waveform_data * 0.4
-        
-        # ピークレベルの更新
-        current_max = np.max(self.smoothed_data)
-        if current_max > self.peak_level:
-            self.peak_level = current_max
-        else:
-            self.peak_level = max(0.01, self.peak_level * 0.95)
-        
-        # アニメーション位相の更新
-        self.animation_phase += 0.15
-        if self.animation_phase > 2 * math.pi:
-            self.animation_phase = 0.0
+    def update_waveform(self, rms, peak=None):
+        """波形データの更新（キャプチャ側で計算済みのRMS値を受け取る）"""
+        self.geometry.push(rms)
         
         # 再描画を要求
         self.setNeedsDisplay_(True)
@@ -70,67 +51,46 @@ class ModernWaveformView(AppKit.NSView):
         AppKit.NSRectFill(dirtyRect)
         
         bounds = self.bounds()
-        width = bounds.size.width
-        height = bounds.size.height
-        center_y = height / 2.0
-        
-        if not hasattr(self, 'smoothed_data') or len(self.smoothed_data) == 0:
-            return
-        
-        # バーの設定
-        num_bars = len(self.smoothed_data)
-        spacing = 2.0
-        bar_width = max(1.0, (width - spacing * (num_bars - 1)) / num_bars)
-        
-        # 各バーを描画
-        for i, value in enumerate(self.smoothed_data):
-            x_pos = i * (bar_width + spacing)
-            
-            # バーの高さを計算
-            normalized_value = value / self.peak_level if self.peak_level > 0 else 0
-            bar_height = max(2.0, normalized_value * height * 0.8)
-            
-            # 微細なアニメーション効果
-            if normalized_value > 0.1:
-                wave_effect = math.sin(self.animation_phase + i * 0.2) * 1.0
-                bar_height += wave_effect
-            
-            # バーの矩形を作成
-            bar_rect = AppKit.NSMakeRect(
-                x_pos,
-                center_y - bar_height / 2,
-                bar_width,
-                bar_height
-            )
-            
-            # 色を選択（値に応じて）
-            if normalized_value > 0.3:
-                color = self.primary_color.colorWithAlphaComponent_(0.8)
-            elif normalized_value > 0.1:
-                color = self.secondary_color.colorWithAlphaComponent_(0.6)
-            else:
-                color = self.inactive_color.colorWithAlphaComponent_(0.4)
-            
-            # バーを描画
-            color.set()
-            path = AppKit.NSBezierPath.bezierPathWithRoundedRect_xRadius_yRadius_(
-                bar_rect, bar_width / 2, bar_width / 2
+        xs, ys, heights, buckets = self.geometry.compute(bounds.size.width, bounds.size.height)
+        bar_width = self.geometry.bar_width
+        radius = bar_width / 2
+        
+        # 色バケットごとに1つのパスへまとめ、fill は最大 NUM_BUCKETS 回にする
+        paths = [None] * NUM_BUCKETS
+        for x_pos, y_pos, bar_height, bucket in zip(xs.tolist(), ys.tolist(), heights.tolist(), buckets.tolist()):
+            path = paths[bucket]
+            if path is None:
+                path = paths[bucket] = AppKit.NSBezierPath.bezierPath()
+            path.appendBezierPathWithRoundedRect_xRadius_yRadius_(
+                AppKit.NSMakeRect(x_pos, y_pos, bar_width, bar_height), radius, radius
             )
-            path.fill()
+        
+        for bucket, path in enumerate(paths):
+            if path is not None:
+                self.bucket_colors[bucket].set()
+                path.fill()
 
 
 class FloatingUIController:
     """
     シンプルで確実に動作するフローティングUI
     """
-    def __init__(self, data_queue):
-        self.data_queue = data_queue
+    def __init__(self, level_channel, on_ready=None):
+        # オーディオスレッドから (rms, peak) が送られてくる上限付きチャンネル
+        self.level_channel = level_channel
+        # setup_window() でウィンドウができた後に（メインスレッドで）呼ばれる
+        self.on_ready = on_ready
         self.window = None
         self.waveform_view = None
         self.progress_view = None
         self.status_label = None
-        self.timer = None
         self.is_processing = False
+
+        # 新しいレベル値が届いたときだけ再描画する（固定周期のタイマーは使わない）
+        self.refresh = RefreshScheduler(
+            self.update_frame, post=AppHelper.callAfter, call_later=AppHelper.callLater
+        )
+        self.level_channel.listener = self.refresh.notify
         
         print("FloatingUIController: 初期化中...")
         AppHelper.callLater(0, self.setup_window)
@@ -167,6 +127,8 @@ class FloatingUIController:
         self.setup_content_view()
         
         print("FloatingUIController: ウィンドウセットアップ完了")
+        if self.on_ready:
+            self.on_ready()
 
     def setup_content_view(self):
         """コンテンツビューのセットアップ"""
@@ -323,8 +285,10 @@ class FloatingUIController:
         # ウィンドウを表示
         self.window.setFrameOrigin_(AppKit.NSPoint(x, y))
         self.window.makeKeyAndOrderFront_(None)
+        self.refresh.set_max_fps(screen_max_fps(self.window.screen()))
         
-        # タイマーを開始
+        # 前回の録音の古いレベル値を捨ててから更新を開始
+        self.level_channel.clear()
         self.start_updating()
         print("FloatingUIController: ウィンドウ表示完了")
 
@@ -335,6 +299,8 @@ class FloatingUIController:
             
         print("FloatingUIController: 文字起こし処理中表示に切り替え")
         self.is_processing = True
+        # 波形は描かないので、残りのレベル値を低いフレームレートで捨てるだけにする
+        self.refresh.set_mode(MODE_THROTTLED)
         
         # 波形ビューを非表示にしてプログレスビューを表示
         if self.waveform_view:
@@ -347,6 +313,19 @@ class FloatingUIController:
         if self.status_label:
             self.status_label.setHidden_(False)
     
+    def show_message(self, message):
+        """処理中の表示の代わりにメッセージを表示する（挿入に失敗した場合など）"""
+        if not self.window:
+            return
+        if self.progress_view:
+            self.progress_view.stopAnimation_(None)
+            self.progress_view.setHidden_(True)
+        if self.waveform_view:
+            self.waveform_view.setHidden_(True)
+        if self.status_label:
+            self.status_label.setStringValue_(message)
+            self.status_label.setHidden_(False)
+
     def hide(self):
         """ウィンドウを非表示"""
         if not self.window:
@@ -362,6 +341,7 @@ class FloatingUIController:
             
         if self.status_label:
             self.status_label.setHidden_(True)
+            self.status_label.setStringValue_("Transcribing...")
             
         # 波形ビューを再表示（次回の録音のため）
         if self.waveform_view:
@@ -371,38 +351,37 @@ class FloatingUIController:
         self.window.orderOut_(None)
 
     def start_updating(self):
-        """更新タイマーを開始"""
-        if self.timer is None:
-            print("FloatingUIController: 更新タイマー開始")
-            self.timer = AppKit.NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
-                1.0/30.0, self, 'update:', None, True
-            )
+        """レベル値の通知による更新を開始"""
+        if self.refresh.mode != MODE_ACTIVE:
+            print("FloatingUIController: 更新開始")
+            self.refresh.set_mode(MODE_ACTIVE)
 
     def stop_updating(self):
-        """更新タイマーを停止"""
-        if self.timer:
-            print("FloatingUIController: 更新タイマー停止")
-            self.timer.invalidate()
-            self.timer = None
+        """更新を停止（通知が来てもメインスレッドを起こさない）"""
+        if self.refresh.mode != MODE_STOPPED:
+            print("FloatingUIController: 更新停止")
+            self.refresh.set_mode(MODE_STOPPED)
 
-    def update_(self, timer):
-        """データキューから音声データを取得して波形を更新"""
+    def update_frame(self):
+        """レベルチャンネルから値を取得して波形を更新"""
         try:
-            data_updated = False
-            while not self.data_queue.empty():
-                data = self.data_queue.get_nowait()
-                if self.waveform_view and data is not None:
-                    self.waveform_view.update_waveform(data)
-                    data_updated = True
-            
-            # デバッグ情報（必要に応じて）
-            # if data_updated:
-            #     print("FloatingUIController: 波形データ更新")
+            tracing.set_gauge("ui_level_queue_depth", len(self.level_channel))
+            levels = self.level_channel.drain()
+            if self.is_processing or not self.waveform_view:
+                return
+            for rms, peak in levels:
+                self.waveform_view.update_waveform(rms, peak)
                 
-        except queue.Empty:
-            pass
         except Exception as e:
             print(f"FloatingUIController: 更新エラー - {e}")
-            
-            
-            
\ No newline at end of file
+
+
+def screen_max_fps(screen):
+    """画面の最大リフレッシュレート（取得できない場合は None）"""
+    if screen is None:
+        screen = AppKit.NSScreen.mainScreen()
+    try:
+        # macOS 12 以降
+        return screen.maximumFramesPerSecond()
+    except AttributeError:
+        return None
@@ -0,0 +1,53 @@
+# level_meter.py
+
+from collections import deque
+
+import numpy as np
+
+
+def compute_levels(block):
+    """音声ブロックの RMS とピーク値を計算する（配列の一時確保を避ける）"""
+    n = block.size
+    if n == 0:
+        return 0.0, 0.0
+    rms = float(np.sqrt(np.dot(block, block) / n))
+    peak = float(max(block.max(), -block.min()))
+    return rms, peak
+
+
+class LevelChannel:
+    """
+    レベルメーターの値 (rms, peak) をUIに渡すための、上限付きのチャンネル。
+
+    満杯のときは最も古い値を捨てるため、UIが止まっていてもメモリは増えない。
+    deque の append / popleft はスレッドセーフなので、オーディオスレッドからも
+    ロックなしで書き込める。
+    listener を設定すると、値が届くたびに（書き込んだスレッドから）呼ばれる。
+    """
+    def __init__(self, maxlen=64, listener=None):
+        self._levels = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.listener = listener
+
+    def __len__(self):
+        return len(self._levels)
+
+    def put(self, rms, peak):
+        if len(self._levels) == self._levels.maxlen:
+            self.dropped += 1
+        self._levels.append((rms, peak))
+        listener = self.listener
+        if listener is not None:
+            listener()
+
+    def drain(self):
+        """溜まっている値を古い順にすべて取り出す"""
+        levels = []
+        while True:
+            try:
+                levels.append(self._levels.popleft())
+            except IndexError:
+                return levels
+
+    def clear(self):
+        self._levels.clear()
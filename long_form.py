@@ -0,0 +1,156 @@
+# long_form.py
+#
+# 長い録音（会議や長い口述）の文字起こし。
+# 録音全体を無音の位置で30秒弱の区間に分け、前後に少し重なりを付けてデコードし、
+# 単語のタイムスタンプで重なり部分の重複を取り除いてつなげる。区間ごとに独立して
+# デコードできるため、バックエンドが並列に処理できる数だけ同時にデコードする。
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tracing
+from transcription import _normalize_word
+from transcription_backends import SAMPLE_RATE
+from vad import detect_speech
+
+
+class Chunk:
+    """デコードする区間。[start, end) がこの区間の担当範囲で、デコードは重なりを含めた [decode_start, decode_end) で行う"""
+    def __init__(self, index, start, end, decode_start, decode_end, speech_seconds):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.decode_start = decode_start
+        self.decode_end = decode_end
+        self.speech_seconds = speech_seconds
+
+    def __repr__(self):
+        return (f"<Chunk #{self.index} {self.start / SAMPLE_RATE:.1f}-{self.end / SAMPLE_RATE:.1f}s "
+                f"speech={self.speech_seconds:.1f}s>")
+
+
+def plan_chunks(audio, sample_rate=SAMPLE_RATE, chunk_seconds=28.0, min_chunk_seconds=10.0,
+                overlap_seconds=1.0, min_silence_seconds=0.3):
+    """
+    録音を区間に分ける。各区間は [min_chunk_seconds, chunk_seconds] の範囲にある最も長い
+    無音の中央で区切り、そのような無音が無ければ chunk_seconds で区切る。
+    """
+    n = len(audio)
+    speech, hop = detect_speech(audio, sample_rate)
+
+    # 無音区間の中央を区切りの候補にする（長い無音ほど優先）
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    silence_starts = np.flatnonzero(edges == -1) * hop
+    silence_ends = np.minimum(np.flatnonzero(edges == 1) * hop, n)
+    lengths = silence_ends - silence_starts
+    usable = lengths >= int(min_silence_seconds * sample_rate)
+    centers = ((silence_starts + silence_ends) // 2)[usable]
+    lengths = lengths[usable]
+
+    chunk = int(chunk_seconds * sample_rate)
+    min_chunk = int(min_chunk_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+
+    cuts = [0]
+    while n - cuts[-1] > chunk:
+        pos = cuts[-1]
+        in_window = (centers >= pos + min_chunk) & (centers <= pos + chunk)
+        if in_window.any():
+            candidates = np.flatnonzero(in_window)
+            cut = int(centers[candidates[np.argmax(lengths[candidates])]])
+        else:
+            cut = pos + chunk
+        cuts.append(cut)
+    cuts.append(n)
+
+    # 発話量は VAD のフレーム単位で数える
+    speech_cumsum = np.concatenate(([0], np.cumsum(speech)))
+    chunks = []
+    for index, (start, end) in enumerate(zip(cuts[:-1], cuts[1:])):
+        frames = speech_cumsum[min(end // hop, len(speech))] - speech_cumsum[min(start // hop, len(speech))]
+        chunks.append(Chunk(index, start, end, max(0, start - overlap), min(n, end + overlap),
+                            frames * hop / sample_rate))
+    return chunks
+
+
+def stitch(chunk_words, tolerance=0.5):
+    """
+    区間ごとの単語リスト [(start, end, word), ...]（絶対時刻, 秒）をつなげる。
+    各区間からは担当範囲に中央がある単語だけを採り、境界付近で前の区間と同じ単語が
+    ほぼ同じ時刻にあれば重複として捨てる。
+    """
+    words = []
+    for chunk, chunk_result in chunk_words:
+        lower = chunk.start / SAMPLE_RATE
+        upper = chunk.end / SAMPLE_RATE
+        owned = [w for w in chunk_result if lower <= (w[0] + w[1]) / 2 < upper]
+        # 境界をまたぐ単語は、両方の区間でタイムスタンプが少しずれて重複することがある
+        while owned and words:
+            first, last = owned[0], words[-1]
+            if (_normalize_word(first[2]) == _normalize_word(last[2])
+                    and abs(first[0] - last[0]) <= tolerance):
+                owned.pop(0)
+            else:
+                break
+        words.extend(owned)
+    return words
+
+
+class LongFormTranscriber:
+    """
+    長い録音を区間に分けて並列にデコードする。
+
+    TranscriptionService.long_form に設定すると、min_seconds より長い録音の
+    TranscriptionService.transcribe から呼ばれる。同時に実行するデコードの数は
+    バックエンドの max_concurrency まで。max_concurrency が1（mlx）では並列にならず、
+    区間の重なりと単語のタイムスタンプの分だけ遅くなるので、アプリでは設定しない。
+    """
+    def __init__(self, service, min_seconds=120.0, chunk_seconds=28.0, overlap_seconds=1.0,
+                 max_workers=None):
+        self.service = service
+        self.min_seconds = min_seconds
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_workers = max_workers or service.max_concurrency
+
+    def applies_to(self, audio):
+        return len(audio) >= self.min_seconds * SAMPLE_RATE
+
+    def _decode_chunk(self, audio, chunk, options):
+        # メモリマップされた録音から、この区間だけを連続した配列として読み込む
+        region = np.ascontiguousarray(audio[chunk.decode_start:chunk.decode_end], dtype=np.float32)
+        result = self.service.decode(region, word_timestamps=True, condition_on_previous_text=False, **options)
+        base = chunk.decode_start / SAMPLE_RATE
+        words = []
+        for segment in result.get("segments", []):
+            segment_words = segment.get("words")
+            if segment_words:
+                words.extend((base + w["start"], base + w["end"], w["word"]) for w in segment_words)
+            elif segment.get("text"):
+                # 単語のタイムスタンプが無い場合はセグメント単位で扱う
+                words.append((base + segment["start"], base + segment["end"], segment["text"]))
+        return words
+
+    def transcribe(self, audio, **options):
+        """録音全体の文字起こし結果（テキスト）を返す。options（言語など）は各区間のデコードに渡す"""
+        start = time.perf_counter()
+        with tracing.span("long_form_plan") as attrs:
+            chunks = plan_chunks(audio, chunk_seconds=self.chunk_seconds, overlap_seconds=self.overlap_seconds)
+            attrs["chunks"] = len(chunks)
+        # 発話の無い区間はデコードしない
+        voiced = [chunk for chunk in chunks if chunk.speech_seconds >= 0.1]
+        print(f"Long-form transcription: {len(audio) / SAMPLE_RATE:.1f}s in {len(chunks)} chunks "
+              f"({len(chunks) - len(voiced)} silent), {self.max_workers} parallel decodes.")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="long-form") as executor:
+            futures = [executor.submit(self._decode_chunk, audio, chunk, options) for chunk in voiced]
+            chunk_words = [(chunk, future.result()) for chunk, future in zip(voiced, futures)]
+
+        words = stitch(chunk_words)
+        elapsed = time.perf_counter() - start
+        tracing.record_span("long_form", elapsed, chunks=len(voiced), audio_seconds=len(audio) / SAMPLE_RATE)
+        print(f"Long-form transcription complete in {elapsed:.2f}s "
+              f"(RTF {elapsed / (len(audio) / SAMPLE_RATE):.3f}).")
+        return "".join(w[2] for w in words).strip()
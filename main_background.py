@@ -1,113 +1,266 @@
 # main_background.py
+#
+# 起動時に読み込むのはホットキーの検出とイベントループに必要なもの (pynput / AppKit) だけにして、
+# キーリスナーを最初に動かす。numpy・sounddevice・SQLAlchemy・Accessibility API・文字起こし
+# バックエンドなどの読み込みと初期化は、その後バックグラウンドのスレッドで行う
+# （python -m benchmarks.bench_startup で読み込み時間を確認できる）。
 
 import time
+
+# 起動時間の計測の基準
+_PROCESS_START = time.perf_counter()
+
 import threading
-import queue
 import traceback
 from pynput import keyboard
 from pynput.keyboard import Key, Controller as KeyboardController
 
-from audio_handler import AudioRecorder
-from transcription import TranscriptionService
-from floating_ui import FloatingUIController
+import config
+import tracing
 
 import AppKit
 from PyObjCTools import AppHelper
 
-# ▼▼▼ 変更点 1: 必要な定数をインポートリストに追加 ▼▼▼
-try:
-    from ApplicationServices import (
-        AXUIElementCreateSystemWide,
-        AXUIElementCopyAttributeValue,
-        AXUIElementCopyParameterizedAttributeValue, # パラメータ付き属性を取得する関数
-        AXValueGetValue,
-        kAXFocusedUIElementAttribute,
-        kAXSelectedTextRangeAttribute,              # 選択されたテキスト範囲の属性
-        kAXBoundsForRangeParameterizedAttribute,    # 範囲の境界を取得するためのパラメータ付き属性
-        kAXPositionAttribute,                       # (フォールバック用に残す)
-        kAXSizeAttribute,                           # (フォールバック用に残す)
-        kAXValueCGPointType,                        # (フォールバック用に残す)
-        kAXValueCGSizeType,                         # (フォールバック用に残す)
-        kAXValueCGRectType                          # CGRect型の値を取得するために必要
-    )
-    from HIServices import kAXErrorSuccess
-    PYOBJC_AVAILABLE = True
-except ImportError as e:
-    print(f"警告: 必要なmacOSライブラリがインポートできませんでした: {e}")
-    PYOBJC_AVAILABLE = False
-
 
 DOUBLE_TAP_THRESHOLD = 0.4
 
+
+def _parse_latency(value):
+    """AUDIO_LATENCY の値を InputStream の latency（"low" / "high" / 秒数）に変換する"""
+    if value in ("low", "high"):
+        return value
+    return float(value)
+
+
 class BackgroundRecorder:
     def __init__(self):
-        self.ui_queue = queue.Queue()
-        self.ui_controller = FloatingUIController(self.ui_queue)
-        
-        self.audio_recorder = AudioRecorder(ui_queue=self.ui_queue)
-        self.transcription_service = TranscriptionService(model_size="large-v3-turbo")
-        self.keyboard_controller = KeyboardController()
-        
         self.last_option_press_time = 0
-        
+        self.hotkey_detected_at = None
+        self.streaming_session = None
+        # 処理中の表示をしているジョブとそのストリーミング（Escで中止する対象）
+        self.displayed_job = None
+        self.displayed_session = None
+        # 初期化が終わるまでにホットキーが押された場合は、終わってから録音を始める
+        self.start_when_ready = False
+
+        # 以下は initialize() がバックグラウンドで作成する
+        self.level_channel = None
+        self.ui_controller = None
+        self.audio_recorder = None
+        self.scheduler = None
+        self.text_inserter = None
+        self.audio_archive = None
+        self.find_caret = None
+        self.history_writer = None
+        self.post_processor = None
+        self.transcription_cache = None
+        self.transcription_client = None
+        self.transcription_service = None
+        self.model_managers = []
+        # ルーターを使う場合に、録音開始時に先回りしてロードするモデルを選ぶための前回の録音の長さ（秒）
+        self.last_recording_seconds = 5.0
+        # 録音を始められる（音声・UI・テキスト挿入の準備ができた）
+        self.capture_ready = threading.Event()
+        # 文字起こしできる（モデル・キャッシュ・履歴DBの準備ができた）
+        self.transcription_ready = threading.Event()
+
         print("--- バックグラウンド録音・文字起こしツール ---")
         print("Optionキーを2回素早く押して、録音を開始/停止します。")
+        print("Escキーで録音または文字起こしを中止します。")
         print("このプログラムを終了するには、ターミナルで Ctrl+C を押してください。")
 
-    # ▼▼▼ 変更点 2: 新しい高精度なカーソル位置検出関数を実装 ▼▼▼
-    def get_caret_bounds(self):
+    def initialize(self):
+        """キーリスナーの開始後にバックグラウンドのスレッドで実行する"""
+        try:
+            with tracing.span("startup_capture"):
+                self.setup_capture()
+            # ウィンドウはメインスレッドでしか作れない
+            AppHelper.callAfter(self.setup_ui)
+            with tracing.span("startup_transcription"):
+                self.setup_transcription()
+            elapsed = time.perf_counter() - _PROCESS_START
+            tracing.record_span("startup_ready", elapsed)
+            print(f"Startup complete in {elapsed * 1e3:.0f} ms.")
+        except Exception as e:
+            print(f"[エラー] 初期化に失敗しました: {e}")
+            traceback.print_exc()
+        finally:
+            # 失敗した場合も、待っている文字起こしジョブはエラーとして終わらせる
+            self.transcription_ready.set()
+
+    def setup_capture(self):
+        """録音・波形表示・テキスト挿入に必要なモジュールを読み込む"""
+        from audio_archive import AudioArchive
+        from audio_handler import AudioRecorder
+        from caret import get_caret_bounds
+        from level_meter import LevelChannel
+        from scheduler import TranscriptionScheduler
+        from text_insertion import create_inserter
+        import floating_ui  # noqa: F401  setup_ui() の前に読み込んでおく
+
+        if config.TRACING_ENABLED:
+            tracing.tracer.start_exporter(config.TRACE_DIR, interval=config.TRACE_EXPORT_INTERVAL)
+
+        self.find_caret = get_caret_bounds
+        self.level_channel = LevelChannel()
+        self.audio_recorder = AudioRecorder(
+            level_channel=self.level_channel,
+            warm=config.WARM_CAPTURE,
+            preroll_seconds=config.PREROLL_SECONDS,
+            spill_after_seconds=config.SPILL_AFTER_SECONDS if config.LONG_FORM_ENABLED else None,
+            spill_dir=config.SPILL_DIR,
+            channels=config.AUDIO_CHANNELS,
+            device_rate=config.AUDIO_DEVICE_RATE or None,
+            blocksize=config.AUDIO_BLOCKSIZE,
+            latency=_parse_latency(config.AUDIO_LATENCY)
+        )
+        # warm モードではストリームを開いたままにし、録音開始時にデバイスを開く時間を無くす
+        self.audio_recorder.open_stream()
+        # 文字起こしは専用のワーカー1つで順番に処理する
+        self.scheduler = TranscriptionScheduler(max_queue=config.MAX_PENDING_TRANSCRIPTIONS)
+        self.audio_archive = None
+        if config.ARCHIVE_ENABLED:
+            self.audio_archive = AudioArchive(
+                config.ARCHIVE_DIR,
+                max_bytes=config.ARCHIVE_MAX_BYTES,
+                audio_format=config.ARCHIVE_FORMAT
+            )
+        self.keyboard_controller = KeyboardController()
+        self.text_inserter = create_inserter(
+            config.INSERTION_STRATEGIES,
+            AppKit.NSPasteboard.generalPasteboard(),
+            self.keyboard_controller,
+            AppKit.NSStringPboardType,
+            Key.cmd,
+            typing_max_chars=config.TYPING_MAX_CHARS,
+            max_backup_bytes=config.PASTEBOARD_BACKUP_MAX_BYTES,
+            restore_delay=config.PASTEBOARD_RESTORE_DELAY,
+            # 復元もペーストボードを触るのでメインスレッドで行う
+            call_later=AppHelper.callLater
+        )
+
+    def setup_ui(self):
+        """メインスレッドでフローティングUIを作成する。ウィンドウができたら on_ui_ready() が呼ばれる"""
+        from floating_ui import FloatingUIController
+
+        self.ui_controller = FloatingUIController(self.level_channel, on_ready=self.on_ui_ready)
+
+    def on_ui_ready(self):
         """
-        Accessibility APIを使い、現在フォーカスされているUI要素の
-        テキストカーソル（キャレット）の正確な画面座標を取得する。
+        オーバーレイのウィンドウができてから録音を受け付ける（それより前に録音を始めると
+        show_at() がウィンドウ無しで何もせず、オーバーレイが出ない）。
         """
-        if not PYOBJC_AVAILABLE:
-            return None
-        
-        try:
-            # 1. システム全体でフォーカスされているUI要素を取得
-            system_wide_element = AXUIElementCreateSystemWide()
-            err, focused_element_ref = AXUIElementCopyAttributeValue(system_wide_element, kAXFocusedUIElementAttribute, None)
-            if err != kAXErrorSuccess or not focused_element_ref:
-                return None
-
-            # 2. フォーカスされた要素の「選択されたテキスト範囲」を取得
-            #    カーソルがあるだけの場合、これは位置情報を持つ「長さゼロの範囲」となる
-            err, selected_range_ref = AXUIElementCopyAttributeValue(focused_element_ref, kAXSelectedTextRangeAttribute, None)
-            if err != kAXErrorSuccess or not selected_range_ref:
-                return None
-
-            # 3.「範囲の境界」を取得するためのパラメータ化された属性を使って、カーソルの具体的な画面座標を要求
-            #    これがSwiftプロジェクトで使われていた核心的な技術
-            err, bounds_for_range_ref = AXUIElementCopyParameterizedAttributeValue(
-                focused_element_ref,
-                kAXBoundsForRangeParameterizedAttribute,
-                selected_range_ref,
-                None
+        self.capture_ready.set()
+        elapsed = time.perf_counter() - _PROCESS_START
+        tracing.record_span("startup_capture_ready", elapsed)
+        print(f"Ready to record in {elapsed * 1e3:.0f} ms.")
+        if self.start_when_ready:
+            self.start_when_ready = False
+            self.handle_double_tap()
+
+    def setup_transcription(self):
+        """文字起こしのバックエンド（またはサーバーへの接続）と履歴DBを準備する"""
+        from database import HistoryWriter
+
+        if config.SERVER_SOCKET:
+            from transcription_server import TranscriptionClient
+            # モデルは transcription_server.py が読み込んでおり、アプリは音声を送るだけ
+            self.transcription_client = TranscriptionClient(config.SERVER_SOCKET)
+            print(f"Using transcription server at {config.SERVER_SOCKET}")
+        else:
+            self.setup_local_service()
+            if config.ROUTER_MODELS:
+                self.setup_router(config.ROUTER_MODELS)
+        if config.POSTPROCESS_ENABLED:
+            from postprocess import PostProcessor
+            self.post_processor = PostProcessor(
+                config.POSTPROCESS_RULES,
+                remove_fillers=config.REMOVE_FILLERS,
+                normalize=config.NORMALIZE_PUNCTUATION
             )
-            if err != kAXErrorSuccess or not bounds_for_range_ref:
-                return None
+        # 文字起こし結果はバックグラウンドでまとめて履歴DBに保存する
+        self.history_writer = HistoryWriter()
 
-            # 4. 取得したAXValueからCGRect（座標とサイズ）を抽出
-            success, rect_value = AXValueGetValue(bounds_for_range_ref, kAXValueCGRectType, None)
-            if not success:
-                return None
-            
-            # 5. フローティングUIが扱える辞書形式で座標を返す
-            #    注意: ここで得られる Y 座標は画面の上端が原点 (Top-Left)
-            print(f"  ↳ Caret found at: [x={rect_value.origin.x}, y={rect_value.origin.y}]")
-            return {
-                'x': rect_value.origin.x,
-                'y': rect_value.origin.y,
-                'width': rect_value.size.width,
-                'height': rect_value.size.height
-            }
+    def setup_local_service(self):
+        """このプロセスでモデルを読み込んで文字起こしする"""
+        from decode_profiles import LanguagePinner
+        from long_form import LongFormTranscriber
+        from model_manager import ModelManager
+        from transcription_cache import TranscriptionCache
 
-        except Exception as e:
-            print(f"\n[エラー] カーソル位置の検出中に予期せぬ例外が発生しました: {e}")
-            traceback.print_exc()
-            return None
+        if config.CACHE_ENABLED:
+            self.transcription_cache = TranscriptionCache(config.CACHE_PATH, max_bytes=config.CACHE_MAX_BYTES)
+        self.language_pinner = None
+        if config.LANGUAGE or config.LANGUAGE_PINNING:
+            self.language_pinner = LanguagePinner(fixed_language=config.LANGUAGE)
+        self.transcription_service = self.create_service(config.MODEL_SIZE, cache=self.transcription_cache)
+        # 区間に分けるのは並列にデコードできるバックエンドだけ（mlx では1回でデコードした方が速い）
+        if config.LONG_FORM_ENABLED and self.transcription_service.max_concurrency > 1:
+            self.transcription_service.long_form = LongFormTranscriber(
+                self.transcription_service,
+                min_seconds=config.LONG_FORM_MIN_SECONDS,
+                chunk_seconds=config.LONG_FORM_CHUNK_SECONDS,
+                overlap_seconds=config.LONG_FORM_OVERLAP_SECONDS
+            )
+        self.model_manager = ModelManager(self.transcription_service, idle_timeout=config.MODEL_IDLE_TIMEOUT)
+        # 初回の文字起こしでロードとコンパイルを待たないよう、起動時に先読みする
+        self.model_manager.preload()
+        self.model_managers = [self.model_manager]
+
+    def create_service(self, model_size, cache=None):
+        from transcription import TranscriptionService
+
+        return TranscriptionService(
+            model_size=model_size,
+            backend=config.TRANSCRIPTION_BACKEND,
+            cache=cache,
+            profile=config.DECODE_PROFILE,
+            language_pinner=self.language_pinner,
+            compute_type=config.CPU_COMPUTE_TYPE,
+            num_workers=config.CPU_NUM_WORKERS,
+            latency=config.FAKE_LATENCY,
+            real_time_factor=config.FAKE_REAL_TIME_FACTOR
+        )
+
+    def setup_router(self, model_sizes):
+        """
+        録音ごとに model_sizes（小さい順、カンマ区切り）から使うモデルを選ぶ ModelRouter を設定する。
+        MODEL_SIZE のモデルはストリーミングとキャッシュにも使うので、リストに無ければ最後に加える。
+        """
+        from model_manager import ModelManager
+        from transcription import ModelRouter
 
-    # (以前の get_editable_text_input_bounds 関数は不要になったため削除)
+        services = []
+        sizes = [size.strip() for size in model_sizes.split(",") if size.strip()]
+        if config.MODEL_SIZE not in sizes:
+            sizes.append(config.MODEL_SIZE)
+        for size in sizes:
+            if size == config.MODEL_SIZE:
+                services.append(self.transcription_service)
+                continue
+            service = self.create_service(size)
+            manager = ModelManager(service, idle_timeout=config.MODEL_IDLE_TIMEOUT)
+            manager.preload()
+            self.model_managers.append(manager)
+            services.append(service)
+        self.transcription_service.router = ModelRouter(
+            services,
+            scheduler=self.scheduler,
+            min_latency=config.ROUTER_MIN_LATENCY,
+            latency_per_second=config.ROUTER_LATENCY_PER_SECOND,
+            escalate=config.ROUTER_ESCALATE
+        )
+        print(f"Model router: {', '.join(service.model_path for service in services)}")
+
+    def managers_to_preload(self):
+        """
+        録音開始時に先回りしてロードするモデル。ルーターを使う場合は、前回と同じ長さの録音で
+        選ばれるモデルだけにする（それ以外のモデルは使われたときにロードされ、アイドルでアンロードされる）。
+        """
+        service = self.transcription_service
+        if service is None or service.router is None:
+            return self.model_managers
+        return [service.router.choose(self.last_recording_seconds).model_manager]
 
     def on_key_press(self, key):
         if key == Key.alt or key == Key.alt_r:
@@ -116,9 +269,47 @@ class BackgroundRecorder:
             self.last_option_press_time = current_time
 
             if time_diff < DOUBLE_TAP_THRESHOLD:
+                self.hotkey_detected_at = time.perf_counter()
                 AppHelper.callLater(0, self.handle_double_tap)
+        elif key == Key.esc:
+            AppHelper.callLater(0, self.handle_abort)
+
+    def handle_abort(self):
+        """
+        録音中なら録音を破棄し、処理中の表示をしている文字起こしがあればそのジョブだけを中止する。
+        Esc は他のアプリでの操作でも届くため、どちらでもなければ何もしない（他の待機中のジョブも残す）。
+        """
+        if not self.capture_ready.is_set():
+            self.start_when_ready = False
+            return
+        if self.audio_recorder.is_recording:
+            self.audio_recorder.stop_recording()
+            if self.streaming_session:
+                self.streaming_session.cancel()
+                self.streaming_session = None
+        elif self.displayed_job is not None and self.displayed_job.cancel():
+            if self.displayed_session:
+                self.displayed_session.cancel()
+            print(f"   ↳ Cancelled transcription job #{self.displayed_job.id}.")
+        else:
+            return
+        self.displayed_job = self.displayed_session = None
+        print("⏏️ Aborted.")
+        self.ui_controller.hide()
 
     def handle_double_tap(self):
+        if not self.capture_ready.is_set():
+            # 起動直後でまだ録音できない場合は、準備ができ次第始める（もう一度押すと取り消し）
+            self.start_when_ready = not self.start_when_ready
+            print("ℹ️ 起動中です。準備ができ次第、録音を開始します。" if self.start_when_ready
+                  else "ℹ️ 録音の予約を取り消しました。")
+            return
+        if self.hotkey_detected_at is not None:
+            # キーリスナーで検出してからメインスレッドで処理が始まるまでの時間
+            tracing.record_span("hotkey_detected", time.perf_counter() - self.hotkey_detected_at,
+                                recording=self.audio_recorder.is_recording)
+            self.hotkey_detected_at = None
+
         if not self.audio_recorder.is_recording:
             mouse_location = AppKit.NSEvent.mouseLocation()
             active_screen = AppKit.NSScreen.mainScreen()
@@ -127,91 +318,163 @@ class BackgroundRecorder:
                     active_screen = screen
                     break
             
+            # キャレットの検出を待たずに録音を始める（検出中の発話も録音される）
+            with tracing.span("stream_start", warm=self.audio_recorder.is_warm):
+                self.audio_recorder.start_recording()
+
             # ▼▼▼ 変更点 3: 新しい検出関数を呼び出すように変更 ▼▼▼
-            bounds = self.get_caret_bounds()
+            with tracing.span("caret_lookup") as attrs:
+                bounds = self.find_caret()
+                attrs["found"] = bool(bounds)
             
             if not bounds:
+                # 入力欄が無ければ、始めた録音は破棄する
+                self.audio_recorder.stop_recording()
                 print("ℹ️ 録音を開始できませんでした。編集可能なテキスト入力欄にカーソルを合わせてください。")
                 self.last_option_press_time = 0
                 return
 
             print("▶️ Recording started...")
+            # 表示が新しい録音に替わるので、前の録音のジョブは Esc の対象から外す
+            self.displayed_job = self.displayed_session = None
             self.ui_controller.show_at(bounds, active_screen.visibleFrame())
-            self.audio_recorder.start_recording()
+            # アイドルでアンロードされていた場合は録音中に再ロードしておく
+            for manager in self.managers_to_preload():
+                manager.ensure_loaded()
+            # ストリーミングは主モデルでデコードするため、ルーターを使う場合は行わない（config.py 参照）
+            if (config.STREAMING_TRANSCRIPTION and self.transcription_service is not None
+                    and self.transcription_service.router is None):
+                from transcription import StreamingTranscriber
+                self.streaming_session = StreamingTranscriber(
+                    self.transcription_service,
+                    self.audio_recorder.get_audio,
+                    sample_rate=self.audio_recorder.sample_rate,
+                    on_update=self.on_partial_result
+                )
+                self.streaming_session.start()
         else:
             print("⏹️ Recording stopped. Starting transcription...")
             # UIを文字起こし処理中の表示に変更（非表示にしない）
             self.ui_controller.show_processing()
-            processing_thread = threading.Thread(target=self.process_recording)
-            processing_thread.start()
+            self.process_recording()
 
-    def paste_text_safely(self, text_to_paste):
+    def insert_text(self, text_to_paste):
         """
-        現在のクリップボードの内容をバックアップ・復元しながら、安全にテキストをペーストする。
+        設定された方法でテキストを挿入する。ペーストボードを使った場合、元の内容は後で非同期に戻される。
         """
-        pasteboard = AppKit.NSPasteboard.generalPasteboard()
-        saved_items = []
-        try:
-            types = pasteboard.types()
-            if types:
-                for a_type in types:
-                    data = pasteboard.dataForType_(a_type)
-                    if data:
-                        saved_items.append({'type': a_type, 'data': data})
-            print("   ↳ Clipboard content backed up.")
-        except Exception as e:
-            print(f"   ↳ Warning: Could not back up clipboard content: {e}")
-
-        try:
-            pasteboard.clearContents()
-            pasteboard.setString_forType_(text_to_paste, AppKit.NSStringPboardType)
-            time.sleep(0.1)
-            with self.keyboard_controller.pressed(Key.cmd):
-                self.keyboard_controller.press('v')
-                self.keyboard_controller.release('v')
-            print("   ↳ Paste command sent.")
-
-        finally:
-            try:
-                time.sleep(0.1)
-                pasteboard.clearContents()
-                for item in saved_items:
-                    pasteboard.setData_forType_(item['data'], item['type'])
-                print("   ↳ Clipboard content restored.")
-            except Exception as e:
-                print(f"   ↳ Warning: Could not restore clipboard content: {e}")
+        with tracing.span("paste", chars=len(text_to_paste)) as attrs:
+            attrs["strategy"] = self.text_inserter.insert(text_to_paste)
+        return attrs["strategy"]
     
     def paste_text_and_hide_ui(self, text_to_paste):
         """テキストをペーストした後にUIを非表示にする"""
-        self.paste_text_safely(text_to_paste)
+        strategy = self.insert_text(text_to_paste)
+        if strategy is None or strategy == "unrestored":
+            # 挿入できなかった（またはクリップボードを上書きした）ことを、少しの間オーバーレイで知らせる
+            AppKit.NSBeep()
+            self.ui_controller.show_message("Could not insert text (saved in history)" if strategy is None
+                                            else "Pasted; clipboard was not restored")
+            AppHelper.callLater(3.0, self.hide_ui_if_idle)
+            return
         # ペースト処理の後、少し待ってからUIを非表示にする
-        AppHelper.callLater(0.1, self.ui_controller.hide)
+        AppHelper.callLater(0.1, self.hide_ui_if_idle)
+
+    def on_partial_result(self, committed_text, tentative_text):
+        """ストリーミング文字起こしの途中経過を表示する"""
+        print(f"   ↳ Partial: {committed_text} [{tentative_text}]")
 
     def process_recording(self):
-        """録音を停止し、文字起こしとテキスト設定を行う関数"""
-        audio_data = self.audio_recorder.stop_recording()
-
-        if audio_data is not None:
-            transcribed_text = self.transcription_service.transcribe(audio_data)
-            print(f"   ↳ Transcription result: {transcribed_text}")
-
-            if transcribed_text:
-                final_text = " " + transcribed_text.strip()
-                AppHelper.callLater(0, self.paste_text_and_hide_ui, final_text)
-            else:
-                # 文字起こし結果が空の場合はUIを非表示にする
-                AppHelper.callLater(0, self.ui_controller.hide)
-        else:
+        """録音を停止し、文字起こしジョブをスケジューラに投入する関数"""
+        with tracing.span("stop"):
+            audio_data = self.audio_recorder.stop_recording()
+        streaming_session, self.streaming_session = self.streaming_session, None
+
+        if audio_data is None:
+            if streaming_session:
+                streaming_session.cancel()
             print("   ↳ Recording data was too short; processing cancelled.")
             # 録音データが短すぎる場合はUIを非表示にする
-            AppHelper.callLater(0, self.ui_controller.hide)
+            self.ui_controller.hide()
+            return
+
+        duration = len(audio_data) / self.audio_recorder.sample_rate
+        self.last_recording_seconds = duration
+        file_path = ""
+        if self.audio_archive:
+            # ハッシュ値の計算・エンコード・書き込みはアーカイブのスレッドで行われる。
+            # file_path はパスの Future で、履歴の書き込みスレッドで解決される
+            file_path = self.audio_archive.store_async(audio_data)
+        job = self.scheduler.submit(
+            lambda job: self.transcribe_recording(job, audio_data, streaming_session),
+            on_result=lambda job, text: self.on_transcription_result(job, text, duration, file_path),
+            on_error=self.on_transcription_error
+        )
+        if job is None:
+            if streaming_session:
+                streaming_session.cancel()
+            print("   ↳ Too many pending transcriptions; recording discarded.")
+            self.ui_controller.hide()
+        else:
+            self.displayed_job, self.displayed_session = job, streaming_session
+            print(f"   ↳ Queued transcription job #{job.id} (queue depth {self.scheduler.depth}).")
+
+    def transcribe_recording(self, job, audio_data, streaming_session):
+        """ワーカースレッドで実行される文字起こし処理"""
+        if not self.transcription_ready.is_set():
+            # 起動直後の録音は、モデルなどの準備ができるまで待つ
+            print("   ↳ Waiting for the transcription backend to finish starting...")
+            self.transcription_ready.wait()
+        if job.cancelled:
+            # Esc で中止されたジョブは（ストリーミングの末尾も）デコードしない
+            if streaming_session:
+                streaming_session.cancel()
+            return ""
+        if streaming_session:
+            # 確定済みのテキストに、未確定の末尾だけをデコードして追加する
+            # （途中の結果をつなげたテキストなので、録音全体のデコード結果としてはキャッシュしない）
+            return streaming_session.finish(audio_data)
+        if self.transcription_client is not None:
+            return self.transcription_client.transcribe(audio_data)
+        return self.transcription_service.transcribe(audio_data)
+
+    def on_transcription_result(self, job, transcribed_text, duration, file_path):
+        """文字起こし結果をペーストする（結果は投入順に届く）"""
+        print(f"   ↳ Transcription result: {transcribed_text}")
+        if transcribed_text and self.post_processor is not None:
+            with tracing.span("postprocess", chars=len(transcribed_text)):
+                transcribed_text = self.post_processor.process(transcribed_text)
+
+        if transcribed_text:
+            final_text = " " + transcribed_text.strip()
+            AppHelper.callLater(0, self.paste_text_and_hide_ui, final_text)
+            # 履歴への保存はキューに積むだけなのでペーストを遅らせない
+            self.history_writer.add(file_path, transcribed_text.strip(), duration)
+        else:
+            # 文字起こし結果が空の場合はUIを非表示にする
+            AppHelper.callLater(0, self.hide_ui_if_idle)
+
+    def on_transcription_error(self, job, error):
+        print(f"   ↳ Transcription job #{job.id} failed: {error}")
+        AppHelper.callLater(0, self.hide_ui_if_idle)
+
+    def hide_ui_if_idle(self):
+        """次の録音が始まっていなければUIを非表示にする"""
+        if not self.audio_recorder.is_recording:
+            self.ui_controller.hide()
 
     def run(self):
-        """キーボードリスナーとUIイベントループを開始します"""
+        """
+        キーボードリスナーを最初に開始し、残りの初期化をバックグラウンドで行いながら
+        UIイベントループを開始します
+        """
         listener = keyboard.Listener(on_press=self.on_key_press)
         listener_thread = threading.Thread(target=listener.start, daemon=True)
         listener_thread.start()
-        
+        elapsed = time.perf_counter() - _PROCESS_START
+        tracing.record_span("startup_hotkey_ready", elapsed)
+        print(f"Hotkey listener started in {elapsed * 1e3:.0f} ms.")
+
+        threading.Thread(target=self.initialize, name="startup", daemon=True).start()
         AppKit.NSApplication.sharedApplication().run()
 
 
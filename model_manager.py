@@ -0,0 +1,152 @@
+# model_manager.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+# モデルの状態
+UNLOADED = "unloaded"
+LOADING = "loading"
+READY = "ready"
+ERROR = "error"
+
+
+class ModelManager:
+    """
+    TranscriptionServiceのモデルのライフサイクルを管理するクラス。
+
+    起動時にバックグラウンドでモデルをロードしてダミーデコードでウォームアップし、
+    一定時間使われなければアンロードする。録音開始時に ensure_loaded() を呼べば、
+    録音中に先回りして再ロードされる。
+    """
+    def __init__(self, service, idle_timeout=15 * 60, on_state_change=None):
+        self.service = service
+        # Noneまたは0以下ならアイドル時のアンロードを行わない
+        self.idle_timeout = idle_timeout
+        self.on_state_change = on_state_change
+
+        self.state = UNLOADED
+        self.load_time = None
+        self.last_used = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._active = 0
+        self._idle_timer = None
+
+        # デコード時に in_use() が使われるようにサービスへ自身を登録する
+        service.model_manager = self
+
+    def _set_state(self, state):
+        self.state = state
+        tracing.set_gauge("model_ready", 1 if state == READY else 0)
+        print(f"ModelManager: model '{self.service.model_path}' is {state}.")
+        if self.on_state_change:
+            self.on_state_change(state)
+
+    @property
+    def is_ready(self):
+        return self.state == READY
+
+    def preload(self):
+        """モデルのロードとウォームアップをバックグラウンドで開始する"""
+        self.ensure_loaded()
+
+    def ensure_loaded(self):
+        """
+        モデルが未ロードならバックグラウンドでロードを開始する（ブロックしない）。
+        ロード済みならアイドル時間を数え直す（この後デコードされなくても、いずれアンロードされる）。
+        """
+        with self._lock:
+            if self.state == READY:
+                self.last_used = time.monotonic()
+                self._schedule_idle_timer()
+                return
+            self._cancel_idle_timer()
+            if self.state == LOADING:
+                return
+            self._ready.clear()
+            self._set_state(LOADING)
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def wait_until_ready(self, timeout=None):
+        """ロード完了（または失敗）まで待つ。ロード済みならTrueを返す"""
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    def _load(self):
+        try:
+            start = time.perf_counter()
+            self.service.load_model()
+            self.service.warm_up()
+            self.load_time = time.perf_counter() - start
+            print(f"ModelManager: loaded and warmed up in {self.load_time:.2f}s.")
+            tracing.record_span("model_load", self.load_time, model=self.service.model_path)
+            tracing.set_gauge("model_load_seconds", self.load_time)
+            with self._lock:
+                self._set_state(READY)
+                self.last_used = time.monotonic()
+                self._schedule_idle_timer()
+        except Exception as e:
+            print(f"ModelManager: failed to load model: {e}")
+            with self._lock:
+                self._set_state(ERROR)
+        finally:
+            self._ready.set()
+
+    @contextmanager
+    def in_use(self):
+        """
+        デコード中はアンロードされないようにするコンテキスト。
+        未ロードの場合はロード完了を待つ（失敗してもデコード側の遅延ロードに任せる）。
+        """
+        self.ensure_loaded()
+        self._ready.wait()
+        with self._lock:
+            self._active += 1
+            self._cancel_idle_timer()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+                self._schedule_idle_timer()
+
+    def _schedule_idle_timer(self):
+        # _lock を保持した状態で呼ぶこと
+        self._cancel_idle_timer()
+        if not self.idle_timeout or self.idle_timeout <= 0:
+            return
+        if self._active or self.state != READY:
+            return
+        self._idle_timer = threading.Timer(self.idle_timeout, self._evict_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _evict_if_idle(self):
+        with self._lock:
+            idle = time.monotonic() - self.last_used
+            if self._active or self.state != READY or idle < self.idle_timeout:
+                return
+            self.unload()
+
+    def unload(self):
+        """モデルを解放する（_lock を保持した状態で呼ぶこと）"""
+        try:
+            self.service.unload_model()
+        except Exception as e:
+            print(f"ModelManager: failed to unload model: {e}")
+        self._ready.clear()
+        self._set_state(UNLOADED)
+
+    def shutdown(self):
+        with self._lock:
+            self._cancel_idle_timer()
\ No newline at end of file
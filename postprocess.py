@@ -0,0 +1,262 @@
+# postprocess.py
+#
+# 文字起こし結果をペーストする前の後処理: ユーザー辞書による語句の置換（製品名・略語など）、
+# フィラー（「えーと」「um」など）の削除、句読点と空白の整形。
+#
+# ルールファイルは1行に1ルール:
+#   open ai => OpenAI        「open ai」（大文字小文字を区別しない）を「OpenAI」に置き換える
+#   えーっと =>               置換後が空なら削除する
+#   LocalWhisper             => が無い行は、大文字小文字だけ違う表記をこの表記に揃える
+#   # で始まる行はコメント
+#
+# 何千ものルールを1回の走査で処理するため、すべての語句を Aho-Corasick のオートマトンに
+# まとめておく。ファイルの変更は更新時刻で検出し、差分だけを反映する。
+
+import os
+import re
+import threading
+import time
+
+import tracing
+
+DEFAULT_FILLERS = (
+    "um", "umm", "uh", "uhh", "erm", "hmm",
+    "えーと", "えーっと", "えっと", "えー", "あのー", "うーん",
+)
+
+
+class Automaton:
+    """
+    語句の集合から作る Aho-Corasick のオートマトン（作成後は変更しない）。
+    find() はテキストを1回走査し、含まれるすべての語句の (開始, 終了) を返す。
+    """
+    def __init__(self, patterns):
+        goto = [{}]
+        out = [()]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                child = goto[node].get(ch)
+                if child is None:
+                    child = len(goto)
+                    goto[node][ch] = child
+                    goto.append({})
+                    out.append(())
+                node = child
+            out[node] = (len(pattern),)
+
+        # 幅優先で失敗リンクを張り、失敗先で終わる語句も出力に含める
+        fail = [0] * len(goto)
+        order = list(goto[0].values())
+        for node in order:
+            for ch, child in goto[node].items():
+                target = fail[node]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                target = goto[target].get(ch, 0)
+                fail[child] = target if target != child else 0
+                if out[fail[child]]:
+                    out[child] = out[child] + out[fail[child]]
+                order.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        self.size = len(goto)
+
+    def find(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length in out[node]:
+                matches.append((i + 1 - length, i + 1))
+        return matches
+
+
+def _is_word_char(ch):
+    return ch.isascii() and ch.isalnum()
+
+
+def parse_rules(lines):
+    """ルールファイルの行から {小文字の語句: 置換後} を作る"""
+    rules = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=>" in line:
+            pattern, replacement = (part.strip() for part in line.split("=>", 1))
+        else:
+            pattern = replacement = line
+        if pattern:
+            rules[pattern.lower()] = replacement
+    return rules
+
+
+class _Compiled:
+    """process() が参照する、ある時点のルール一式（差し替えるだけで更新する）"""
+    def __init__(self, main, delta, replacements):
+        self.main = main
+        self.delta = delta
+        self.replacements = replacements
+
+
+# 句読点と空白の整形
+_SPACES = re.compile(r"[ \t]{2,}")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([,.!?;:、。！？])")
+_REPEATED_COMMA = re.compile(r"([,、])(\s*[,、])+")
+_COMMA_BEFORE_STOP = re.compile(r"[,、]\s*([.!?。！？])")
+_LEADING_PUNCT = re.compile(r"^[\s,、.…]+")
+_SPACE_AROUND_JA = re.compile(r"(?<=[、。「」])\s+|\s+(?=[「」])")
+
+
+def normalize_punctuation(text):
+    text = _REPEATED_COMMA.sub(r"\1", text)
+    text = _COMMA_BEFORE_STOP.sub(r"\1", text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    text = _SPACE_AROUND_JA.sub("", text)
+    text = _LEADING_PUNCT.sub("", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class PostProcessor:
+    """
+    文字起こし結果にルールファイルの置換・フィラー削除・句読点の整形を行う。
+
+    ルールの変更は process() の呼び出し時（check_interval 秒に1回）に更新時刻で検出する。
+    置換後の変更と削除は置換表を差し替えるだけで反映し、追加された語句は小さな差分の
+    オートマトンに入れる。差分が max_delta 語（またはルール全体の1/8）を超えたら全体を作り直す。
+    """
+    def __init__(self, rules_path=None, remove_fillers=True, normalize=True, fillers=DEFAULT_FILLERS,
+                 check_interval=1.0, max_delta=256):
+        self.rules_path = rules_path
+        self.normalize = normalize
+        self.check_interval = check_interval
+        self.max_delta = max_delta
+        # ルールファイルより優先度の低い組み込みのルール
+        self.builtin_rules = {filler: "" for filler in fillers} if remove_fillers else {}
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._main_patterns = set()
+        self._delta_patterns = set()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._compiled = _Compiled(Automaton(()), None, {})
+        self.reload()
+
+    # --- ルールの読み込み ---
+
+    def _read_rules(self):
+        rules = dict(self.builtin_rules)
+        if self.rules_path:
+            try:
+                with open(self.rules_path, encoding="utf-8") as f:
+                    rules.update(parse_rules(f))
+            except FileNotFoundError:
+                pass
+        return rules
+
+    def _file_mtime(self):
+        if not self.rules_path:
+            return None
+        try:
+            stat = os.stat(self.rules_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """ルールファイルを読み直し、変更を反映する"""
+        with self._lock:
+            self._mtime = self._file_mtime()
+            rules = self._read_rules()
+            start = time.perf_counter()
+            added = rules.keys() - self._main_patterns - self._delta_patterns
+            removed = self._main_patterns - rules.keys()
+            delta_patterns = self._delta_patterns | added
+            if (not self._loaded or len(delta_patterns) > max(self.max_delta, len(self._main_patterns) // 8)
+                    or len(removed) > len(self._main_patterns) // 2):
+                # 初回と、差分が大きくなった場合は全体を作り直す
+                self._main_patterns = set(rules)
+                self._delta_patterns = set()
+                self._compiled = _Compiled(Automaton(self._main_patterns), None, rules)
+                self._loaded = True
+            else:
+                # 追加された語句だけを小さなオートマトンにする。削除された語句はオートマトンに
+                # 残っていても置換表に無いので無視される
+                self._delta_patterns = delta_patterns
+                delta = Automaton(delta_patterns) if delta_patterns else None
+                self._compiled = _Compiled(self._compiled.main, delta, rules)
+            elapsed = time.perf_counter() - start
+            tracing.record_span("postprocess_compile", elapsed, rules=len(rules), added=len(added))
+        print(f"PostProcessor: {len(rules)} rules ({len(added)} added, {len(removed)} removed) "
+              f"compiled in {elapsed * 1e3:.1f} ms.")
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self._file_mtime() != self._mtime:
+            self.reload()
+
+    # --- 処理 ---
+
+    def _matches(self, compiled, folded):
+        """置換表にある語句の一致を、左から最長一致で重ならないように選ぶ"""
+        found = compiled.main.find(folded)
+        if compiled.delta is not None:
+            found += compiled.delta.find(folded)
+        if not found:
+            return []
+        found.sort(key=lambda match: (match[0], -match[1]))
+        selected = []
+        position = 0
+        for start, end in found:
+            if start < position or folded[start:end] not in compiled.replacements:
+                continue
+            # 英数字の語句は単語の途中には一致させない（"ai" が "said" に一致しないように）
+            if start > 0 and _is_word_char(folded[start]) and _is_word_char(folded[start - 1]):
+                continue
+            if end < len(folded) and _is_word_char(folded[end - 1]) and _is_word_char(folded[end]):
+                continue
+            selected.append((start, end))
+            position = end
+        return selected
+
+    def process(self, text):
+        """置換・フィラーの削除・句読点の整形を行ったテキストを返す"""
+        if not text:
+            return text
+        self.reload_if_changed()
+        compiled = self._compiled
+        folded = text.lower()
+        if len(folded) != len(text):
+            # 小文字にすると長さが変わる文字（ごく一部）を含む場合は、大文字小文字を区別して探す
+            folded = text
+
+        parts = []
+        position = 0
+        for start, end in self._matches(compiled, folded):
+            parts.append(text[position:start])
+            parts.append(compiled.replacements[folded[start:end]])
+            position = end
+        if not parts:
+            result = text
+        else:
+            parts.append(text[position:])
+            result = "".join(parts)
+
+        if self.normalize:
+            result = normalize_punctuation(result)
+            if result and text[:1].isupper() and result[:1].islower():
+                # 先頭のフィラーを削除した場合も文頭を大文字にする
+                result = result[0].upper() + result[1:]
+        return result
@@ -0,0 +1,116 @@
+# resampler.py
+#
+# デバイスのネイティブのサンプリングレート・チャンネル数で録音した音声を、Whisper が使う
+# 16kHz モノラルに変換するストリーミングのポリフェーズリサンプラー。
+# オーディオスレッドのコールバックでブロックごとに呼ばれるため、ブロック間の状態
+# （フィルタの履歴と出力の位相）を保持し、ブロックの区切り方によらず同じ出力を返す。
+
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def downmix(block):
+    """(frames, channels) のブロックを各チャンネルの平均でモノラルにする"""
+    block = np.asarray(block, dtype=np.float32)
+    if block.ndim == 1:
+        return block
+    if block.shape[1] == 1:
+        return block[:, 0]
+    return block.mean(axis=1, dtype=np.float32)
+
+
+def design_filter(up, down, zero_crossings=16, rolloff=0.9, beta=8.6):
+    """
+    up 倍に補間したレートで動く、Kaiser 窓付き sinc のローパスフィルタを作る。
+    カットオフは変換前後の低い方のナイキスト周波数の rolloff 倍。
+    (フィルタ係数, 遅延サンプル数) を返す（どちらも補間後のレート）。
+    """
+    half = zero_crossings * max(up, down)
+    n = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = rolloff / (2 * max(up, down))
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(len(n), beta)
+    # 各位相のゲインが平均して1になるようにする（補間で挟まる0の分を up 倍で補う）
+    taps *= up / taps.sum()
+    return taps, half
+
+
+class PolyphaseResampler:
+    """
+    in_rate から out_rate への有理数比のリサンプラー。
+
+    up/down = out_rate/in_rate（既約分数）として、up 倍に補間して down 分の1に間引くのと同じ結果を、
+    出力の各サンプルについて必要な位相のフィルタ係数だけで計算する。フィルタは線形位相で、
+    遅延は補正するため出力は入力と時間が揃う（代わりに zero_crossings / out_rate 秒程度の遅れで出力される）。
+    入力が複数チャンネルの場合は平均してモノラルにしてから変換する。
+    """
+    def __init__(self, in_rate, out_rate=16000, zero_crossings=16, rolloff=0.9, beta=8.6):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        divisor = gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // divisor
+        self.down = self.in_rate // divisor
+        self.passthrough = self.up == self.down
+
+        taps, self.delay = design_filter(self.up, self.down, zero_crossings, rolloff, beta)
+        # 1出力あたりのタップ数
+        self.taps_per_phase = -(-len(taps) // self.up)
+        padded = np.zeros(self.taps_per_phase * self.up, dtype=np.float64)
+        padded[:len(taps)] = taps
+        # bank[p, m]: 位相 p の出力で、窓の m 番目（古い順）の入力に掛ける係数
+        self.bank = np.ascontiguousarray(
+            padded.reshape(self.taps_per_phase, self.up).T[:, ::-1], dtype=np.float32
+        )
+        self.reset()
+
+    def reset(self):
+        """状態を初期化する（ストリームを開き直したとき）"""
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._consumed = 0      # これまでに受け取った入力のサンプル数
+        self._next_output = 0   # 次に出力するサンプルの番号
+
+    def output_length(self, input_length):
+        """input_length サンプルの入力全体に対応する出力のサンプル数"""
+        return -(-input_length * self.up // self.down)
+
+    def process(self, block):
+        """
+        入力のブロック（(frames,) または (frames, channels)）を変換し、出力できるようになった
+        16kHz モノラルのサンプルを返す。
+        """
+        samples = downmix(block)
+        if self.passthrough:
+            return samples.copy()
+
+        up, down, width = self.up, self.down, self.taps_per_phase
+        consumed_before = self._consumed
+        self._consumed += len(samples)
+        extended = np.concatenate((self._history, samples))
+        self._history = extended[len(extended) - (width - 1):].copy()
+
+        # 出力 k は補間後の位置 s = k*down + delay に対応し、入力 s // up までを使う
+        last = (self._consumed * up - 1 - self.delay) // down
+        first = self._next_output
+        if last < first:
+            return np.zeros(0, dtype=np.float32)
+        self._next_output = last + 1
+
+        positions = np.arange(first, last + 1, dtype=np.int64) * down + self.delay
+        # 出力ごとの窓の開始位置（extended[0] は入力の consumed_before - (width - 1) サンプル目）
+        starts = positions // up - consumed_before
+        windows = sliding_window_view(extended, width)
+        if up == 1:
+            # 整数分の1の間引きでは窓の開始位置が等間隔なので、コピーせずにスライスで取り出せる
+            selected = windows[starts[0]:starts[-1] + 1:down]
+            return selected @ self.bank[0]
+        return np.einsum("ij,ij->i", windows[starts], self.bank[positions % up])
+
+    def flush(self):
+        """入力の終わりまでの出力を返す（フィルタの遅延分を無音で押し出す）"""
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        expected = self.output_length(self._consumed)
+        padding = -(-(self.delay + 1) // self.up) + 1
+        tail = self.process(np.zeros(padding, dtype=np.float32))
+        return tail[:max(0, expected - (self._next_output - len(tail)))]
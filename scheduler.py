@@ -0,0 +1,210 @@
+# scheduler.py
+
+import itertools
+import queue
+import threading
+import time
+
+import tracing
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class TranscriptionJob:
+    """スケジューラに投入された1件の文字起こしジョブ"""
+    def __init__(self, job_id, func, on_result=None, on_error=None):
+        self.id = job_id
+        # func(job) を実行する。長い処理の途中で job.cancelled を確認してもよい
+        self.func = func
+        self.on_result = on_result
+        self.on_error = on_error
+
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.state == CANCELLED
+
+    @property
+    def wait_time(self):
+        """キューで待っていた時間（秒）"""
+        if self.started_at is None:
+            return time.perf_counter() - self.submitted_at
+        return self.started_at - self.submitted_at
+
+    @property
+    def run_time(self):
+        """実行にかかった時間（秒）"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def cancel(self):
+        """
+        ジョブをキャンセルする。待機中なら実行されず、実行中なら結果が破棄される。
+        """
+        if self.state in (QUEUED, RUNNING):
+            self.state = CANCELLED
+            return True
+        return False
+
+    def wait(self, timeout=None):
+        """完了を待って結果を返す"""
+        self._done.wait(timeout)
+        return self.result
+
+    def __repr__(self):
+        return f"<TranscriptionJob(id={self.id}, state='{self.state}')>"
+
+
+class TranscriptionScheduler:
+    """
+    文字起こしを1つのワーカースレッドで順番に実行するスケジューラ。
+
+    同時に複数のデコードがアクセラレータを奪い合うことがなく、結果は投入順に
+    通知される。キューには上限があり、満杯のときは submit が None を返す（バックプレッシャー）。
+    """
+    def __init__(self, max_queue=4, name="transcription-worker"):
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = []  # 待機中・実行中のジョブ
+        self.current_job = None
+
+        # 統計情報
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    @property
+    def depth(self):
+        """待機中と実行中のジョブ数"""
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, func, on_result=None, on_error=None):
+        """
+        ジョブを投入する。キューが満杯の場合は投入せずに None を返す。
+        on_result(job, result) / on_error(job, exception) はワーカースレッドから呼ばれる。
+        """
+        job = TranscriptionJob(next(self._ids), func, on_result, on_error)
+        with self._lock:
+            self._pending.append(job)
+            tracing.set_gauge("transcription_queue_depth", len(self._pending))
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._pending.remove(job)
+            self.rejected += 1
+            print(f"TranscriptionScheduler: queue is full ({self.max_queue}); job rejected.")
+            tracing.incr("transcription_jobs_rejected")
+            return None
+        return job
+
+    def cancel_all(self):
+        """待機中と実行中のジョブをすべてキャンセルする"""
+        with self._lock:
+            jobs = list(self._pending)
+        return sum(1 for job in jobs if job.cancel())
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._execute(job)
+            except Exception as e:
+                # コールバックで例外が起きてもワーカーは止めない
+                print(f"TranscriptionScheduler: error in job #{job.id} callback: {e}")
+            finally:
+                with self._lock:
+                    if job in self._pending:
+                        self._pending.remove(job)
+                    tracing.set_gauge("transcription_queue_depth", len(self._pending))
+                job._done.set()
+
+    def _execute(self, job):
+        if job.cancelled:
+            self.cancelled += 1
+            tracing.incr("transcription_jobs_cancelled")
+            print(f"TranscriptionScheduler: job #{job.id} cancelled before start.")
+            return
+
+        job.started_at = time.perf_counter()
+        job.state = RUNNING
+        self.current_job = job
+        try:
+            result = job.func(job)
+        except Exception as e:
+            job.error = e
+            if not job.cancelled:
+                job.state = FAILED
+        else:
+            job.result = result
+            if not job.cancelled:
+                job.state = DONE
+        finally:
+            job.finished_at = time.perf_counter()
+            self.current_job = None
+
+        tracing.incr(f"transcription_jobs_{job.state}")
+        tracing.record_span("job_wait", job.wait_time, job=job.id)
+        tracing.record_span("job_run", job.run_time, job=job.id, state=job.state)
+        print(f"TranscriptionScheduler: job #{job.id} {job.state} "
+              f"(wait {job.wait_time:.2f}s, run {job.run_time:.2f}s, queue depth {self._queue.qsize()}).")
+
+        if job.state == CANCELLED:
+            # 実行中にキャンセルされたジョブの結果は通知しない
+            self.cancelled += 1
+        elif job.state == FAILED:
+            self.failed += 1
+            self.total_wait_time += job.wait_time
+            self.total_run_time += job.run_time
+            if job.on_error:
+                job.on_error(job, job.error)
+        else:
+            self.completed += 1
+            self.total_wait_time += job.wait_time
+            self.total_run_time += job.run_time
+            if job.on_result:
+                job.on_result(job, job.result)
+
+    def stats(self):
+        """キューの深さとジョブの待ち時間・実行時間の統計を返す"""
+        finished = self.completed + self.failed
+        return {
+            "depth": self.depth,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_time": self.total_wait_time / finished if finished else 0.0,
+            "avg_run_time": self.total_run_time / finished if finished else 0.0,
+        }
+
+    def shutdown(self, wait=True):
+        self.cancel_all()
+        self._queue.put(None)
+        if wait:
+            self._worker.join()
\ No newline at end of file
@@ -0,0 +1,93 @@
+# tests/test_resampler.py
+#
+# PolyphaseResampler の精度テスト。周期的なテスト信号を、FFT で帯域制限した理想的な
+# リサンプリング（と、scipy があれば scipy.signal.resample_poly）の結果と比べる。
+#   - 通過域 (PASSBAND Hz 以下の正弦波) の SN 比が MIN_SNR dB 以上
+#   - 8kHz を超える正弦波の残留が MAX_ALIAS dB 以下
+#   - ブロックの区切り方を変えても出力が同じ
+# 変換コストは benchmarks/bench_resampler.py で測る。
+#
+#   python -m pytest -q tests/test_resampler.py
+
+import numpy as np
+import pytest
+
+from resampler import PolyphaseResampler
+
+OUT_RATE = 16000
+EDGE = OUT_RATE // 10  # 端のフィルタの立ち上がり部分は比較しない
+RATES = [8000, 22050, 32000, 44100, 48000, 96000]
+BLOCKSIZE = 512
+PASSBAND = 5500.0
+MIN_SNR = 80.0
+MAX_ALIAS = -70.0
+# resample_poly は既定の窓でフィルタが短いため、理想的な結果との比較より緩くする
+MIN_SCIPY_SNR = 40.0
+
+
+def ideal_resample(x, n_out):
+    """周期信号の帯域制限した理想的なリサンプリング（FFT のゼロ詰め・切り捨て）"""
+    spectrum = np.fft.rfft(x)
+    resampled = np.zeros(n_out // 2 + 1, dtype=complex)
+    n = min(len(spectrum), len(resampled))
+    resampled[:n] = spectrum[:n]
+    return np.fft.irfft(resampled, n_out) * n_out / len(x)
+
+
+def run_blocks(resampler, audio, blocksize):
+    parts = [resampler.process(audio[i:i + blocksize]) for i in range(0, len(audio), blocksize)]
+    parts.append(resampler.flush())
+    return np.concatenate(parts)
+
+
+def tones(rate, freqs, channels=1):
+    """1秒の周期的な正弦波の和（全周波数が整数Hzなので1秒で周期が閉じる）"""
+    t = np.arange(rate) / rate
+    signal = sum(np.sin(2 * np.pi * f * t + i) for i, f in enumerate(freqs)) / len(freqs)
+    return np.repeat(signal[:, None], channels, axis=1).astype(np.float32)
+
+
+def snr_db(reference, actual):
+    reference, actual = reference[EDGE:-EDGE], actual[EDGE:-EDGE]
+    return 10 * np.log10(np.sum(reference ** 2) / np.sum((actual - reference) ** 2))
+
+
+def passband_tones(rate):
+    top = min(PASSBAND, rate / 2 * 0.9)
+    freqs = [f for f in (100, 440, 1000, 2500, 4000, 5000, 5500) if f <= top]
+    return tones(rate, freqs, channels=2)
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_passband_matches_ideal_resampling(rate):
+    audio = passband_tones(rate)
+    output = run_blocks(PolyphaseResampler(rate, OUT_RATE), audio, BLOCKSIZE)
+    reference = ideal_resample(audio[:, 0].astype(np.float64), OUT_RATE)
+    assert len(output) == len(reference)
+    assert snr_db(reference, output) >= MIN_SNR
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_matches_scipy_resample_poly(rate):
+    signal = pytest.importorskip("scipy.signal")
+    audio = passband_tones(rate)
+    output = run_blocks(PolyphaseResampler(rate, OUT_RATE), audio, BLOCKSIZE)
+    reference = signal.resample_poly(audio[:, 0].astype(np.float64), OUT_RATE, rate)
+    assert snr_db(reference, output) >= MIN_SCIPY_SNR
+
+
+@pytest.mark.parametrize("rate", [r for r in RATES if r > OUT_RATE])
+def test_suppresses_aliasing_above_nyquist(rate):
+    above = [f for f in (9000, 11000, 15000, 20000) if f < rate / 2]
+    residual = run_blocks(PolyphaseResampler(rate, OUT_RATE), tones(rate, above), BLOCKSIZE)
+    alias = 20 * np.log10(np.sqrt(np.mean(residual[EDGE:-EDGE] ** 2)) / np.sqrt(0.5 / len(above)))
+    assert alias <= MAX_ALIAS
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_output_does_not_depend_on_block_boundaries(rate):
+    audio = passband_tones(rate)
+    output = run_blocks(PolyphaseResampler(rate, OUT_RATE), audio, BLOCKSIZE)
+    other = run_blocks(PolyphaseResampler(rate, OUT_RATE), audio, 997)
+    assert len(other) == len(output)
+    np.testing.assert_allclose(other, output, atol=1e-6)
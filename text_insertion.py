@@ -0,0 +1,338 @@
+# text_insertion.py
+#
+# 文字起こし結果をフォーカス中の入力欄に挿入する。
+# 挿入方法（Accessibility API で直接挿入 / キー入力 / ペーストボード経由のペースト）を
+# 順番に試し、最初に成功したもので挿入する。ペーストボードやキーボードは
+# NSPasteboard / pynput の Controller 互換のオブジェクトを受け取るため、
+# macOS以外ではこのファイルの FakePasteboard / FakeKeyboard に差し替えられる。
+
+import threading
+
+import tracing
+
+try:
+    from ApplicationServices import (
+        AXUIElementCreateSystemWide,
+        AXUIElementCopyAttributeValue,
+        AXUIElementSetAttributeValue,
+        kAXFocusedUIElementAttribute,
+        kAXSelectedTextAttribute,
+    )
+    from HIServices import kAXErrorSuccess
+    AX_AVAILABLE = True
+except ImportError:
+    AX_AVAILABLE = False
+
+
+class AccessibilityInsertion:
+    """
+    フォーカス中の要素の選択範囲（キャレット位置）を Accessibility API で直接置き換える。
+    クリップボードにもキーボードにも触れないが、対応していないアプリでは失敗する。
+    """
+    name = "accessibility"
+
+    def insert(self, text):
+        if not AX_AVAILABLE:
+            return False
+        system_wide_element = AXUIElementCreateSystemWide()
+        err, focused_element = AXUIElementCopyAttributeValue(system_wide_element, kAXFocusedUIElementAttribute, None)
+        if err != kAXErrorSuccess or not focused_element:
+            return False
+        err = AXUIElementSetAttributeValue(focused_element, kAXSelectedTextAttribute, text)
+        return err == kAXErrorSuccess
+
+
+class TypingInsertion:
+    """
+    短い文字列をキー入力として送る。ペーストボードを使わないので退避・復元が要らない。
+    改行を含む文字列は（チャットアプリで送信されてしまうため）扱わない。
+    """
+    name = "typing"
+
+    def __init__(self, keyboard_controller, max_chars=24):
+        self.keyboard_controller = keyboard_controller
+        self.max_chars = max_chars
+
+    def insert(self, text):
+        if len(text) > self.max_chars or "\n" in text or "\r" in text:
+            return False
+        self.keyboard_controller.type(text)
+        return True
+
+
+# 画像・PDF・動画などの大きくなりうる種類。データを読まずに「退避できない」と判断する
+_BULKY_TYPES = {
+    "public.tiff", "public.png", "public.jpeg", "public.heic", "public.gif", "com.compuserve.gif",
+    "com.adobe.pdf", "com.apple.pict", "com.apple.icns", "com.apple.flat-rtfd", "com.apple.webarchive",
+    "NSTIFFPboardType", "NSPDFPboardType", "NeXT TIFF v4.0 pasteboard type", "Apple PDF pasteboard type",
+}
+_BULKY_TYPE_PREFIXES = ("public.image", "public.movie", "public.audio", "public.mpeg", "com.apple.quicktime")
+
+
+def _is_bulky_type(a_type):
+    a_type = str(a_type)
+    return a_type in _BULKY_TYPES or a_type.startswith(_BULKY_TYPE_PREFIXES)
+
+
+class PasteboardInsertion:
+    """
+    ペーストボードにテキストを置いて Cmd+V を送り、元の内容は後で非同期に戻す。
+
+    - 画像などの大きくなりうる種類はデータを読まずに、それ以外は合計が上限を超えた時点で
+      退避をやめる。退避できない内容があるときはペーストボードに触れずに挿入を断り
+      （False を返す）、次の挿入方法に任せる。元の内容を黙って消すことはしない。
+    - 復元待ちの間に次の挿入が来た場合、ペーストボードには自分のテキストが入っているだけなので、
+      最初に退避した内容をそのまま使い回す（退避し直さない）。
+    - setString_forType_ は戻った時点で反映されているので、待たずに Cmd+V を送る。
+      復元時に changeCount が変わっていれば（ユーザーがその間にコピーした場合）
+      上書きせずに復元をやめる。
+
+    Args:
+        call_later: (delay, func) を遅延実行する関数。例: AppHelper.callLater
+    """
+    name = "pasteboard"
+
+    def __init__(self, pasteboard, keyboard_controller, string_type, modifier_key,
+                 max_backup_bytes=4 * 1024 * 1024, restore_delay=0.25, call_later=None):
+        self.pasteboard = pasteboard
+        self.keyboard_controller = keyboard_controller
+        self.string_type = string_type
+        self.modifier_key = modifier_key
+        self.max_backup_bytes = max_backup_bytes
+        self.restore_delay = restore_delay
+        self.call_later = call_later or _thread_call_later
+
+        self._lock = threading.Lock()
+        self._saved_items = None     # 復元待ちの退避内容
+        self._expected_count = None  # 自分がテキストを置いた後の changeCount
+        self.unsaved_types = []      # 最後に退避できなかった種類
+
+    def _backup(self):
+        """
+        現在の内容を上限付きで退避する。退避できない種類があれば None を返す
+        （self.unsaved_types にその種類が入る）。
+        """
+        types = list(self.pasteboard.types() or [])
+        self.unsaved_types = [a_type for a_type in types if _is_bulky_type(a_type)]
+        if self.unsaved_types:
+            return None
+        saved_items = []
+        total = 0
+        for a_type in types:
+            data = self.pasteboard.dataForType_(a_type)
+            if not data:
+                continue
+            total += len(data)
+            if total > self.max_backup_bytes:
+                self.unsaved_types = [a_type]
+                return None
+            saved_items.append((a_type, data))
+        tracing.set_gauge("pasteboard_backup_bytes", total)
+        return saved_items
+
+    def insert(self, text):
+        with self._lock:
+            if self._saved_items is not None and self.pasteboard.changeCount() == self._expected_count:
+                # 前回のペーストの復元待ち。中身は自分のテキストなので退避し直さない
+                saved_items = self._saved_items
+            else:
+                try:
+                    saved_items = self._backup()
+                except Exception as e:
+                    print(f"   ↳ Warning: Could not back up clipboard content: {e}")
+                    return False
+                if saved_items is None:
+                    print(f"   ↳ Clipboard holds data that cannot be backed up "
+                          f"({', '.join(map(str, self.unsaved_types))}); not using the clipboard.")
+                    tracing.incr("pasteboard_backup_refused")
+                    return False
+
+            self.pasteboard.clearContents()
+            self.pasteboard.setString_forType_(text, self.string_type)
+            expected = self.pasteboard.changeCount()
+            with self.keyboard_controller.pressed(self.modifier_key):
+                self.keyboard_controller.press('v')
+                self.keyboard_controller.release('v')
+
+            self._saved_items = saved_items
+            self._expected_count = expected
+
+        # ペースト先のアプリがペーストボードを読み終えるまで待ってから戻す（呼び出し元はブロックしない）
+        self.call_later(self.restore_delay, lambda: self.restore(expected))
+        return True
+
+    def paste_without_restore(self, text):
+        """
+        最後の手段: 元の内容を退避せずにテキストをペーストし、テキストはクリップボードに残す
+        （ペーストが効かなかったアプリでもユーザーが自分でペーストできる）。
+        """
+        with self._lock:
+            replaced = [str(a_type) for a_type in self.pasteboard.types() or []]
+            # 復元待ちの内容があれば、それは元のクリップボードなので戻さずに捨てることになる
+            self._saved_items = None
+            self._expected_count = None
+            self.pasteboard.clearContents()
+            self.pasteboard.setString_forType_(text, self.string_type)
+            with self.keyboard_controller.pressed(self.modifier_key):
+                self.keyboard_controller.press('v')
+                self.keyboard_controller.release('v')
+        print(f"   ↳ Warning: pasted without restoring the clipboard; it now holds the text "
+              f"(replaced: {', '.join(replaced) or 'nothing'}).")
+        tracing.incr("pasteboard_unrestored_pastes")
+        return True
+
+    def restore(self, expected_count=None):
+        """
+        退避した内容を戻す。expected_count が最後の挿入と違う場合（その後にもう一度挿入された）は
+        後の復元に任せる。
+        """
+        with self._lock:
+            if self._saved_items is None:
+                return
+            if expected_count is not None and expected_count != self._expected_count:
+                return
+            saved_items, self._saved_items = self._saved_items, None
+            try:
+                if self.pasteboard.changeCount() != self._expected_count:
+                    # ペースト後にユーザーか他のアプリがペーストボードを書き換えた
+                    print("   ↳ Clipboard changed after paste; not restoring.")
+                    return
+                self.pasteboard.clearContents()
+                for a_type, data in saved_items:
+                    self.pasteboard.setData_forType_(data, a_type)
+            except Exception as e:
+                print(f"   ↳ Warning: Could not restore clipboard content: {e}")
+
+
+def _thread_call_later(delay, func):
+    timer = threading.Timer(delay, func)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class TextInserter:
+    """
+    strategies を順番に試し、最初に成功した方法でテキストを挿入する。
+    すべて失敗した場合は、テキストが失われないよう last_resort（PasteboardInsertion）で
+    元の内容を戻さずにペーストする。
+    """
+    def __init__(self, strategies, last_resort=None):
+        self.strategies = list(strategies)
+        self.last_resort = last_resort
+
+    def insert(self, text):
+        """挿入に使った方法の名前を返す。すべて失敗した場合は None"""
+        for strategy in self.strategies:
+            with tracing.span("insert_" + strategy.name, chars=len(text)) as attrs:
+                try:
+                    inserted = strategy.insert(text)
+                except Exception as e:
+                    print(f"   ↳ Warning: {strategy.name} insertion failed: {e}")
+                    inserted = False
+                attrs["inserted"] = inserted
+            if inserted:
+                print(f"   ↳ Text inserted ({strategy.name}).")
+                return strategy.name
+        if self.last_resort is not None:
+            with tracing.span("insert_unrestored", chars=len(text)):
+                try:
+                    self.last_resort.paste_without_restore(text)
+                    return "unrestored"
+                except Exception as e:
+                    print(f"   ↳ Warning: last-resort paste failed: {e}")
+        print("   ↳ Warning: Could not insert text.")
+        return None
+
+    def flush(self):
+        """復元待ちのペーストボードをすぐに戻す（終了時など）"""
+        for strategy in self.strategies:
+            if hasattr(strategy, "restore"):
+                strategy.restore()
+
+
+def create_inserter(names, pasteboard, keyboard_controller, string_type, modifier_key,
+                    typing_max_chars=24, max_backup_bytes=4 * 1024 * 1024, restore_delay=0.25,
+                    call_later=None):
+    """カンマ区切りの名前（例: "accessibility,typing,pasteboard"）から TextInserter を作る"""
+    factories = {
+        "accessibility": lambda: AccessibilityInsertion(),
+        "typing": lambda: TypingInsertion(keyboard_controller, max_chars=typing_max_chars),
+        "pasteboard": lambda: PasteboardInsertion(
+            pasteboard, keyboard_controller, string_type, modifier_key,
+            max_backup_bytes=max_backup_bytes, restore_delay=restore_delay, call_later=call_later
+        ),
+    }
+    strategies = []
+    for name in names.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in factories:
+            raise ValueError(f"Unknown insertion strategy: {name} (available: {', '.join(factories)})")
+        strategies.append(factories[name]())
+    # 最後の手段のペーストには、設定にあれば同じ PasteboardInsertion を使う（復元待ちの状態を共有するため）
+    last_resort = next((s for s in strategies if isinstance(s, PasteboardInsertion)), None)
+    return TextInserter(strategies, last_resort=last_resort or factories["pasteboard"]())
+
+
+# --- macOS以外で使うスタンドイン ---
+
+class FakePasteboard:
+    """NSPasteboard のスタンドイン"""
+    def __init__(self, items=None):
+        self._items = dict(items) if items is not None else {"public.utf8-plain-text": b"previous clipboard"}
+        self._change_count = 0
+
+    def changeCount(self):
+        return self._change_count
+
+    def types(self):
+        return list(self._items)
+
+    def dataForType_(self, a_type):
+        return self._items.get(a_type)
+
+    def stringForType_(self, a_type):
+        data = self._items.get(a_type)
+        return data.decode("utf-8") if data is not None else None
+
+    def clearContents(self):
+        self._items = {}
+        self._change_count += 1
+        return self._change_count
+
+    def setString_forType_(self, text, a_type):
+        self._items[a_type] = text.encode("utf-8")
+        return True
+
+    def setData_forType_(self, data, a_type):
+        self._items[a_type] = data
+        return True
+
+
+class FakeKeyboard:
+    """pynput の keyboard.Controller のスタンドイン"""
+    def __init__(self):
+        self.events = []
+
+    def pressed(self, key):
+        keyboard = self
+
+        class _Pressed:
+            def __enter__(self):
+                keyboard.events.append(("press", key))
+
+            def __exit__(self, *exc):
+                keyboard.events.append(("release", key))
+
+        return _Pressed()
+
+    def press(self, key):
+        self.events.append(("press", key))
+
+    def release(self, key):
+        self.events.append(("release", key))
+
+    def type(self, text):
+        self.events.append(("type", text))
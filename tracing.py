@@ -0,0 +1,175 @@
+# tracing.py
+#
+# 軽量なトレース・メトリクス。各段階の所要時間（スパン）、カウンター、ゲージを
+# メモリ上に記録し、バックグラウンドのスレッドがまとめて
+#   - ローテーションするJSONLログ
+#   - Prometheus (node_exporter の textfile collector) 形式のテキストファイル
+# に書き出す。記録側はファイルI/Oを行わず、カウンターとスパンの集計だけを短いロックで更新する。
+# オーディオスレッドからは、そのスレッドだけが更新するカウンターを incr_owned() でロックなしに増やす。
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRIC_PREFIX = "localwhisper"
+
+
+class Tracer:
+    def __init__(self, max_events=10000):
+        # 書き出し待ちのイベント。溢れた場合は古いものから捨てる
+        self._events = deque(maxlen=max_events)
+        self.counters = {}
+        self.gauges = {}
+        # スパン名ごとの (回数, 合計秒数, 直近の秒数)
+        self.spans = {}
+        # counters と spans の読み出し・更新（複数のスレッドから呼ばれる）を排他にする
+        self._lock = threading.Lock()
+
+        self.log_path = None
+        self.textfile_path = None
+        self.max_bytes = 0
+        self.backup_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- 記録 ---
+
+    def record_span(self, name, duration, **attrs):
+        with self._lock:
+            count, total, _ = self.spans.get(name, (0, 0.0, 0.0))
+            self.spans[name] = (count + 1, total + duration, duration)
+        self._events.append({"ts": time.time(), "type": "span", "name": name,
+                             "duration": duration, **attrs})
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """with ブロックの所要時間をスパンとして記録する"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record_span(name, time.perf_counter() - start, **attrs)
+
+    def event(self, name, **attrs):
+        """時間を持たない単発のイベントを記録する"""
+        self._events.append({"ts": time.time(), "type": "event", "name": name, **attrs})
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def incr_owned(self, name, value=1):
+        """
+        1つのスレッドだけが更新するカウンターをロックなしで増やす（オーディオスレッド用）。
+        同じ名前を incr() と混ぜて使わないこと。
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    # --- 書き出し ---
+
+    def start_exporter(self, directory, interval=5.0, max_bytes=5 * 1024 * 1024, backup_count=3):
+        """バックグラウンドでの書き出しを開始する"""
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "trace.jsonl")
+        self.textfile_path = os.path.join(directory, f"{METRIC_PREFIX}.prom")
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._thread = threading.Thread(target=self._export_loop, args=(interval,),
+                                        name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop_exporter(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _export_loop(self, interval):
+        while not self._stop_event.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Tracer: failed to export metrics: {e}")
+
+    def flush(self):
+        if self.log_path:
+            self._write_events()
+        if self.textfile_path:
+            self._write_textfile()
+
+    def _write_events(self):
+        lines = []
+        while True:
+            try:
+                lines.append(json.dumps(self._events.popleft(), ensure_ascii=False))
+            except IndexError:
+                break
+        if not lines:
+            return
+        self._rotate_if_needed()
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self.log_path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.log_path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.log_path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        else:
+            os.remove(self.log_path)
+
+    def render_textfile(self):
+        """Prometheus のテキスト形式に変換する"""
+        # 書き出し中に他のスレッドが新しい名前を追加しても壊れないよう、コピーしてから並べる
+        with self._lock:
+            counters = dict(self.counters)
+            spans = dict(self.spans)
+        gauges = dict(self.gauges)
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in sorted(gauges.items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        if spans:
+            metric = f"{METRIC_PREFIX}_span_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, (count, total, last) in sorted(spans.items()):
+                lines.append(f'{metric}_count{{span="{name}"}} {count}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f"# TYPE {METRIC_PREFIX}_span_last_seconds gauge")
+            for name, (count, total, last) in sorted(spans.items()):
+                lines.append(f'{METRIC_PREFIX}_span_last_seconds{{span="{name}"}} {last:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def _write_textfile(self):
+        # 読み取り側が書きかけのファイルを見ないよう、一時ファイルから置き換える
+        tmp_path = self.textfile_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_textfile())
+        os.replace(tmp_path, self.textfile_path)
+
+
+# アプリ全体で共有するトレーサー
+tracer = Tracer()
+span = tracer.span
+event = tracer.event
+record_span = tracer.record_span
+incr = tracer.incr
+incr_owned = tracer.incr_owned
+set_gauge = tracer.set_gauge
\ No newline at end of file
@@ -1,15 +1,134 @@
 # transcription.py
 
-import mlx_whisper
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
 import numpy as np
 
+import tracing
+from decode_profiles import profile_options
+from transcription_backends import SAMPLE_RATE, create_backend
+from vad import trim_silence
+
 class TranscriptionService:
-    def __init__(self, model_size="large-v3", **kwargs):
-        # Hugging Faceのmlx-communityからモデルをロードするようパスを組み立てます
-        self.model_path = f"mlx-community/whisper-{model_size}"
-        print(f"TranscriptionService initialized with MLX.")
+    def __init__(self, model_size="large-v3", backend="mlx", use_vad=True, cache=None,
+                 profile="balanced", language_pinner=None, **kwargs):
+        # 実際のデコードはバックエンド (mlx / cpu / fake) に任せる
+        self.backend = create_backend(backend, model_size, **kwargs)
+        self.model_path = self.backend.model_path
+        # デコード設定のプロファイル (fast / balanced / accurate)。decode() の引数で個別に上書きできる
+        self.profile = profile
+        self.decode_options = profile_options(profile)
+        # 言語を学習して検出を省く LanguagePinner（任意）
+        self.language_pinner = language_pinner
+        # デコード前にVADで無音を削除するかどうか
+        self.use_vad = use_vad
+        self.last_vad_result = None
+        # 同じ音声・同じ設定の結果を再利用するための TranscriptionCache（任意）
+        self.cache = cache
+        # 直近のデコード時間と実時間係数 (デコード時間 / 音声の長さ)
+        self.last_decode_time = None
+        self.last_real_time_factor = None
+        # 同時に実行するデコードをバックエンドが並列に処理できる数までに制限する
+        # （mlx は1つなので、ストリーミングと最終デコードが同時にアクセラレータを使わない）
+        self.max_concurrency = self.backend.max_concurrency
+        self._decode_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._exclusive_lock = threading.Lock()
+        # ModelManagerが設定された場合、デコード中のアンロードを防ぐために使う
+        self.model_manager = None
+        # LongFormTranscriberが設定された場合、長い録音は区間に分けて並列にデコードする
+        self.long_form = None
+        # ModelRouterが設定された場合、transcribe() は録音ごとにデコードするモデルを選ぶ
+        self.router = None
+        print(f"TranscriptionService initialized with {self.backend.name} backend.")
         print(f"Using model: '{self.model_path}'.")
 
+    def load_model(self):
+        """モデルの重みを読み込む"""
+        self.backend.load()
+
+    @contextmanager
+    def _exclusive(self):
+        """実行中のデコードがすべて終わるのを待ち、その間は新しいデコードを始めさせない"""
+        with self._exclusive_lock:
+            for _ in range(self.max_concurrency):
+                self._decode_slots.acquire()
+        try:
+            yield
+        finally:
+            for _ in range(self.max_concurrency):
+                self._decode_slots.release()
+
+    def warm_up(self):
+        """無音のダミーデコードでカーネルのコンパイルを済ませておく"""
+        with self._exclusive():
+            self.backend.warm_up()
+
+    def unload_model(self):
+        """モデルを解放する"""
+        with self._exclusive():
+            self.backend.unload()
+
+    def decode(self, audio_data: np.ndarray, **options):
+        """
+        バックエンドでデコードし、結果の辞書 (text / segments / language) をそのまま返す。
+        options はプロファイルの設定より優先される。例外は呼び出し側で処理する。
+        """
+        duration = len(audio_data) / SAMPLE_RATE
+        options = {**self.decode_options, **options}
+
+        manager = self.model_manager
+        with manager.in_use() if manager else nullcontext():
+            with self._decode_slots:
+                start = time.perf_counter()
+                result = self.backend.decode(audio_data, **options)
+                self.last_decode_time = time.perf_counter() - start
+                if duration > 0:
+                    self.last_real_time_factor = self.last_decode_time / duration
+                tracing.record_span("decode", self.last_decode_time, backend=self.backend.name,
+                                    model=self.model_path, audio_seconds=duration, profile=self.profile,
+                                    language_pinned=bool(options.get("language")))
+        return result
+
+    def language_options(self, audio_seconds):
+        """
+        1回の録音の最終的なデコードで指定する言語のオプションを返す。LanguagePinner は
+        録音ごとにここで1回だけ参照する（ストリーミングの途中のデコードは数えない）。
+        空の辞書の場合は言語を検出させ、その結果を observe_language() に渡す。
+        """
+        if self.language_pinner is None or self.decode_options.get("language"):
+            return {}
+        language = self.language_pinner.language_for(audio_seconds)
+        return {"language": language} if language else {}
+
+    def observe_language(self, result, audio_seconds, language_options):
+        """language_options() が言語を指定しなかった録音で検出された言語を記録する"""
+        if self.language_pinner is None or language_options or self.decode_options.get("language"):
+            return
+        self.language_pinner.observe(result.get("language"), audio_seconds)
+
+    def trim_silence(self, audio_data: np.ndarray):
+        """VADで前後の無音と長いポーズを削除し、削除した秒数を表示する"""
+        with tracing.span("vad"):
+            vad_result = trim_silence(audio_data)
+        self.last_vad_result = vad_result
+        tracing.incr("vad_removed_seconds", vad_result.removed_seconds)
+        print(f"VAD: removed {vad_result.removed_seconds:.2f}s of "
+              f"{vad_result.original_seconds:.2f}s (speech {vad_result.speech_seconds:.2f}s).")
+        return vad_result
+
+    def cache_key(self, audio_data: np.ndarray, language_options=None):
+        """
+        この音声を現在の設定で transcribe() した結果のキャッシュキー。実際に使うデコードオプション
+        （プロファイルと言語）と、結果に影響するバックエンドの設定を含める。
+        """
+        return self.cache.make_key(audio_data, self.model_path, self.backend.name, {
+            "vad": self.use_vad,
+            "decode": {**self.decode_options, **(language_options or {})},
+            "backend": self.backend.output_settings(),
+        })
+
     def transcribe(self, audio_data: np.ndarray):
         """
         与えられたNumPy配列の音声データを文字起こしする。
@@ -18,25 +137,327 @@ class TranscriptionService:
             print("Error: Audio data is empty.")
             return "Error: No audio data to transcribe."
 
-        print(f"Transcribing audio data with MLX model '{self.model_path}'...")
+        # 言語はキャッシュのキーにも入るので先に決める（固定の判定は VAD で削る前の長さで行う）
+        language_options = self.language_options(len(audio_data) / SAMPLE_RATE)
+        cache_key = None
+        # ルーターを使う場合は録音ごとにモデルが変わり、キーのモデル (model_path) と一致しないのでキャッシュしない
+        if self.cache is not None and self.router is None:
+            cache_key = self.cache_key(audio_data, language_options)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("Transcription cache hit; skipping decode.")
+                return cached["text"]
+
+        if self.long_form is not None and self.long_form.applies_to(audio_data):
+            # 長い録音は全体を詰めてからデコードする代わりに、無音の位置で区間に分けて並列にデコードする
+            try:
+                transcribed_text = self.long_form.transcribe(audio_data, **language_options)
+            except Exception as e:
+                print(f"\nAn error occurred during long-form {self.backend.name} transcription: {e}")
+                return "Error during transcription."
+            if cache_key:
+                self.cache.put(cache_key, {"text": transcribed_text})
+            return transcribed_text
+
+        if self.use_vad:
+            vad_result = self.trim_silence(audio_data)
+            if not vad_result.has_speech:
+                print("No speech detected; skipping transcription.")
+                if cache_key:
+                    self.cache.put(cache_key, {"text": ""})
+                return ""
+            audio_data = vad_result.audio
 
         try:
-            result = mlx_whisper.transcribe(
-                audio=audio_data,
-                path_or_hf_repo=self.model_path # 初期化時に設定したモデルパスを使用
-            )
+            duration = len(audio_data) / SAMPLE_RATE
+            if self.router is not None:
+                result = self.router.decode(audio_data, **language_options)
+            else:
+                print(f"Transcribing audio data with {self.backend.name} model '{self.model_path}'...")
+                result = self.decode(audio_data, **language_options)
+                result["model"] = self.model_path
+                result["real_time_factor"] = self.last_real_time_factor
+            self.observe_language(result, duration, language_options)
 
             transcribed_text = result.get("text", "")
             language = result.get("language", "unknown")
 
-            print(f"\nTranscription complete. Detected language: {language}")
-            
+            print(f"\nTranscription complete. Detected language: {language} "
+                  f"(model {result['model']}, RTF {result['real_time_factor']:.3f})")
+
+            if cache_key:
+                self.cache.put(cache_key, {"text": transcribed_text.strip(), "language": language})
             return transcribed_text.strip()
 
         except Exception as e:
-            print(f"\nAn error occurred during MLX transcription: {e}")
+            print(f"\nAn error occurred during {self.backend.name} transcription: {e}")
             return "Error during transcription."
 
+
+class ModelRouter:
+    """
+    録音ごとに、複数のモデル（TranscriptionService）からデコードに使うものを選ぶ。
+
+    services は小さい（速い）順に並べる。各モデルの実時間係数 (RTF) を指数移動平均で
+    測っておき、予測したデコード時間が許容時間に収まる中で最も大きいモデルを選ぶ。
+    許容時間は min_latency + latency_per_second * 音声の長さ で、スケジューラに
+    待ちのジョブがあるほど短くする。escalate=True の場合、小さいモデルの結果の
+    信頼度が低ければ（平均対数確率が低い、または圧縮率が高い＝繰り返し）
+    1つ大きいモデルでデコードし直す。
+    """
+    def __init__(self, services, scheduler=None, min_latency=0.25, latency_per_second=0.1,
+                 initial_rtf=None, ewma_alpha=0.3, escalate=True, min_avg_logprob=-1.0,
+                 max_compression_ratio=2.4):
+        self.services = list(services)
+        self.scheduler = scheduler
+        self.min_latency = min_latency
+        self.latency_per_second = latency_per_second
+        self.ewma_alpha = ewma_alpha
+        self.escalate = escalate
+        self.min_avg_logprob = min_avg_logprob
+        self.max_compression_ratio = max_compression_ratio
+        # まだ測っていないモデルは、大きいモデルほど遅いと仮定して始める
+        initial_rtf = initial_rtf or {}
+        self.rtf = {
+            service.model_path: initial_rtf.get(service.model_path, 0.02 * (2 ** index))
+            for index, service in enumerate(self.services)
+        }
+        self._lock = threading.Lock()
+
+    def latency_budget(self, duration):
+        """この長さの音声に許す最大のデコード時間（秒）"""
+        # scheduler.depth にはこのデコードを実行中のジョブ自身も含まれるので、待ちのジョブだけを数える
+        queued = max(0, self.scheduler.depth - 1) if self.scheduler is not None else 0
+        return (self.min_latency + self.latency_per_second * duration) / (1 + queued)
+
+    def predict(self, service, duration):
+        with self._lock:
+            return self.rtf[service.model_path] * max(duration, 1.0)
+
+    def choose(self, duration):
+        """許容時間に収まる最も大きいモデルを返す。どれも収まらなければ最も小さいモデル"""
+        budget = self.latency_budget(duration)
+        for service in reversed(self.services):
+            if self.predict(service, duration) <= budget:
+                return service
+        return self.services[0]
+
+    def observe(self, service, duration, decode_time):
+        if duration <= 0:
+            return
+        with self._lock:
+            previous = self.rtf[service.model_path]
+            self.rtf[service.model_path] = previous + self.ewma_alpha * (decode_time / duration - previous)
+
+    def needs_escalation(self, result):
+        """結果の信頼度が低いかどうか（セグメントの平均対数確率と圧縮率で判定する）"""
+        segments = [s for s in result.get("segments", []) if s.get("avg_logprob") is not None]
+        if not segments:
+            return False
+        avg_logprob = sum(s["avg_logprob"] for s in segments) / len(segments)
+        compression_ratio = max(s.get("compression_ratio", 0.0) for s in segments)
+        return avg_logprob < self.min_avg_logprob or compression_ratio > self.max_compression_ratio
+
+    def decode(self, audio_data, **options):
+        """
+        選んだモデルでデコードし、結果の辞書に使ったモデル (model) と RTF (real_time_factor) を加えて返す。
+        """
+        duration = len(audio_data) / SAMPLE_RATE
+        service = self.choose(duration)
+        index = first_index = self.services.index(service)
+        while True:
+            print(f"Transcribing {duration:.1f}s with {service.backend.name} model '{service.model_path}' "
+                  f"(budget {self.latency_budget(duration):.2f}s)...")
+            start = time.perf_counter()
+            result = service.decode(audio_data, **options)
+            self.observe(service, duration, time.perf_counter() - start)
+            if not self.escalate or index + 1 >= len(self.services) or not self.needs_escalation(result):
+                break
+            tracing.incr("router_escalations")
+            index += 1
+            service = self.services[index]
+            print("Low-confidence result; escalating to a larger model.")
+        result["model"] = service.model_path
+        result["real_time_factor"] = service.last_real_time_factor
+        tracing.event("router_decision", model=service.model_path, audio_seconds=duration,
+                      escalations=index - first_index)
+        return result
+
+
+def _normalize_word(word):
+    """一致判定用に単語を正規化する（空白・句読点・大文字小文字の違いを無視）"""
+    return word.strip().strip(".,!?;:、。！？「」\"'").lower()
+
+
+class StreamingTranscriber:
+    """
+    録音中の音声をローリングウィンドウで逐次デコードするストリーミング文字起こし。
+
+    未確定区間（最後に確定した単語の終端から現在まで）を一定間隔でデコードし、
+    連続する2回のデコード結果で先頭から一致した単語だけを確定させる (local agreement)。
+    録音停止後は未確定の末尾だけをデコードすればよいため、停止からペーストまでの
+    時間は録音の長さにほぼ依存しなくなる。
+    """
+    def __init__(self, service, audio_source, sample_rate=16000, interval=1.0,
+                 min_window=1.0, max_window=20.0, on_update=None):
+        # audio_source(start) は start サンプル目から現在までの1次元音声を返す関数
+        self.service = service
+        self.audio_source = audio_source
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.min_window = min_window
+        self.max_window = max_window
+        # on_update(committed_text, tentative_text) で途中経過を通知する
+        self.on_update = on_update
+
+        # 途中のデコードは録音開始時に固定されていた言語を使い、LanguagePinner には数えない
+        pinner = service.language_pinner
+        self.language = pinner.language if pinner is not None else None
+        self.detected_language = None  # 言語を指定しなかった途中のデコードの最後の検出結果
+
+        self.committed_words = []
+        self.committed_until = 0  # 確定済み区間の終端（サンプル数）
+        self.previous_words = []  # 前回デコードの未確定部分 [(start, end, word), ...]
+        self.passes = 0
+        self.cancelled = False
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def committed_text(self):
+        return "".join(self.committed_words).strip()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                with self._lock:
+                    if self._stop_event.is_set():
+                        break
+                    self._step()
+            except Exception as e:
+                print(f"\nAn error occurred during streaming transcription: {e}")
+
+    def _decode_words(self, audio, offset):
+        """音声をデコードし、絶対時刻（秒）付きの単語リストを返す"""
+        options = {"word_timestamps": True, "condition_on_previous_text": False}
+        if self.language:
+            options["language"] = self.language
+        prompt = self.committed_text[-200:]
+        if prompt:
+            options["initial_prompt"] = prompt
+
+        result = self.service.decode(audio, **options)
+        if not self.language:
+            self.detected_language = result.get("language")
+        base = offset / self.sample_rate
+        words = []
+        for segment in result.get("segments", []):
+            for w in segment.get("words", []):
+                words.append((base + w["start"], base + w["end"], w["word"]))
+        return words
+
+    def _step(self):
+        audio = self.audio_source(self.committed_until)
+        if audio is None or len(audio) < self.min_window * self.sample_rate:
+            return
+
+        # 未確定の仮説がなく、窓に発話も含まれなければデコードせずに窓を進める
+        if self.service.use_vad and not self.previous_words:
+            if not trim_silence(audio, self.sample_rate).has_speech:
+                self.committed_until += max(0, len(audio) - int(0.5 * self.sample_rate))
+                return
+
+        words = self._decode_words(audio, self.committed_until)
+        self.passes += 1
+
+        # 前回と今回のデコードで先頭から一致している単語数を数える
+        agreed = 0
+        for prev, cur in zip(self.previous_words, words):
+            if _normalize_word(prev[2]) != _normalize_word(cur[2]):
+                break
+            agreed += 1
+
+        # 一致が得られないまま窓が長くなりすぎた場合は、末尾付近を除いて強制的に確定する
+        window_end = (self.committed_until + len(audio)) / self.sample_rate
+        if agreed == 0 and len(audio) > self.max_window * self.sample_rate:
+            while agreed < len(words) and words[agreed][1] < window_end - self.min_window:
+                agreed += 1
+
+        if agreed:
+            self.committed_words.extend(w[2] for w in words[:agreed])
+            self.committed_until = int(words[agreed - 1][1] * self.sample_rate)
+        self.previous_words = words[agreed:]
+
+        if self.on_update:
+            tentative = "".join(w[2] for w in self.previous_words).strip()
+            self.on_update(self.committed_text, tentative)
+
+    def finish(self, audio_data):
+        """
+        ストリーミングを停止し、未確定の末尾だけをデコードして最終テキストを返す。
+        audio_data は stop_recording が返した録音全体。
+        """
+        self._stop_event.set()
+        with self._lock:
+            if self.cancelled:
+                return ""
+            tail = None
+            language_options = {}
+            if audio_data is not None:
+                tail = audio_data[self.committed_until:]
+                # 言語の固定は、途中のデコードではなくこの録音全体を1回として数える
+                language_options = self.service.language_options(len(audio_data) / self.sample_rate)
+            # 録音の言語: 末尾が短ければ、最後の途中のデコードで検出された言語を使う
+            detected_language = self.detected_language
+
+            print(f"Finalizing stream: {self.passes} passes, "
+                  f"{self.committed_until / self.sample_rate:.1f}s committed, "
+                  f"{0 if tail is None else len(tail) / self.sample_rate:.1f}s tail.")
+
+            long_form = self.service.long_form
+            if tail is not None and long_form is not None and long_form.applies_to(tail):
+                # ストリーミングが追いつかず末尾が長く残った場合は、区間に分けて並列にデコードする
+                try:
+                    self.committed_words.append(" " + long_form.transcribe(tail, **language_options))
+                except Exception as e:
+                    print(f"\nAn error occurred during long-form {self.service.backend.name} transcription: {e}")
+                    self.committed_words.extend(w[2] for w in self.previous_words)
+                tail = None
+            elif tail is not None and len(tail) > 0 and self.service.use_vad:
+                vad_result = self.service.trim_silence(tail)
+                tail = vad_result.audio if vad_result.has_speech else None
+
+            if tail is not None and len(tail) >= int(0.1 * self.sample_rate):
+                try:
+                    options = {"condition_on_previous_text": False, **language_options}
+                    prompt = self.committed_text[-200:]
+                    if prompt:
+                        options["initial_prompt"] = prompt
+                    result = self.service.decode(tail, **options)
+                    self.committed_words.append(result.get("text", ""))
+                    if len(tail) >= int(self.min_window * self.sample_rate) or not detected_language:
+                        detected_language = result.get("language")
+                except Exception as e:
+                    print(f"\nAn error occurred during {self.service.backend.name} transcription: {e}")
+                    # 末尾のデコードに失敗した場合は最後の仮説で代用する
+                    self.committed_words.extend(w[2] for w in self.previous_words)
+
+            if audio_data is not None:
+                self.service.observe_language({"language": detected_language},
+                                              len(audio_data) / self.sample_rate, language_options)
+            return self.committed_text
+
+    def cancel(self):
+        """結果を使わずにストリーミングを停止する（finish() は末尾をデコードせずに空文字列を返す）"""
+        self.cancelled = True
+        self._stop_event.set()
+
 # --- Testing Block ---
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,304 @@
+# transcription_backends.py
+#
+# TranscriptionService の裏側で実際にデコードを行うバックエンド。
+# どのバックエンドも decode() は mlx_whisper.transcribe と同じ形式の辞書
+# ({"text", "segments", "language"}) を返す。
+
+import gc
+import math
+import threading
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+
+
+def _mel_filters(n_mels, n_fft=N_FFT, sample_rate=SAMPLE_RATE):
+    """三角形のメルフィルタバンク (n_mels, n_fft // 2 + 1) を作成する"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    mel_points = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2))
+    lower, center, upper = mel_points[:-2, None], mel_points[1:-1, None], mel_points[2:, None]
+    rising = (freqs - lower) / (center - lower)
+    falling = (upper - freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def log_mel_spectrogram(audio, n_mels=80):
+    """
+    Whisperと同じ設定 (n_fft=400, hop=160) のログメルスペクトログラムをNumPyで計算する。
+    fakeバックエンドの特徴量抽出として使う。
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    padded = np.pad(audio, (N_FFT // 2, N_FFT // 2), mode="reflect") if len(audio) > N_FFT else \
+        np.pad(audio, (0, N_FFT - len(audio) + HOP_LENGTH))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+    window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+    power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+    mel = power @ _mel_filters(n_mels).T
+    log_spec = np.log10(np.maximum(mel, 1e-10))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return ((log_spec + 4.0) / 4.0).astype(np.float32)
+
+
+class TranscriptionBackend:
+    """バックエンドの基底クラス"""
+    name = "base"
+    # 同時に実行できるデコードの数
+    max_concurrency = 1
+
+    def __init__(self, model_size, **kwargs):
+        self.model_size = model_size
+        self.model_path = model_size
+
+    def load(self):
+        """モデルを読み込む"""
+
+    def unload(self):
+        """モデルを解放する"""
+
+    def warm_up(self):
+        """無音のダミーデコードでカーネルのコンパイルなどを済ませておく"""
+        self.decode(np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+    def extract_features(self, audio):
+        """
+        デコード時に内部で行われる特徴量抽出だけを実行する（ベンチマークで段階ごとの
+        時間を測るためのもの）。未対応のバックエンドでは None を返す。
+        """
+        return None
+
+    def decode(self, audio, **options):
+        raise NotImplementedError
+
+    def output_settings(self):
+        """デコード結果に影響するバックエンドの設定（キャッシュのキーに使う）"""
+        return {}
+
+
+# mlx_whisper の ModelHolder はプロセス全体で共有されるため、MLXBackend のインスタンス間で排他にする
+_MLX_LOCK = threading.Lock()
+
+
+class MLXBackend(TranscriptionBackend):
+    """mlx_whisper を使う Apple silicon 向けのバックエンド"""
+    name = "mlx"
+
+    # mlx_whisper はビームサーチ未対応（指定すると NotImplementedError になる）ため、貪欲デコードで代用する
+    _UNSUPPORTED_OPTIONS = ("beam_size", "patience")
+
+    def __init__(self, model_size, **kwargs):
+        super().__init__(model_size)
+        # Hugging Faceのmlx-communityからモデルをロードするようパスを組み立てます
+        self.model_path = f"mlx-community/whisper-{model_size}"
+        self.model = None
+
+    def load(self):
+        """
+        mlx_whisperはModelHolderにロード済みモデルをキャッシュするため、
+        以降のtranscribe呼び出しはこのモデルを再利用する。
+        """
+        import mlx.core as mx
+        from mlx_whisper.transcribe import ModelHolder
+        with _MLX_LOCK:
+            self.model = ModelHolder.get_model(self.model_path, mx.float16)
+
+    def unload(self):
+        """キャッシュされたモデルを解放し、MLXのメモリキャッシュもクリアする"""
+        import mlx.core as mx
+        from mlx_whisper.transcribe import ModelHolder
+        with _MLX_LOCK:
+            self.model = None
+            if ModelHolder.model_path == self.model_path:
+                ModelHolder.model = None
+                ModelHolder.model_path = None
+        gc.collect()
+        if hasattr(mx, "clear_cache"):
+            mx.clear_cache()
+        else:
+            mx.metal.clear_cache()
+
+    def extract_features(self, audio):
+        import mlx.core as mx
+        from mlx_whisper.audio import log_mel_spectrogram
+        n_mels = 128 if "large-v3" in self.model_path else 80
+        mel = log_mel_spectrogram(audio, n_mels=n_mels)
+        mx.eval(mel)
+        return mel
+
+    def decode(self, audio, **options):
+        import mlx_whisper
+        from mlx_whisper.transcribe import ModelHolder
+        for name in self._UNSUPPORTED_OPTIONS:
+            options.pop(name, None)
+        with _MLX_LOCK:
+            # ModelHolder はモデルを1つしか保持しないため、複数のモデルを使い分ける場合
+            # （ModelRouter）は読み込み済みのこのモデルを差し戻してから呼ぶ
+            if self.model is not None and ModelHolder.model_path != self.model_path:
+                ModelHolder.model = self.model
+                ModelHolder.model_path = self.model_path
+            return mlx_whisper.transcribe(
+                audio=audio,
+                path_or_hf_repo=self.model_path,
+                **options
+            )
+
+
+class CPUBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) を使う CPU バックエンド。
+    int8 量子化で動くため、Apple silicon 以外のマシンでも実用的な速度で動く。
+    """
+    name = "cpu"
+
+    # mlx_whisper と名前の異なるオプション
+    _OPTION_NAMES = {"logprob_threshold": "log_prob_threshold"}
+
+    def __init__(self, model_size, compute_type="int8", cpu_threads=0, num_workers=2, **kwargs):
+        super().__init__(model_size)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        # 複数のスレッドから transcribe を呼んだときに並列に動くワーカー数
+        self.num_workers = max(1, num_workers)
+        self.max_concurrency = self.num_workers
+        self.model = None
+
+    def output_settings(self):
+        return {"compute_type": self.compute_type}
+
+    def load(self):
+        if self.model is None:
+            from faster_whisper import WhisperModel
+            self.model = WhisperModel(
+                self.model_path,
+                device="cpu",
+                compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads,
+                num_workers=self.num_workers
+            )
+
+    def unload(self):
+        self.model = None
+        gc.collect()
+
+    def extract_features(self, audio):
+        from faster_whisper.feature_extractor import FeatureExtractor
+        n_mels = 128 if "large-v3" in self.model_path else 80
+        return FeatureExtractor(feature_size=n_mels)(audio)
+
+    def decode(self, audio, **options):
+        self.load()
+        options = {self._OPTION_NAMES.get(k, k): v for k, v in options.items()}
+        segments, info = self.model.transcribe(audio, **options)
+
+        result_segments = []
+        for segment in segments:
+            words = [
+                {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                for w in (segment.words or [])
+            ]
+            result_segments.append({
+                "id": segment.id,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+                "words": words,
+            })
+        return {
+            "text": "".join(s["text"] for s in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+            "language_probability": info.language_probability,
+        }
+
+
+class FakeBackend(TranscriptionBackend):
+    """
+    決まった遅延で決まった結果を返すテスト・ベンチマーク用のバックエンド。
+
+    音声0.4秒ごとに "w0 w1 w2 ..." という単語を返すため、同じ位置から始まる
+    窓は同じ先頭の単語列になり、ストリーミングの一致判定もそのまま動く。
+    language を指定しない場合は、言語検出の分として detection_latency 秒余分に待つ。
+    window_seconds を指定すると、Whisper のエンコーダーと同様に音声を window_seconds 単位に
+    切り上げた長さで時間がかかる（短い音声でも1窓分の時間がかかる）。
+    """
+    name = "fake"
+
+    def __init__(self, model_size="fake", latency=0.05, real_time_factor=0.05,
+                 word_seconds=0.4, language="en", max_concurrency=4, detection_latency=0.02, window_seconds=None,
+                 **kwargs):
+        super().__init__(model_size)
+        self.window_seconds = window_seconds
+        self.detection_latency = detection_latency
+        self.max_concurrency = max_concurrency
+        self.model_path = f"fake/{model_size}"
+        self.latency = latency
+        self.real_time_factor = real_time_factor
+        self.word_seconds = word_seconds
+        self.language = language
+        self.loaded = False
+
+    def output_settings(self):
+        return {"word_seconds": self.word_seconds, "language": self.language}
+
+    def load(self):
+        self.loaded = True
+
+    def unload(self):
+        self.loaded = False
+
+    def extract_features(self, audio):
+        return log_mel_spectrogram(audio)
+
+    def decode(self, audio, **options):
+        # 実際のバックエンドと同様に特徴量抽出を行ってから、決まった時間だけ待つ
+        self.extract_features(audio)
+        duration = len(audio) / SAMPLE_RATE
+        detection = 0.0 if options.get("language") else self.detection_latency
+        billed = duration
+        if self.window_seconds:
+            billed = max(1, math.ceil(duration / self.window_seconds)) * self.window_seconds
+        time.sleep(self.latency + detection + billed * self.real_time_factor)
+
+        n_words = int(duration / self.word_seconds)
+        words = [
+            {"word": f" w{i}", "start": i * self.word_seconds,
+             "end": (i + 1) * self.word_seconds, "probability": 1.0}
+            for i in range(n_words)
+        ]
+        text = "".join(w["word"] for w in words)
+        segments = []
+        if words:
+            segments.append({
+                "id": 0, "start": 0.0, "end": words[-1]["end"], "text": text,
+                "avg_logprob": -0.1, "compression_ratio": 1.0, "no_speech_prob": 0.0,
+                "words": words,
+            })
+        return {"text": text, "segments": segments, "language": options.get("language") or self.language}
+
+
+BACKENDS = {
+    MLXBackend.name: MLXBackend,
+    CPUBackend.name: CPUBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def create_backend(name, model_size, **kwargs):
+    """名前からバックエンドを作成する"""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription backend: '{name}' (choose from {', '.join(BACKENDS)})")
+    return backend_cls(model_size, **kwargs)
@@ -0,0 +1,126 @@
+# transcription_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+from audio_archive import audio_fingerprint
+
+
+class TranscriptionCache:
+    """
+    文字起こし結果の永続キャッシュ。
+
+    キーは音声のハッシュ値、モデル、バックエンド、デコード設定（とデコードの方法）から作るため、
+    同じ音声を同じ設定で再度文字起こしする場合はデコードせずに結果を返せる。
+    参照するのは TranscriptionService.transcribe()（ストリーミングを無効にしたアプリと、
+    transcription_server の transcribe リクエスト）。アプリには同じ録音を文字起こしし直す
+    経路が無いため、ヒットするのは同じ音声を送り直すサーバーのクライアントと、
+    同じフィクスチャを使うベンチマーク。
+    合計サイズが max_bytes を超えると、最後に使われたのが古いものから削除する。
+    """
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcription_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_transcription_cache_last_access ON transcription_cache (last_access)"
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcription_cache"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(audio, model_path, backend, options=None):
+        """音声のハッシュ値とデコード設定からキャッシュのキーを作る"""
+        settings = json.dumps(
+            {"model": model_path, "backend": backend, "options": options or {}},
+            sort_keys=True, default=str
+        )
+        return hashlib.blake2b(
+            (audio_fingerprint(audio) + settings).encode("utf-8"), digest_size=20
+        ).hexdigest()
+
+    def get(self, key):
+        """キャッシュされた結果（辞書）を返す。無ければ None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM transcription_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                tracing.incr("transcription_cache_misses")
+                return None
+            self._conn.execute(
+                "UPDATE transcription_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+            tracing.incr("transcription_cache_hits")
+            return json.loads(row[0])
+
+    def put(self, key, result):
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM transcription_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcription_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """合計サイズが上限の9割になるまで、最後に使われたのが古いものから削除する（_lock 保持中に呼ぶ）"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute(
+            "SELECT key, size FROM transcription_cache ORDER BY last_access"
+        )
+        keys = []
+        total = self._total_bytes
+        for key, size in rows:
+            if total <= target:
+                break
+            keys.append((key,))
+            total -= size
+        self._conn.execute("BEGIN")
+        self._conn.executemany("DELETE FROM transcription_cache WHERE key = ?", keys)
+        self._conn.execute("COMMIT")
+        self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM transcription_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
\ No newline at end of file
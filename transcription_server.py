@@ -0,0 +1,520 @@
+# transcription_server.py
+#
+# モデルを1つだけ読み込んで、同じマシンの他のプロセス（ホットキーアプリ、スクリプト、
+# エディタ連携など）から Unix ソケット経由で文字起こしを受け付けるサーバー。
+#
+#   python transcription_server.py                      # config のモデル・ソケットで起動
+#   python transcription_server.py --backend cpu --model small --socket /tmp/lw.sock
+#
+# プロトコル: 各メッセージは「4バイト(ビッグエンディアン)のヘッダー長 + JSONヘッダー + ペイロード」。
+#   リクエスト: {"id": 1, "op": "transcribe", "payload_bytes": N, "options": {...}} + float32(LE) の16kHz音声
+#   レスポンス: {"id": 1, "ok": true, "text": "...", ...}（ペイロードなし）
+#   options に指定できるのは ALLOWED_OPTIONS のデコードオプションだけ。不正なリクエストには ok: false を返す
+# 1つの接続で複数のリクエストを続けて送ってよく、結果は終わった順に id 付きで返る。
+# 短い音声のリクエストが同時に届いた場合は、無音をはさんで1本につなげて1回でデコードし、
+# 単語のタイムスタンプで各リクエストに分け直す（Whisper は30秒の窓単位でエンコードするため、
+# 短い音声を別々にデコードするよりまとめた方が速い）。
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+import config
+import tracing
+from transcription_backends import SAMPLE_RATE
+
+_HEADER = struct.Struct(">I")
+_MAX_HEADER_BYTES = 1024 * 1024
+# クライアントが指定できるデコードオプション（バックエンドにそのまま渡すため、これ以外は拒否する）
+ALLOWED_OPTIONS = frozenset({
+    "language", "task", "initial_prompt", "word_timestamps", "condition_on_previous_text",
+    "temperature", "beam_size", "best_of", "compression_ratio_threshold", "logprob_threshold",
+    "no_speech_threshold",
+})
+
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, payload_bytes=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data + bytes(payload))
+
+
+def _recv_exact(sock, n):
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    received = 0
+    while received < n:
+        count = sock.recv_into(view[received:], n - received)
+        if count == 0:
+            raise ConnectionError("connection closed")
+        received += count
+    return buffer
+
+
+def recv_message(sock):
+    """(header, payload) を返す。接続が閉じられていれば None を返す"""
+    try:
+        (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    except ConnectionError:
+        return None
+    if length > _MAX_HEADER_BYTES:
+        raise ValueError(f"header too large: {length} bytes")
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    if not isinstance(header, dict):
+        raise ValueError("header must be a JSON object")
+    payload_bytes = header.get("payload_bytes", 0)
+    payload = _recv_exact(sock, payload_bytes) if payload_bytes else b""
+    return header, payload
+
+
+class _Request:
+    def __init__(self, connection, request_id, audio, options):
+        self.connection = connection
+        self.id = request_id
+        self.audio = audio
+        self.options = options
+        self.options_key = json.dumps(options, sort_keys=True)
+        self.duration = len(audio) / SAMPLE_RATE
+        self.received_at = time.perf_counter()
+
+    def reply(self, **fields):
+        self.connection.send({"id": self.id, **fields})
+
+
+class _Connection:
+    """1つのクライアント接続。結果は複数のワーカースレッドから返るので送信を排他にする"""
+    def __init__(self, sock):
+        self.sock = sock
+        self._lock = threading.Lock()
+
+    def send(self, header):
+        with self._lock:
+            try:
+                send_message(self.sock, header)
+            except OSError:
+                # クライアントが先に切断した
+                pass
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # 多数のクライアントが同時に接続しても拒否されないように
+    request_queue_size = 64
+
+
+class TranscriptionServer:
+    """
+    TranscriptionService を Unix ソケットで公開するサーバー。
+
+    リクエストはキューに入り、バックエンドが同時に処理できる数 (max_concurrency) の
+    ワーカーが取り出す。ワーカーは short_seconds 以下のリクエストを受け取ったとき、
+    他のワーカーがすべて処理中（並列に処理できる余地が無い）なら batch_window 秒だけ待って、
+    同じオプションの短いリクエストを最大 max_batch_size 件（合計 max_batch_seconds 秒まで）
+    まとめて1回でデコードする。
+    """
+    def __init__(self, service, socket_path, batching=True, batch_window=0.02, max_batch_size=8,
+                 max_batch_seconds=28.0, short_seconds=8.0, gap_seconds=1.0):
+        self.service = service
+        self.socket_path = socket_path
+        self.batching = batching
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self.short_seconds = short_seconds
+        self.gap_seconds = gap_seconds
+
+        # (0, 受付順, リクエスト) の優先度付きキュー。まとめられなかったリクエストは
+        # 受付順のまま戻すので、後から来たリクエストに追い越されない。終了の合図は (1, ...)
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._workers = []
+        self._idle_workers = 0
+        self._server = None
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.completed = 0
+
+    # --- ソケット ---
+
+    def start(self):
+        """ソケットを開いてワーカーと受付スレッドを開始する（ブロックしない）"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o700, exist_ok=True)
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._handle_connection(self.request)
+
+        # bind() で作られた時点から所有者以外が接続できないよう、umask で 0600 にして作る
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self.socket_path, Handler)
+        finally:
+            os.umask(previous_umask)
+
+        for i in range(self.service.max_concurrency):
+            worker = threading.Thread(target=self._run_worker, name=f"server-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        threading.Thread(target=self._server.serve_forever, name="server-accept", daemon=True).start()
+        print(f"TranscriptionServer: listening on {self.socket_path} "
+              f"({len(self._workers)} workers, batching {'on' if self.batching else 'off'}).")
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for _ in self._workers:
+            self._queue.put((1, next(self._sequence), None))
+        for worker in self._workers:
+            worker.join()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _handle_connection(self, sock):
+        connection = _Connection(sock)
+        while True:
+            try:
+                message = recv_message(sock)
+            except (OSError, ValueError) as e:
+                print(f"TranscriptionServer: dropping connection: {e}")
+                return
+            if message is None:
+                return
+            header, payload = message
+            op = header.get("op")
+            request_id = header.get("id")
+            if op == "ping":
+                connection.send({"id": request_id, "ok": True, "model": self.service.model_path})
+            elif op == "stats":
+                connection.send({"id": request_id, "ok": True, **self.stats()})
+            elif op == "transcribe":
+                options = header.get("options") or {}
+                error = self._validate(payload, options)
+                if error:
+                    connection.send({"id": request_id, "ok": False, "error": error})
+                    continue
+                audio = np.frombuffer(payload, dtype="<f4")
+                with self._stats_lock:
+                    self.requests += 1
+                request = _Request(connection, request_id, audio, options)
+                self._queue.put((0, next(self._sequence), request))
+                tracing.set_gauge("server_queue_depth", self._queue.qsize())
+            else:
+                connection.send({"id": request_id, "ok": False, "error": f"unknown op: {op}"})
+
+    @staticmethod
+    def _validate(payload, options):
+        """transcribe リクエストの問題を文字列で返す（問題が無ければ None）"""
+        if len(payload) % 4:
+            return f"payload must be float32 samples; got {len(payload)} bytes"
+        if not isinstance(options, dict):
+            return "options must be an object"
+        unknown = sorted(set(options) - ALLOWED_OPTIONS)
+        if unknown:
+            return f"unsupported options: {', '.join(unknown)}"
+        return None
+
+    # --- ワーカー ---
+
+    def _batchable(self, request):
+        return self.batching and request.duration <= self.short_seconds
+
+    def _run_worker(self):
+        while True:
+            with self._stats_lock:
+                self._idle_workers += 1
+            item = self._queue.get()
+            request = item[2]
+            with self._stats_lock:
+                self._idle_workers -= 1
+                others_idle = self._idle_workers > 0
+            if request is None:
+                return
+            if not self._batchable(request) or others_idle:
+                self._run_single(request)
+                continue
+
+            batch, deferred = [request], []
+            total = request.duration
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    other_item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                other = other_item[2]
+                if other is None:
+                    deferred.append(other_item)
+                    break
+                if (self._batchable(other) and other.options_key == request.options_key
+                        and total + other.duration + self.gap_seconds <= self.max_batch_seconds):
+                    batch.append(other)
+                    total += other.duration + self.gap_seconds
+                else:
+                    # 次のバッチ（または他のワーカー）のためにキューへ戻す
+                    deferred.append(other_item)
+                    if self._batchable(other) and other.options_key == request.options_key:
+                        break
+            for other_item in deferred:
+                self._queue.put(other_item)
+
+            if len(batch) == 1:
+                self._run_single(request)
+            else:
+                self._run_batch(batch)
+
+    def _run_single(self, request):
+        start = time.perf_counter()
+        try:
+            if request.options:
+                result = self.service.decode(request.audio, **request.options)
+                text = result.get("text", "").strip()
+            else:
+                text = self.service.transcribe(request.audio)
+            with self._stats_lock:
+                self.batches += 1
+                self.completed += 1
+            request.reply(ok=True, text=text, batch_size=1,
+                          queue_seconds=start - request.received_at,
+                          decode_seconds=time.perf_counter() - start)
+        except Exception as e:
+            request.reply(ok=False, error=str(e))
+
+    def _run_batch(self, batch):
+        """短いリクエストを無音をはさんでつなげ、1回でデコードしてから分け直す"""
+        start = time.perf_counter()
+        service = self.service
+        texts = {}
+        clips = []
+        # 言語の固定はバッチ（1回のデコード）ごとに1回だけ参照する。言語はキャッシュのキーにも入る
+        language_options = {}
+        if not batch[0].options:
+            language_options = service.language_options(sum(request.duration for request in batch))
+        for request in batch:
+            audio = request.audio
+            cache_key = None
+            # キーにはリクエストのオプションが入らないので、オプションの無い transcribe だけキャッシュする
+            if service.cache is not None and not request.options:
+                cache_key = service.cache_key(audio, language_options)
+                cached = service.cache.get(cache_key)
+                if cached is not None:
+                    texts[request] = cached["text"]
+                    continue
+            if service.use_vad:
+                vad_result = service.trim_silence(audio)
+                if not vad_result.has_speech:
+                    texts[request] = ""
+                    continue
+                audio = vad_result.audio
+            clips.append((request, audio, cache_key))
+
+        try:
+            if len(clips) == 1:
+                request, audio, cache_key = clips[0]
+                result = service.decode(audio, **request.options, **language_options)
+                service.observe_language(result, len(audio) / SAMPLE_RATE, language_options)
+                texts[request] = result.get("text", "").strip()
+                if cache_key:
+                    service.cache.put(cache_key, {"text": texts[request]})
+            elif clips:
+                # つなげてデコードした結果は1件ずつのデコードと同じにはならないのでキャッシュしない
+                texts.update(self._decode_packed(clips, language_options))
+        except Exception as e:
+            for request, _, _ in clips:
+                request.reply(ok=False, error=str(e))
+            clips_failed = {request for request, _, _ in clips}
+            batch = [request for request in batch if request not in clips_failed]
+
+        decode_seconds = time.perf_counter() - start
+        with self._stats_lock:
+            self.batches += 1
+            self.completed += len(batch)
+        tracing.record_span("server_batch", decode_seconds, size=len(batch), decoded=len(clips))
+        for request in batch:
+            request.reply(ok=True, text=texts.get(request, ""), batch_size=len(batch),
+                          queue_seconds=start - request.received_at, decode_seconds=decode_seconds)
+
+    def _decode_packed(self, clips, language_options):
+        gap = np.zeros(int(self.gap_seconds * SAMPLE_RATE), dtype=np.float32)
+        parts, spans = [], []
+        offset = 0
+        for request, audio, _ in clips:
+            if parts:
+                parts.append(gap)
+                offset += len(gap)
+            parts.append(np.asarray(audio, dtype=np.float32))
+            spans.append((request, offset / SAMPLE_RATE, (offset + len(audio)) / SAMPLE_RATE))
+            offset += len(audio)
+
+        options = dict(clips[0][0].options, word_timestamps=True, condition_on_previous_text=False,
+                       **language_options)
+        result = self.service.decode(np.concatenate(parts), **options)
+        self.service.observe_language(result, offset / SAMPLE_RATE, language_options)
+        words = [w for segment in result.get("segments", []) for w in segment.get("words") or []]
+        if not words and result.get("text", "").strip():
+            # 単語のタイムスタンプが返らないバックエンドでは1件ずつデコードし直す
+            return {request: self.service.decode(audio, **request.options, **language_options).get("text", "").strip()
+                    for request, audio, _ in clips}
+
+        # 単語の中央が入る区間（前後のギャップの半分まで）のリクエストに割り当てる
+        margin = self.gap_seconds / 2
+        texts = {request: [] for request, _, _ in clips}
+        for w in words:
+            middle = (w["start"] + w["end"]) / 2
+            for request, begin, end in spans:
+                if begin - margin <= middle < end + margin:
+                    texts[request].append(w["word"])
+                    break
+        return {request: "".join(parts).strip() for request, parts in texts.items()}
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "model": self.service.model_path,
+                "requests": self.requests,
+                "batches": self.batches,
+                "completed": self.completed,
+                # 1回のデコード（まとめたものを含む）あたりのリクエスト数
+                "average_batch_size": self.completed / self.batches if self.batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+class TranscriptionClient:
+    """
+    TranscriptionServer のクライアント。1つの接続を使い、呼び出しごとに結果を待つ
+    （複数のスレッドから呼ぶ場合は呼び出しを排他にする）。
+
+    timeout は接続・送信と ping / stats の応答に使う。文字起こしの応答は長い録音や
+    サーバーのキューの待ちで何分もかかりうるため、時間を区切らずに待つ。
+    """
+    def __init__(self, socket_path, timeout=120.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._sock = sock
+        return self._sock
+
+    def _call(self, header, payload=b"", wait_for_decode=False):
+        with self._lock:
+            self._next_id += 1
+            header = dict(header, id=self._next_id)
+            try:
+                sock = self._connect()
+                send_message(sock, header, payload)
+                if wait_for_decode:
+                    sock.settimeout(None)
+                try:
+                    message = recv_message(sock)
+                finally:
+                    sock.settimeout(self.timeout)
+            except OSError:
+                self.close_locked()
+                raise
+            if message is None:
+                self.close_locked()
+                raise ConnectionError("transcription server closed the connection")
+            response, _ = message
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "transcription server error"))
+        return response
+
+    def ping(self):
+        return self._call({"op": "ping"})
+
+    def stats(self):
+        return self._call({"op": "stats"})
+
+    def transcribe(self, audio, **options):
+        """16kHzの float32 音声を送り、文字起こしのテキストを返す"""
+        audio = np.ascontiguousarray(audio, dtype="<f4")
+        return self._call({"op": "transcribe", "options": options}, memoryview(audio).cast("B"),
+                          wait_for_decode=True)["text"]
+
+    def close_locked(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self):
+        with self._lock:
+            self.close_locked()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve transcription over a Unix socket")
+    parser.add_argument("--socket", default=config.SERVER_SOCKET or config.DEFAULT_SERVER_SOCKET)
+    parser.add_argument("--backend", default=config.TRANSCRIPTION_BACKEND)
+    parser.add_argument("--model", default=config.MODEL_SIZE)
+    parser.add_argument("--no-batching", action="store_true")
+    parser.add_argument("--batch-window", type=float, default=0.02, help="バッチを集める待ち時間（秒）")
+    args = parser.parse_args()
+
+    from decode_profiles import LanguagePinner
+    from long_form import LongFormTranscriber
+    from model_manager import ModelManager
+    from transcription import TranscriptionService
+    from transcription_cache import TranscriptionCache
+
+    cache = TranscriptionCache(config.CACHE_PATH, max_bytes=config.CACHE_MAX_BYTES) if config.CACHE_ENABLED else None
+    service = TranscriptionService(
+        model_size=args.model,
+        backend=args.backend,
+        cache=cache,
+        profile=config.DECODE_PROFILE,
+        language_pinner=LanguagePinner(fixed_language=config.LANGUAGE)
+        if config.LANGUAGE or config.LANGUAGE_PINNING else None,
+        compute_type=config.CPU_COMPUTE_TYPE,
+        num_workers=config.CPU_NUM_WORKERS,
+        latency=config.FAKE_LATENCY,
+        real_time_factor=config.FAKE_REAL_TIME_FACTOR
+    )
+    if config.LONG_FORM_ENABLED and service.max_concurrency > 1:
+        service.long_form = LongFormTranscriber(service, min_seconds=config.LONG_FORM_MIN_SECONDS,
+                                                chunk_seconds=config.LONG_FORM_CHUNK_SECONDS,
+                                                overlap_seconds=config.LONG_FORM_OVERLAP_SECONDS)
+    manager = ModelManager(service, idle_timeout=config.MODEL_IDLE_TIMEOUT)
+    manager.preload()
+    if config.TRACING_ENABLED:
+        tracing.tracer.start_exporter(config.TRACE_DIR, interval=config.TRACE_EXPORT_INTERVAL)
+
+    server = TranscriptionServer(service, args.socket, batching=not args.no_batching,
+                                 batch_window=args.batch_window)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("TranscriptionServer: shutting down.")
+    finally:
+        server.shutdown()
+        manager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
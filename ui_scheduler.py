@@ -0,0 +1,130 @@
+# ui_scheduler.py
+#
+# フローティングUIの再描画スケジューラ。固定周期のタイマーで polling する代わりに、
+# 新しいレベル値が届いたときだけメインスレッドを起こし、連続して届いた値は
+# 1回の再描画にまとめる。AppKit に依存しないので、ヘッドレスでも動かせる。
+
+import threading
+import time
+
+import tracing
+
+# 動作モード
+MODE_STOPPED = "stopped"      # 非表示中。通知は無視する
+MODE_THROTTLED = "throttled"  # 処理中表示。低いフレームレートで値を捨てるだけ
+MODE_ACTIVE = "active"        # 録音中。画面のリフレッシュレートまで再描画する
+
+DEFAULT_MAX_FPS = 60.0
+DEFAULT_THROTTLED_FPS = 4.0
+
+
+class RefreshScheduler:
+    """
+    通知駆動の再描画スケジューラ。
+
+    notify() は任意のスレッドから呼べる（オーディオスレッドから呼ばれる）。
+    まだ再描画が予約されていなければ post でメインスレッドに _fire を送り、
+    予約済みなら何もしない（バーストは1フレームにまとまる）。_fire は前回の
+    フレームから 1/fps 秒経っていなければ call_later で残り時間だけ遅らせ、
+    それ以降はデータが途切れるまでフレーム間隔ごとに1回だけ起きる。
+
+    Args:
+        on_frame: メインスレッドで呼ばれる再描画関数
+        post: 関数をメインスレッドで実行する（スレッドセーフな）関数。例: AppHelper.callAfter
+        call_later: メインスレッドで (delay, func) を遅延実行する関数。例: AppHelper.callLater
+    """
+    def __init__(self, on_frame, post, call_later, max_fps=DEFAULT_MAX_FPS,
+                 throttled_fps=DEFAULT_THROTTLED_FPS, clock=time.monotonic):
+        self.on_frame = on_frame
+        self.max_fps = max_fps
+        self.throttled_fps = throttled_fps
+        self.mode = MODE_STOPPED
+        self._post = post
+        self._call_later = call_later
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._pending = False    # _fire / _frame_done が予約済み
+        self._dirty = False      # 最後の描画以降に通知があった
+        self._saturated = False  # 通知がフレームレートより速く届いている
+        self._last_frame = 0.0
+
+        # 統計（ベンチマークとトレース用）
+        self.notifications = 0
+        self.wakeups = 0
+        self.frames = 0
+
+    def set_mode(self, mode):
+        with self._lock:
+            self.mode = mode
+        tracing.event("ui_refresh_mode", mode=mode)
+
+    def set_max_fps(self, fps):
+        """画面のリフレッシュレートに合わせて上限を変える"""
+        if fps and fps > 0:
+            self.max_fps = float(fps)
+
+    def frame_interval(self):
+        fps = self.throttled_fps if self.mode == MODE_THROTTLED else self.max_fps
+        return 1.0 / fps
+
+    def notify(self):
+        """新しいデータが届いたことを知らせる（任意のスレッドから呼べる）"""
+        with self._lock:
+            self.notifications += 1
+            self._dirty = True
+            if self._pending or self.mode == MODE_STOPPED:
+                return
+            self._pending = True
+        self._post(self._fire)
+
+    def _fire(self):
+        """post / call_later からメインスレッドで呼ばれる"""
+        self.wakeups += 1
+        if self.mode == MODE_STOPPED:
+            with self._lock:
+                self._pending = False
+                self._saturated = False
+            return
+
+        remaining = self._last_frame + self.frame_interval() - self._clock()
+        if remaining > 0:
+            # データがフレームレートより速く届いている。以降は通知ごとに起きるのをやめ、
+            # フレーム間隔ごとの _frame_done でまとめて描画する
+            self._saturated = True
+            self._call_later(remaining, self._fire)
+            return
+        self._draw()
+
+    def _draw(self):
+        with self._lock:
+            self._dirty = False
+            if not self._saturated:
+                # コールバック中に届いた通知で次のフレームを予約できるよう、先に解除する
+                self._pending = False
+        self._last_frame = self._clock()
+        self.frames += 1
+        self.on_frame()
+        if self._saturated:
+            self._call_later(self.frame_interval(), self._frame_done)
+
+    def _frame_done(self):
+        """高頻度モードで、フレーム間隔ごとに新しいデータがあれば描画する"""
+        self.wakeups += 1
+        with self._lock:
+            draw = self._dirty and self.mode != MODE_STOPPED
+            if not draw:
+                # データが途切れたので通知駆動に戻る
+                self._pending = False
+                self._saturated = False
+        if draw:
+            self._draw()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "max_fps": self.max_fps,
+            "notifications": self.notifications,
+            "wakeups": self.wakeups,
+            "frames": self.frames,
+        }
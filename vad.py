@@ -0,0 +1,124 @@
+# vad.py
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class VADResult:
+    """trim_silence の結果"""
+    def __init__(self, audio, original_seconds, kept_seconds, speech_seconds):
+        self.audio = audio
+        self.original_seconds = original_seconds
+        self.kept_seconds = kept_seconds
+        self.speech_seconds = speech_seconds
+
+    @property
+    def has_speech(self):
+        return self.speech_seconds > 0
+
+    @property
+    def removed_seconds(self):
+        return self.original_seconds - self.kept_seconds
+
+    def __repr__(self):
+        return (f"<VADResult(speech={self.speech_seconds:.2f}s, "
+                f"removed={self.removed_seconds:.2f}s of {self.original_seconds:.2f}s)>")
+
+
+def frame_features(audio, sample_rate=16000, frame_ms=25, hop_ms=10, batch_frames=4096):
+    """
+    フレームごとのエネルギー (dBFS)、スペクトル平坦度、音声帯域 (300-3400Hz) の
+    エネルギー比を計算する。FFTはフレームをまとめてベクトル化して計算し、
+    長い録音でもメモリが増えすぎないよう batch_frames ごとに処理する。
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    hop = int(sample_rate * hop_ms / 1000)
+    if len(audio) < frame:
+        audio = np.pad(audio, (0, frame - len(audio)))
+    frames = sliding_window_view(audio, frame)[::hop]
+
+    n_fft = 1 << (frame - 1).bit_length()
+    window = np.hanning(frame).astype(np.float32)
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    band = (freqs >= 300) & (freqs <= 3400)
+
+    n = len(frames)
+    energy_db = np.empty(n, dtype=np.float32)
+    flatness = np.empty(n, dtype=np.float32)
+    band_ratio = np.empty(n, dtype=np.float32)
+    for start in range(0, n, batch_frames):
+        batch = frames[start:start + batch_frames]
+        energy_db[start:start + len(batch)] = 10.0 * np.log10(np.mean(batch * batch, axis=1) + 1e-10)
+
+        power = np.abs(np.fft.rfft(batch * window, n=n_fft, axis=1)) ** 2 + 1e-12
+        total = power.sum(axis=1)
+        flatness[start:start + len(batch)] = np.exp(np.mean(np.log(power), axis=1)) / (total / power.shape[1])
+        band_ratio[start:start + len(batch)] = power[:, band].sum(axis=1) / total
+
+    return energy_db, flatness, band_ratio, hop
+
+
+def detect_speech(audio, sample_rate=16000, energy_margin_db=10.0, min_energy_db=-50.0,
+                  flatness_threshold=0.4, band_ratio_threshold=0.5, hangover_ms=200):
+    """
+    フレームごとの発話判定マスクを返す。
+    エネルギーが推定ノイズフロア + マージンを超え、かつスペクトルが音声らしい
+    （平坦でない、または音声帯域にエネルギーが集中している）フレームを発話とする。
+    """
+    energy_db, flatness, band_ratio, hop = frame_features(audio, sample_rate)
+
+    noise_floor = np.percentile(energy_db, 10)
+    # 全体が発話の場合にしきい値が上がりすぎないよう、最大エネルギーからも制限する
+    threshold = max(min(noise_floor + energy_margin_db, energy_db.max() - 25.0), min_energy_db)
+    voiced = (flatness < flatness_threshold) | (band_ratio > band_ratio_threshold)
+    speech = (energy_db > threshold) & voiced
+
+    # 語頭・語尾の子音が切れないよう、発話フレームの前後を広げる（ハングオーバー）
+    pad = int(hangover_ms / 10)
+    if pad and speech.any():
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+    return speech, hop
+
+
+def trim_silence(audio, sample_rate=16000, max_pause=0.6, min_speech=0.1, **kwargs):
+    """
+    先頭と末尾の無音を削除し、max_pause 秒より長い途中の無音を max_pause 秒に詰める。
+    発話が min_speech 秒未満しかなければ has_speech が False の結果を返す。
+    """
+    original_seconds = len(audio) / sample_rate
+    if len(audio) == 0:
+        return VADResult(audio, 0.0, 0.0, 0.0)
+
+    speech, hop = detect_speech(audio, sample_rate, **kwargs)
+    speech_seconds = speech.sum() * hop / sample_rate
+    if speech_seconds < min_speech:
+        return VADResult(audio[:0], original_seconds, 0.0, 0.0)
+
+    # 発話区間の開始・終了フレームを求める
+    edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * hop
+    ends = np.minimum(np.flatnonzero(edges == -1) * hop, len(audio))
+
+    # 長すぎるポーズは前後に半分ずつ残して詰める
+    keep_pause = int(max_pause * sample_rate)
+    pieces = []
+    for start, end in zip(starts, ends):
+        if pieces:
+            previous_start, previous_end = pieces[-1]
+            if start - previous_end <= keep_pause:
+                # 短いポーズはそのまま残して前の区間とつなげる
+                pieces[-1] = (previous_start, end)
+                continue
+            pieces[-1] = (previous_start, previous_end + keep_pause // 2)
+            start -= keep_pause - keep_pause // 2
+        pieces.append((start, end))
+
+    kept = sum(end - start for start, end in pieces)
+    if kept == len(audio):
+        trimmed = audio
+    elif len(pieces) == 1:
+        trimmed = audio[pieces[0][0]:pieces[0][1]]
+    else:
+        trimmed = np.concatenate([audio[start:end] for start, end in pieces])
+
+    return VADResult(trimmed, original_seconds, kept / sample_rate, speech_seconds)
\ No newline at end of file
@@ -0,0 +1,125 @@
+# waveform_geometry.py
+#
+# 波形表示のバーの高さ・位置・色分けを計算する（AppKitに依存しない）。
+# すべての配列は生成時に確保し、フレームごとの計算は numpy の out= 引数で
+# 同じバッファに書き込むため、30Hz で呼ばれても新しい配列を作らない。
+
+import math
+
+import numpy as np
+
+# 色分けのバケット番号（値が大きいほど明るい色で描く）
+BUCKET_INACTIVE = 0
+BUCKET_SECONDARY = 1
+BUCKET_PRIMARY = 2
+NUM_BUCKETS = 3
+
+
+class WaveformGeometry:
+    """
+    レベルの履歴を固定長のリングバッファに保持し、描画用のバー形状を計算する。
+
+    push() でRMS値を1つ追加し、compute(width, height) で x / y / 幅 / 高さ /
+    色バケットを更新する。compute() が返す配列は次の呼び出しで上書きされる。
+    """
+    def __init__(self, num_bars=32, spacing=2.0):
+        self.num_bars = num_bars
+        self.spacing = spacing
+        self.peak_level = 0.01
+        self.animation_phase = 0.0
+
+        # 受け取ったRMS値のリングバッファ（head が次に書き込む位置 = 最も古い値）
+        self.levels = np.zeros(num_bars, dtype=np.float32)
+        self.head = 0
+        # 表示順（古い→新しい）に並べたスムージング後の値
+        self.smoothed = np.zeros(num_bars, dtype=np.float32)
+
+        # 作業用バッファ
+        self._positions = np.arange(num_bars, dtype=np.intp)
+        self._order = np.empty(num_bars, dtype=np.intp)
+        self._ordered = np.empty(num_bars, dtype=np.float32)
+        self._wave_offsets = self._positions.astype(np.float32) * 0.2
+        self._wave = np.empty(num_bars, dtype=np.float32)
+        self._mask = np.empty(num_bars, dtype=bool)
+
+        # 描画に使う結果
+        self.normalized = np.zeros(num_bars, dtype=np.float32)
+        self.heights = np.zeros(num_bars, dtype=np.float32)
+        self.xs = np.zeros(num_bars, dtype=np.float32)
+        self.ys = np.zeros(num_bars, dtype=np.float32)
+        self.buckets = np.zeros(num_bars, dtype=np.int8)
+        self.bar_width = 1.0
+        self._layout_width = None
+
+    def push(self, rms):
+        """新しいRMS値を追加し、スムージングとピークレベルを更新する"""
+        self.levels[self.head] = rms
+        self.head = (self.head + 1) % self.num_bars
+
+        # リングバッファを表示順に並べ替える（np.roll と同じ並びを割り当てなしで作る）
+        np.add(self._positions, self.head, out=self._order)
+        np.remainder(self._order, self.num_bars, out=self._order)
+        np.take(self.levels, self._order, out=self._ordered)
+
+        # スムージング: smoothed = smoothed * 0.6 + ordered * 0.4
+        self.smoothed *= 0.6
+        self._ordered *= 0.4
+        self.smoothed += self._ordered
+
+        current_max = float(self.smoothed.max())
+        if current_max > self.peak_level:
+            self.peak_level = current_max
+        else:
+            self.peak_level = max(0.01, self.peak_level * 0.95)
+
+        self.animation_phase += 0.15
+        if self.animation_phase > 2 * math.pi:
+            self.animation_phase = 0.0
+
+    def _layout(self, width):
+        """幅が変わったときだけ x 座標とバーの幅を計算し直す"""
+        if width == self._layout_width:
+            return
+        self._layout_width = width
+        n = self.num_bars
+        self.bar_width = max(1.0, (width - self.spacing * (n - 1)) / n)
+        np.multiply(self._positions, self.bar_width + self.spacing, out=self.xs)
+
+    def compute(self, width, height):
+        """
+        現在の状態からバーの形状を計算する。
+
+        Returns:
+            (xs, ys, heights, buckets): すべて長さ num_bars の事前確保済み配列
+        """
+        self._layout(width)
+
+        # 正規化した値と高さ
+        np.divide(self.smoothed, self.peak_level, out=self.normalized)
+        np.multiply(self.normalized, height * 0.8, out=self.heights)
+        np.maximum(self.heights, 2.0, out=self.heights)
+
+        # 微細なアニメーション効果（ある程度の音量があるバーだけ揺らす）
+        np.add(self._wave_offsets, self.animation_phase, out=self._wave)
+        np.sin(self._wave, out=self._wave)
+        np.greater(self.normalized, 0.1, out=self._mask)
+        np.add(self.heights, self._wave, out=self.heights, where=self._mask)
+
+        # 縦方向の中央に揃える
+        np.multiply(self.heights, -0.5, out=self.ys)
+        self.ys += height / 2.0
+
+        # 色バケット
+        self.buckets.fill(BUCKET_INACTIVE)
+        np.copyto(self.buckets, BUCKET_SECONDARY, where=self._mask)
+        np.greater(self.normalized, 0.3, out=self._mask)
+        np.copyto(self.buckets, BUCKET_PRIMARY, where=self._mask)
+
+        return self.xs, self.ys, self.heights, self.buckets
+
+    def reset(self):
+        self.levels.fill(0.0)
+        self.smoothed.fill(0.0)
+        self.head = 0
+        self.peak_level = 0.01
+        self.animation_phase = 0.0